@@ -0,0 +1,212 @@
+"""
+Analytics Module - Daily Movement Rollups
+-----------------------------------------
+This module keeps the units moved in and out of every product per day in the
+'daily_movements' table, so throughput, top movers, turnover and days of
+cover over any date range read one row per product and day instead of
+grouping the whole transactions ledger.
+
+Key Responsibilities:
+- Rollups: The write paths add their movements to today's row of each product,
+  inside their transaction (One upsert per product moved).
+- Rebuild: Recomputes the rollups from the ledger (Backfill or repair).
+- Reports: Daily totals of a range, and the products of the range ranked by
+  units out, units in, movements or turnover, with their days of cover.
+
+Note: Days are UTC dates, like the ledger timestamps. Rollups of archived
+movements (flask compact-ledger --archive) stay in place, so the analytics
+keep the whole history while the live ledger shrinks.
+"""
+
+# Import datetime to check the date ranges
+from datetime import date, datetime, timedelta, timezone
+
+# Import the function to log system errors
+from helpers import log_system_error, rollback
+
+# Products returned by default, and the max of a single request
+TOP_LIMIT = 10
+MAX_LIMIT = 500
+
+# Default range of the reports (Last N days, today included), and the longest one accepted
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+
+# Rankings of the products: name and SQL expression (Whitelist: the name comes from the URL)
+RANKINGS = {
+    "out": "m.quantity_out",
+    "in": "m.quantity_in",
+    "movements": "m.movements",
+    "turnover": "turnover",
+}
+
+# Adds one product's movements of today to its rollup (Today is read from the database, like the ledger timestamps)
+UPSERT_ROLLUP = """
+    INSERT INTO daily_movements (day, product_id, quantity_in, quantity_out, movements)
+    VALUES (DATE(datetime('now')), ?, ?, ?, ?)
+    ON CONFLICT(product_id, day) DO UPDATE SET
+        quantity_in = daily_movements.quantity_in + excluded.quantity_in,
+        quantity_out = daily_movements.quantity_out + excluded.quantity_out,
+        movements = daily_movements.movements + excluded.movements
+"""
+
+# Rollups of the ledger movements of the days after a date (Same query as the backfill of migration 0004)
+LEDGER_ROLLUPS = """
+    SELECT DATE(t.timestamp) AS day, t.product_id,
+           SUM(CASE WHEN t.quantity > 0 THEN t.quantity ELSE 0 END) AS quantity_in,
+           SUM(CASE WHEN t.quantity < 0 THEN -t.quantity ELSE 0 END) AS quantity_out,
+           COUNT(*) AS movements
+    FROM transactions t
+    WHERE DATE(t.timestamp) > ?
+    GROUP BY DATE(t.timestamp), t.product_id
+"""
+
+
+# Adds movements to today's rollups (Called inside the transaction that saves them)
+# Input: list of (product_id, signed quantity)
+def record(db, movements):
+    totals = {}
+    for product_id, quantity in movements:
+        total = totals.setdefault(int(product_id), [0, 0, 0])
+        total[0 if quantity > 0 else 1] += abs(quantity)
+        total[2] += 1
+
+    rows = [(product_id, *total) for product_id, total in totals.items()]
+
+    if len(rows) == 1:
+        db.execute(UPSERT_ROLLUP, *rows[0])
+    elif rows:
+        db.executemany(UPSERT_ROLLUP, rows)
+
+# Recomputes the rollups from the transactions ledger (Returns the number of rollups written)
+# Days of archived movements are kept: the live ledger doesn't have them anymore
+def rebuild(db):
+    try:
+        # Take the write lock, so no movement lands between the delete and the insert
+        db.execute("BEGIN IMMEDIATE")
+        db.lock_table("transactions")
+        db.lock_table("daily_movements")
+
+        # Last day with archived movements (Its rollup has both archived and live movements)
+        archived = db.query("SELECT MAX(to_timestamp) AS until FROM ledger_archives")[0]["until"]
+        since = str(archived)[:10] if archived else "0001-01-01"
+
+        db.execute("DELETE FROM daily_movements WHERE day > ?", since)
+        db.execute("""
+            INSERT INTO daily_movements (day, product_id, quantity_in, quantity_out, movements)
+        """ + LEDGER_ROLLUPS, since)
+
+        db.execute("COMMIT")
+        return db.execute("SELECT COUNT(*) AS count FROM daily_movements WHERE day > ?", since)[0]["count"]
+
+    except Exception as e:
+        # Undo the partial rebuild, the old rollups stay in place
+        rollback(db)
+
+        print(f"Error in rebuild_rollups: {e}")
+        log_system_error(db, e, action="REBUILD_ROLLUPS_FAIL")
+        raise
+
+# Checks a report range: 'YYYY-MM-DD' texts (Default: the last DEFAULT_DAYS days)
+# Returns (start, end) as texts, raises ValueError if a date is invalid, the range is reversed or longer than MAX_DAYS
+def parse_range(start=None, end=None):
+    try:
+        end = datetime.strptime(end, "%Y-%m-%d").date() if end else datetime.now(timezone.utc).date()
+        start = datetime.strptime(start, "%Y-%m-%d").date() if start else end - timedelta(days=DEFAULT_DAYS - 1)
+
+    # Invalid text, or a default start before year 1
+    except (ValueError, OverflowError):
+        raise ValueError("Dates must be YYYY-MM-DD.") from None
+
+    if start > end:
+        raise ValueError("The start date must be before the end date.")
+
+    # Every day of the range is a row of the answer
+    if (end - start).days + 1 > MAX_DAYS:
+        raise ValueError(f"The range cannot be longer than {MAX_DAYS} days.")
+
+    return start.isoformat(), end.isoformat()
+
+
+# Units in and out of every day of a range, and their totals (Days without movements are zeros, None if the query fails)
+def get_daily_totals(db, start, end):
+    try:
+        rows = db.query("""
+            SELECT day, SUM(quantity_in) AS quantity_in, SUM(quantity_out) AS quantity_out, SUM(movements) AS movements
+            FROM daily_movements
+            WHERE day BETWEEN ? AND ?
+            GROUP BY day
+            ORDER BY day
+        """, start, end)
+        by_day = {str(row["day"]): row for row in rows}
+
+        # One row per day (Counted, so a range that ends on 9999-12-31 doesn't step past it)
+        daily = []
+        first = date.fromisoformat(start)
+        for offset in range((date.fromisoformat(end) - first).days + 1):
+            day = first + timedelta(days=offset)
+            row = by_day.get(day.isoformat())
+            daily.append({
+                "day": day.isoformat(),
+                "quantity_in": row["quantity_in"] if row else 0,
+                "quantity_out": row["quantity_out"] if row else 0,
+                "movements": row["movements"] if row else 0,
+            })
+
+        totals = {key: sum(item[key] for item in daily) for key in ["quantity_in", "quantity_out", "movements"]}
+        totals["days"] = len(daily)
+        totals["daily_out"] = round(totals["quantity_out"] / len(daily), 2)
+
+        return {"daily": daily, "totals": totals}
+
+    except Exception as e:
+        print(f"Error in get_daily_totals: {e}")
+        log_system_error(db, e, action="GET_DAILY_TOTALS_FAIL")
+        return None
+
+# Products that moved in a range, ranked by one of RANKINGS (Highest first, None if the query fails)
+# Turnover: units out / average stock of the range (Opening and closing stock come from the current
+# balance minus the rollups after each date). Days of cover: current stock / daily units out of the range
+# Reads the rollups from the start of the range to today with the day index, one group per product
+def get_top_movers(db, start, end, ranking="out", limit=TOP_LIMIT):
+    try:
+        rows = db.execute(f"""
+            SELECT p.id, p.name, p.sku, COALESCE(b.quantity, 0) AS current_stock,
+                   m.quantity_in, m.quantity_out, m.movements,
+                   COALESCE(b.quantity, 0) - m.net_since_start AS opening_stock,
+                   COALESCE(b.quantity, 0) - m.net_after_end AS closing_stock,
+                   COALESCE(m.quantity_out * 2.0
+                            / NULLIF(2 * COALESCE(b.quantity, 0) - m.net_since_start - m.net_after_end, 0), 0) AS turnover
+            FROM (
+                SELECT product_id,
+                       SUM(CASE WHEN day <= ? THEN quantity_in ELSE 0 END) AS quantity_in,
+                       SUM(CASE WHEN day <= ? THEN quantity_out ELSE 0 END) AS quantity_out,
+                       SUM(CASE WHEN day <= ? THEN movements ELSE 0 END) AS movements,
+                       SUM(quantity_in - quantity_out) AS net_since_start,
+                       SUM(CASE WHEN day > ? THEN quantity_in - quantity_out ELSE 0 END) AS net_after_end
+                FROM daily_movements
+                WHERE day BETWEEN ? AND DATE(datetime('now'))
+                GROUP BY product_id
+            ) AS m
+            JOIN products p ON p.id = m.product_id
+            LEFT JOIN stock_balances b ON b.product_id = m.product_id
+            WHERE m.movements > 0
+            ORDER BY {RANKINGS[ranking]} DESC, p.id ASC
+            LIMIT ?
+        """, end, end, end, end, start, limit)
+
+        days = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+        for row in rows:
+            velocity = row["quantity_out"] / days
+            row["turnover"] = round(row["turnover"], 2)
+            row["daily_out"] = round(velocity, 2)
+
+            # Days until the current stock runs out at the pace of the range (None if it didn't sell)
+            row["days_of_cover"] = round(row["current_stock"] / velocity, 1) if velocity else None
+
+        return rows
+
+    except Exception as e:
+        print(f"Error in get_top_movers: {e}")
+        log_system_error(db, e, action="GET_TOP_MOVERS_FAIL")
+        return None
@@ -19,12 +19,35 @@ to 'reports.py'.
 """
 
 # Import necessary libraries for Flask, SQLite
-from flask import Flask, flash, redirect, render_template, request, url_for, jsonify
+from flask import Flask, flash, redirect, render_template, request, url_for, jsonify, Response, stream_with_context
+
+# Import click to print the output of the maintenance commands
+import click
+
+# Import io to read uploaded files as text
+import io
 
 # Import the other modules for business logic
 import logic
 import reports
 import helpers
+import balances
+import snapshots
+import exports
+import importer
+import events
+import fragment_cache
+import reorder
+import migrations
+import idempotency
+import analytics
+import writer
+import catalog
+
+# Import the monitoring modules for the /metrics endpoint
+import metrics
+import audit
+import summary_cache
 
 # Configure Flask app
 app = Flask(__name__)
@@ -35,51 +58,108 @@ app.secret_key = "my_s3cr3t_k3y_f0r_cs50"
 # Ensure templates are auto-reloaded when changed
 app.config["TEMPLATES_AUTO_RELOAD"] = True
 
-# Initialize the CS50 SQL object to connect to your local database file
-# If it doesn't exist, init_db will create it
+# Initialize the pooled SQL object to connect to your local database file (STOCKFLOW_DB_PATH)
+# If it doesn't exist, init_db will create it (And apply the pending schema migrations)
 db = helpers.init_db()
 
 if not db:
     # If something goes wrong with Database creation, print an error
     raise RuntimeError("Cannot be possible es")
 
+# Give the request's database connection back to the pool when it ends
+@app.teardown_appcontext
+def release_db_connection(exception):
+    db.release()
+
+# Start timing the request and counting its queries (metrics.py)
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+# Record the request and tell the browser where the time went (Server-Timing shows in the DevTools Network tab)
+@app.after_request
+def end_request_metrics(response):
+    timing = metrics.end_request(request.method, request.endpoint, response.status_code)
+
+    if timing:
+        seconds, queries, db_seconds = timing
+        response.headers["Server-Timing"] = (f'db;dur={db_seconds * 1000:.2f};desc="{queries} queries", '
+                                             f'app;dur={seconds * 1000:.2f}')
+    return response
+
+# HTTP status of a failed movement: 400 for the client's errors (Final), 500 for a database or writer
+# process failure and 503 for a key still in use (The dashboard retries both with the same Idempotency-Key)
+def movement_error_status(message):
+    if message == logic.INTERNAL_ERROR:
+        return 500
+    if message == logic.KEY_IN_PROGRESS:
+        return 503
+    return 400
+
+# Response for a cached or new fragment, with its ETag and Last-Modified
+# make_conditional turns it into a 304 if the browser already has this version
+def fragment_response(entry):
+    response = Response(entry["body"], mimetype="text/html")
+    response.set_etag(entry["etag"])
+    response.last_modified = entry["created"]
+
+    # The browser keeps it, but asks every time (A cheap 304 while nothing changed)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 # Index route (Only get method, but with many data)
 @app.route('/')
 def index():
     # Validate type and page value
     page = request.args.get('page', 1, type=int)
 
+    # Pagination cursors (Next or previous page from the products already shown)
+    after = request.args.get('after')
+    before = request.args.get('before')
+
     # Detect if it's an ajax request
     is_ajax = request.args.get('ajax')
 
     try:
+        # Table pages that were already rendered for the current data are served from memory (Or a 304)
+        # Version read before the queries, from the database (The writes of every worker change it)
+        if is_ajax:
+            data_version = fragment_cache.version(db, "stock")
+            cached = fragment_cache.get("stock", data_version, request.full_path)
+            if cached:
+                return fragment_response(cached)
+
         # Get the stock of products data (10 products selected)
-        stock_data = reports.get_stock_report(db, page=page)
+        stock_data = reports.get_stock_report(db, page=page, after=after, before=before)
 
-        # Redirect to the main page if page doesn't equal to the stock data page
-        if page != stock_data["current_page"]:
+        # Redirect to the main page if page doesn't equal to the stock data page (Only for page numbers without cursor)
+        if not (after or before) and page != stock_data["current_page"]:
             return redirect(url_for('index', page=stock_data["current_page"]))
 
         # Use a little HTMl file that contains products table and it's into index
         if is_ajax:
-            return render_template("partials/stock_table.html",
+            html = render_template("partials/stock_table.html",
                                    stock=stock_data["products"],
                                    total_pages=stock_data["total_pages"],
-                                   current_page=stock_data["current_page"])
+                                   current_page=stock_data["current_page"],
+                                   next_cursor=stock_data["next_cursor"],
+                                   prev_cursor=stock_data["prev_cursor"])
+            return fragment_response(fragment_cache.put("stock", data_version, request.full_path, html,
+                                                        store=bool(stock_data["products"])))
 
         # Gets summary to show in dashboard
         summary = reports.get_inventory_summary(db)
 
-        # Gets the full stock list to select into buy and sell modals (Use a big value to select most products possible)
-        full_stock_list = reports.get_stock_report(db, page=1, per_page=1000000)
-
-        # Render index with summary, products to show in table and products to select
+        # Render index with summary and products to show in table (Buy and sell modals search products with /products/search)
         return render_template("index.html",
                                summary=summary,
                                stock=stock_data["products"],
-                               full_stock_list=full_stock_list["products"],
                                total_pages=stock_data["total_pages"],
-                               current_page=stock_data["current_page"])
+                               current_page=stock_data["current_page"],
+                               next_cursor=stock_data["next_cursor"],
+                               prev_cursor=stock_data["prev_cursor"],
+                               events_mode=events.MODE)
 
     # Flash error if something goes wrong on dashboard loading
     except Exception as e:
@@ -102,9 +182,21 @@ def index():
         return render_template("index.html",
                                summary={},
                                stock=[],
-                               full_stock_list=[],
                                total_pages=1,
-                               current_page=1)
+                               current_page=1,
+                               next_cursor=None,
+                               prev_cursor=None,
+                               events_mode=events.MODE)
+
+# Product search for the buy and sell modals (Typeahead by name or SKU prefix)
+@app.route("/products/search")
+def search_products():
+    # Get the query and the max results
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", reports.SEARCH_LIMIT, type=int)
+
+    # Return the matching products as JSON to scripts.js
+    return jsonify({"products": reports.search_products(db, query, limit)})
 
 # Function to add a new product
 @app.route("/add_product", methods=["POST"])
@@ -145,6 +237,31 @@ def add_product():
         "message": message
     }), 400
 
+# Bulk product import from a CSV file (Form field 'file')
+# Columns: name, sku, price, initial_stock (Optional), reorder_level (Optional)
+@app.route("/products/import", methods=["POST"])
+def import_products():
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"success": False, "message": "Choose a CSV file to import."}), 400
+
+    # Read the upload as text while it's parsed (utf-8-sig skips the BOM that Excel adds)
+    lines = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+
+    try:
+        success, message, report = importer.import_products(db, lines)
+
+    except UnicodeDecodeError:
+        return jsonify({"success": False, "message": "The file must be UTF-8 text."}), 400
+
+    response = {"success": success, "message": message, **report}
+
+    # New totals for the dashboard
+    if report["imported"]:
+        response["summary"] = reports.get_inventory_summary(db)
+
+    return jsonify(response), (200 if success else 400)
+
 # Route for buy stock
 @app.route("/buy", methods=["POST"])
 def buy_product():
@@ -156,7 +273,9 @@ def buy_product():
     type = 'IN'
 
     # Inserts transaction and get success, message, new stock, a validation for lower stock, and a buy description
-    success, message, new_stock, reorder_level = logic.add_transaction(db, product_id, quantity, type)
+    # A retry with the same Idempotency-Key header gets the first result instead of buying again
+    success, message, new_stock, reorder_level = logic.add_transaction(
+        db, product_id, quantity, type, request.headers.get(idempotency.HEADER))
 
     # If everything goes good
     if success:
@@ -169,8 +288,8 @@ def buy_product():
             "summary": reports.get_inventory_summary(db),
         })
 
-    # Else return these values to scripts
-    return jsonify({"success": False, "message": message}), 400
+    # Else return these values to scripts (5xx if the same request can succeed later)
+    return jsonify({"success": False, "message": message}), movement_error_status(message)
 
 # Route to sell products
 @app.route("/sell", methods=["POST"])
@@ -183,7 +302,9 @@ def sell_product():
     type = 'OUT'
 
     # Inserts transaction and get success, message, new stock, a validation for low stock and log description
-    success, message, new_stock, reorder_level = logic.add_transaction(db, product_id, quantity, type)
+    # A retry with the same Idempotency-Key header gets the first result instead of selling again
+    success, message, new_stock, reorder_level = logic.add_transaction(
+        db, product_id, quantity, type, request.headers.get(idempotency.HEADER))
 
     # If everything goes good
     if success:
@@ -196,8 +317,45 @@ def sell_product():
             "summary": reports.get_inventory_summary(db),
         })
 
-    # Else return these values to scripts
-    return jsonify({"success": False, "message": message}), 400
+    # Else return these values to scripts (5xx if the same request can succeed later)
+    return jsonify({"success": False, "message": message}), movement_error_status(message)
+
+# Route for bulk movements (Receiving and picking lists from scanners)
+# Expects JSON: {"mode": "atomic" | "best_effort", "items": [{"product_id": 1, "quantity": 5, "type": "IN"}, ...]}
+@app.route("/movements/bulk", methods=["POST"])
+def bulk_movements():
+    # Get the batch from the JSON body (Empty if the body isn't valid JSON)
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+
+    # A JSON array, string or number isn't a batch
+    if not isinstance(payload, dict):
+        return jsonify({"success": False, "message": "The body must be a JSON object with mode and items."}), 400
+
+    mode = payload.get("mode", "atomic")
+
+    # Inserts every line in one transaction and gets a result per line
+    success, message, results = logic.add_transactions_batch(db, payload.get("items"), mode)
+
+    # Count of saved and failed lines
+    saved = sum(1 for result in results if result["success"])
+
+    response = {
+        "success": success,
+        "message": message,
+        "mode": mode,
+        "saved": saved,
+        "failed": len(results) - saved,
+        "results": results,
+    }
+
+    # Only one summary for the whole batch
+    if success:
+        response["summary"] = reports.get_inventory_summary(db)
+        return jsonify(response)
+
+    return jsonify(response), movement_error_status(message)
 
 # Function to logs page
 @app.route('/logs')
@@ -209,16 +367,34 @@ def view_logs():
         # Gets ajax for SPA function
         is_ajax = request.args.get('ajax')
 
-        # Gets logs, total values and page to show them in the logs page
-        logs, total_pages, current_page = reports.get_transaction_logs(db, page = page)
+        # Logs pages that were already rendered for the current data are served from memory (Or a 304)
+        if is_ajax:
+            data_version = fragment_cache.version(db, "logs")
+            cached = fragment_cache.get("logs", data_version, request.full_path)
+            if cached:
+                return fragment_response(cached)
+
+        # Gets logs, total values, page and cursors to show them in the logs page
+        logs, total_pages, current_page, next_cursor, prev_cursor = reports.get_transaction_logs(
+            db, page=page, after=request.args.get('after'), before=request.args.get('before'))
+
+        # Values for both templates
+        context = {
+            "logs": logs,
+            "total_pages": total_pages,
+            "current_page": current_page,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
+        }
 
         # Use a new little template that only shows the logs table
         if is_ajax:
         # Returns just this template
-            return render_template("partials/logs_table.html", logs=logs, total_pages=total_pages, current_page=current_page)
+            html = render_template("partials/logs_table.html", **context)
+            return fragment_response(fragment_cache.put("logs", data_version, request.full_path, html, store=bool(logs)))
 
         # Returns all logs page
-        return render_template("logs.html", logs=logs, total_pages=total_pages, current_page=current_page)
+        return render_template("logs.html", **context)
 
 
     except Exception as e:
@@ -226,3 +402,265 @@ def view_logs():
         print(f"Error loading logs: {e}")
         flash("Could not load history.", "danger")
         return redirect(url_for('index'))
+
+# Products at or below their reorder level, oldest alert first, with the suggested quantity to buy
+@app.route('/reorder')
+def view_reorder():
+    # Page of the reorder list (Cursors of the previous page)
+    data = reorder.get_reorder_list(db, after=request.args.get('after'), before=request.args.get('before'))
+
+    # Use a new little template that only shows the reorder table
+    if request.args.get('ajax'):
+        return render_template("partials/reorder_table.html", **data)
+
+    # Returns all reorder page
+    return render_template("reorder.html", **data)
+
+# Same page of the reorder list as JSON (For purchasing tools)
+@app.route('/reorder.json')
+def reorder_api():
+    data = reorder.get_reorder_list(db, after=request.args.get('after'), before=request.args.get('before'),
+                                    per_page=min(max(request.args.get('limit', reorder.PER_PAGE, type=int), 1), 500))
+
+    return jsonify(dict(data, window_days=reorder.WINDOW_DAYS, lead_days=reorder.LEAD_DAYS,
+                        cover_days=reorder.COVER_DAYS))
+
+# Movement analytics of a date range from the daily rollups (Throughput, top movers, turnover, days of cover)
+# /analytics.json?start=2026-01-01&end=2026-01-31&rank=turnover&limit=20 (Default: the last 30 days by units out)
+@app.route('/analytics.json')
+def analytics_api():
+    ranking = request.args.get('rank', 'out')
+    if ranking not in analytics.RANKINGS:
+        return jsonify({"success": False, "message": f"Rank must be one of: {', '.join(analytics.RANKINGS)}."}), 400
+
+    try:
+        start, end = analytics.parse_range(request.args.get('start'), request.args.get('end'))
+
+    # Invalid dates
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    limit = min(max(request.args.get('limit', analytics.TOP_LIMIT, type=int), 1), analytics.MAX_LIMIT)
+
+    totals = analytics.get_daily_totals(db, start, end)
+    products = analytics.get_top_movers(db, start, end, ranking, limit)
+
+    # A failed query is an error, not an empty range
+    if totals is None or products is None:
+        return jsonify({"success": False, "message": "Analytics could not be computed."}), 500
+
+    return jsonify(dict(totals, success=True, start=start, end=end, rank=ranking, products=products))
+
+# Streaming download of the stock report or the audit log, for accounting
+# /export/stock.csv?as_of=2026-01-31           Stock at a past date (Default: current stock)
+# /export/logs.ndjson?from=2026-01-01&to=2026-01-31
+# gzip=1 downloads a .gz file, and clients that accept gzip get a compressed response anyway (gzip=0 turns it off)
+@app.route("/export/<any(stock, logs):dataset>.<any(csv, ndjson):fmt>")
+def export_data(dataset, fmt):
+    try:
+        if dataset == "stock":
+            fields = exports.STOCK_FIELDS
+            chunks = exports.stock_chunks(db, as_of=exports.parse_date(request.args.get("as_of"), end_of_day=True))
+        else:
+            fields = exports.LOG_FIELDS
+            chunks = exports.log_chunks(db,
+                                        start=exports.parse_date(request.args.get("from")),
+                                        end=exports.parse_date(request.args.get("to"), end_of_day=True))
+
+    # Invalid date filter
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    # Rows are formatted and sent chunk by chunk while they are read
+    body = exports.csv_stream(fields, chunks) if fmt == "csv" else exports.ndjson_stream(fields, chunks)
+    filename = f"{dataset}.{fmt}"
+    mimetype = exports.FORMATS[fmt]
+    headers = {}
+
+    gzip_param = request.args.get("gzip")
+    if gzip_param == "1":
+        # Compressed file download
+        body = exports.gzip_stream(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    elif gzip_param != "0" and "gzip" in request.headers.get("Accept-Encoding", ""):
+        # Compressed transfer, the client saves the plain file
+        body = exports.gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+# Live stock updates for the open dashboards: the changes of every worker after the last event id
+# the browser got (Polled by scripts.js in the default 'poll' mode)
+@app.route("/events/poll")
+def poll_events():
+    return jsonify(events.poll(db, request.args.get("after"), summary=lambda: reports.get_inventory_summary(db)))
+
+# Live stock updates as Server-Sent Events (Only in 'sse' mode: every open stream holds a worker thread)
+# A reconnecting browser sends Last-Event-ID and gets the events it missed
+@app.route("/events")
+def stock_events():
+    if events.MODE != "sse":
+        return jsonify({"success": False, "message": "Live streams are off, poll /events/poll instead."}), 404
+
+    body = events.stream(db, request.headers.get("Last-Event-ID"), summary=lambda: reports.get_inventory_summary(db))
+
+    # Too many open streams in this process, the browser retries later
+    if body is None:
+        return jsonify({"success": False, "message": "Too many live connections."}), 503
+
+    # No caching or proxy buffering, every event must arrive right away
+    return Response(body, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Prometheus metrics of this process (Query and request timings, cache and audit queue)
+@app.route("/metrics")
+def view_metrics():
+    cache = summary_cache.stats()
+    fragments = fragment_cache.stats()
+    products = catalog.stats()
+
+    # Values that are read when scraped, not counted on every request
+    gauges = {
+        "stockflow_audit_queue_pending": ("Audit rows waiting for the background writer.", audit.pending()),
+        "stockflow_summary_cache_hits": ("Dashboard KPI reads served from memory.", cache["hits"]),
+        "stockflow_summary_cache_misses": ("Dashboard KPI reads that recomputed the summary.", cache["misses"]),
+        "stockflow_db_idle_connections": ("Idle SQLite connections in the pool.", db.pool.idle()),
+        "stockflow_events_clients": ("Open live update streams (/events, sse mode).", events.clients()),
+        "stockflow_catalog_products": ("Products in the in-memory catalog of this process.", products["products"]),
+        "stockflow_catalog_bytes": ("Memory used by the in-memory catalog.", products["bytes"]),
+        "stockflow_catalog_hits": ("Product lookups served from the in-memory catalog.", products["hits"]),
+        "stockflow_catalog_misses": ("Product lookups that read the products table (Catalog loading or off).", products["misses"]),
+        "stockflow_fragment_cache_bytes": ("Memory used by the rendered table fragments.", fragments["bytes"]),
+        "stockflow_fragment_cache_hits": ("Table fragments served from memory.", fragments["hits"]),
+        "stockflow_fragment_cache_misses": ("Table fragments rendered again.", fragments["misses"]),
+    }
+
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+# Maintenance command: recompute every stock balance from the transactions ledger
+# Usage: flask rebuild-balances
+@app.cli.command("rebuild-balances")
+def rebuild_balances_command():
+    count = balances.rebuild_balances(db)
+    click.echo(f"Rebuilt {count} stock balances from the transactions ledger.")
+
+# Maintenance command: compare stock balances with the ledger (Exit code 1 if they don't match)
+# Usage: flask check-balances
+@app.cli.command("check-balances")
+def check_balances_command():
+    mismatches = balances.check_balances(db)
+
+    # Everything is in sync
+    if not mismatches:
+        click.echo("Stock balances match the transactions ledger.")
+        return
+
+    # Print every product that drifted and fail
+    for row in mismatches:
+        click.echo(f"Product {row['id']} (SKU: {row['sku']}): balance={row['balance']} ledger={row['ledger']}")
+    raise click.ClickException(f"{len(mismatches)} stock balances don't match the ledger. Run 'flask rebuild-balances'.")
+
+# Maintenance command: checkpoint the ledger into stock snapshots and optionally archive old movements
+# Usage: flask compact-ledger [--archive] [--keep-days 90] [--archive-path inventory-archive.db]
+@app.cli.command("compact-ledger")
+@click.option("--archive", is_flag=True, help="Move old movements covered by a snapshot to the archive file.")
+@click.option("--keep-days", type=int, default=snapshots.ARCHIVE_KEEP_DAYS, show_default=True,
+              help="Movements younger than this stay in the live ledger.")
+@click.option("--archive-path", default=snapshots.ARCHIVE_PATH, show_default=True, help="SQLite archive file.")
+def compact_ledger_command(archive, keep_days, archive_path):
+    count, transaction_id = snapshots.take_snapshot(db)
+    click.echo(f"Snapshot of {count} products through transaction {transaction_id}.")
+
+    if archive:
+        archived = snapshots.archive_ledger(db, archive_path, keep_days)
+        click.echo(f"Archived {archived} movements to {archive_path}.")
+
+# Maintenance command: stock of every product at a past date (CSV to stdout)
+# Usage: flask stock-as-of "2026-01-31 23:59:59" [--product-id 5]
+@app.cli.command("stock-as-of")
+@click.argument("timestamp")
+@click.option("--product-id", type=int, default=None, help="Only this product.")
+def stock_as_of_command(timestamp, product_id):
+    try:
+        rows = snapshots.stock_as_of(db, timestamp, product_id)
+
+    # The date needs a ledger archive that is missing
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo("id,sku,name,quantity")
+    for row in rows:
+        click.echo(f"{row['id']},{row['sku']},\"{row['name']}\",{row['quantity']}")
+
+# Maintenance command: bulk product import from a CSV file
+# Usage: flask import-products catalog.csv
+@app.cli.command("import-products")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_products_command(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        success, message, report = importer.import_products(db, f)
+
+    # Row errors first, then the totals
+    for error in report["errors"]:
+        click.echo(f"Line {error['line']} (SKU: {error['sku']}): {error['message']}")
+    if report["errors_truncated"]:
+        click.echo(f"... only the first {importer.MAX_REPORTED_ERRORS} errors are shown.")
+
+    click.echo(f"{message} {report.get('seconds', 0)}s, {report.get('rows_per_second') or 0} rows/s.")
+    if not success:
+        raise click.ClickException("Nothing was imported.")
+
+# Maintenance command: recompute the daily rollups of the analytics from the ledger (Days of archived movements are kept)
+# Usage: flask rebuild-rollups
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    count = analytics.rebuild(db)
+    click.echo(f"Rebuilt {count} daily rollups from the transactions ledger.")
+
+# Maintenance command: run the single writer process of the SQLite file (Workers send it their buys, sells and new products)
+# Usage: STOCKFLOW_WRITER_SOCKET=/run/stockflow/writer.sock STOCKFLOW_WRITER_AUTHKEY=<secret> flask run-writer
+@app.cli.command("run-writer")
+def run_writer_command():
+    if db.dialect != "sqlite":
+        raise click.ClickException("The writer process is only for SQLite.")
+    if not writer.SOCKET:
+        raise click.ClickException("Set STOCKFLOW_WRITER_SOCKET to the path of the writer socket.")
+    if len(writer.AUTHKEY) < writer.MIN_AUTHKEY:
+        raise click.ClickException(f"Set STOCKFLOW_WRITER_AUTHKEY to a secret of at least {writer.MIN_AUTHKEY} characters "
+                                   "(The same value in the workers).")
+
+    click.echo(f"Writer listening on {writer.SOCKET} (Up to {writer.GROUP_MAX} commands per transaction).")
+    try:
+        writer.serve(db)
+
+    # Ctrl+C: print what the writer did
+    except KeyboardInterrupt:
+        counters = writer.stats()
+        click.echo(f"Applied {counters['commands']} commands in {counters['groups']} transactions "
+                   f"(Largest: {counters['largest_group']}).")
+
+# Maintenance command: apply the pending schema migrations (Deploy step when STOCKFLOW_MIGRATE_ON_BOOT=0)
+# Usage: flask migrate [--target 3]
+@app.cli.command("migrate")
+@click.option("--target", type=int, default=None, help="Stop at this version (Default: the latest).")
+def migrate_command(target):
+    applied = migrations.migrate(db, target)
+    click.echo(f"Applied {len(applied)} migrations. Schema version: {migrations.current_version(db)}.")
+
+# Maintenance command: list the migrations and which ones are applied (Exit code 1 if any is pending or edited)
+# Usage: flask migrate-status
+@app.cli.command("migrate-status")
+def migrate_status_command():
+    problems = 0
+    for migration in migrations.status(db):
+        state = f"applied {migration['applied_at']}" if migration["applied"] else "pending"
+        if migration["changed"]:
+            state += " (File changed after it was applied)"
+        problems += not migration["applied"] or migration["changed"]
+        click.echo(f"{migration['version']:04d}_{migration['name']}: {state}")
+
+    if problems:
+        raise click.ClickException(f"{problems} migrations are pending or were edited.")
@@ -0,0 +1,181 @@
+"""
+Audit Module - Batched Audit Logging
+------------------------------------
+This module writes the rows of the 'logs' table. In 'async' mode the request
+only puts the row in an in-process queue, and a background thread inserts
+the queued rows with executemany when the batch is full or the flush
+interval passes, so audit logging costs almost nothing on the hot path.
+
+Durability modes (STOCKFLOW_AUDIT_MODE):
+- async: Queued after the COMMIT of the caller's transaction and written by
+  the background thread (Default). Rows of a transaction that rolls back are
+  dropped. A crash can lose at most the last flush interval of logs, never
+  stock movements.
+- sync:  Inserted right away, inside the caller's transaction (Same commit
+  as the movement it describes).
+
+Note: The queue is flushed on shutdown, and if it's full the row is written
+synchronously instead of being dropped.
+"""
+
+# Import os to read the settings, queue and threading for the writer, time for the timestamps
+import atexit
+import os
+import queue
+import threading
+import time
+
+# Durability mode: 'async' or 'sync'
+AUDIT_MODE = os.environ.get("STOCKFLOW_AUDIT_MODE", "async").lower()
+
+# Rows per INSERT batch and max seconds a row waits in the queue
+BATCH_SIZE = int(os.environ.get("STOCKFLOW_AUDIT_BATCH_SIZE", 500))
+FLUSH_INTERVAL = float(os.environ.get("STOCKFLOW_AUDIT_FLUSH_INTERVAL", 0.5))
+
+# Max rows waiting in memory (Back pressure: when it's full, rows are written synchronously)
+QUEUE_MAX = int(os.environ.get("STOCKFLOW_AUDIT_QUEUE_MAX", 100000))
+
+# Insert with an explicit timestamp (The moment of the action, not the moment of the flush)
+INSERT_LOG = "INSERT INTO logs (type, action, description, timestamp) VALUES (?, ?, ?, ?)"
+
+# Queue of pending rows and the state of the background writer
+_queue = queue.Queue(maxsize=QUEUE_MAX)
+_stop = threading.Event()
+_writer = {"thread": None, "pid": None, "db": None}
+_writer_lock = threading.Lock()
+
+
+# Records one audit row: (type, action, description)
+def record(db, type, action, description):
+    record_many(db, [(type, action, description)])
+
+# Records many audit rows at once (Bulk movements)
+def record_many(db, rows):
+    # Same format as SQLite's CURRENT_TIMESTAMP (UTC)
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    rows = [(type, action, description, timestamp) for type, action, description in rows]
+
+    if AUDIT_MODE == "sync":
+        _insert(db, rows)
+        return
+
+    # Only the rows of a saved transaction are queued (Right away outside a transaction)
+    if hasattr(db, "on_commit"):
+        db.on_commit(lambda: _enqueue(db, rows))
+    else:
+        _enqueue(db, rows)
+
+# Writes every queued row now, in the caller's thread (Shutdown, maintenance commands)
+def flush():
+    db = _writer["db"]
+    rows = _drain()
+    if db is not None and rows:
+        _write_batch(db, rows)
+
+# Stops the background writer and writes what is left in the queue
+def shutdown():
+    _stop.set()
+    thread = _writer["thread"]
+    if thread is not None and thread.is_alive():
+        thread.join(timeout=FLUSH_INTERVAL * 4)
+    flush()
+
+# Number of rows waiting in the queue (For monitoring)
+def pending():
+    return _queue.qsize()
+
+
+# Starts the background writer the first time it's needed (Also after a fork, like gunicorn workers)
+def _ensure_writer(db):
+    if _writer["pid"] == os.getpid() and _writer["thread"] is not None:
+        return
+
+    with _writer_lock:
+        if _writer["pid"] == os.getpid() and _writer["thread"] is not None:
+            return
+
+        _stop.clear()
+        _writer["db"] = db
+        _writer["pid"] = os.getpid()
+        _writer["thread"] = threading.Thread(target=_run, name="audit-writer", daemon=True)
+        _writer["thread"].start()
+
+# Puts the rows in the queue of the background writer
+def _enqueue(db, rows):
+    _ensure_writer(db)
+    for index, row in enumerate(rows):
+        try:
+            _queue.put_nowait(row)
+
+        except queue.Full:
+            # The writer can't keep up: write the rest now instead of losing them
+            _insert(db, rows[index:])
+            return
+
+# Background loop: waits for a full batch or the flush interval, then writes it
+def _run():
+    while not _stop.is_set():
+        rows = _collect()
+        if rows:
+            _write_batch(_writer["db"], rows)
+
+# Takes up to BATCH_SIZE rows, waiting at most FLUSH_INTERVAL after the first one
+def _collect():
+    try:
+        rows = [_queue.get(timeout=FLUSH_INTERVAL)]
+    except queue.Empty:
+        return []
+
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(rows) < BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        try:
+            rows.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+
+    return rows
+
+# Takes every row in the queue without waiting
+def _drain():
+    rows = []
+    while True:
+        try:
+            rows.append(_queue.get_nowait())
+        except queue.Empty:
+            return rows
+
+# Writes a batch in its own transaction (One commit for the whole batch)
+def _write_batch(db, rows):
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        _insert(db, rows)
+        db.execute("COMMIT")
+
+    except Exception as e:
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+
+        # The logs table can't be reached, print them so they aren't lost silently
+        print("\n!!! AUDIT WRITER ERROR !!!")
+        print(f"Could not write {len(rows)} audit rows: {e}")
+        for row in rows:
+            print(f"[AUDIT] {row}")
+
+# Inserts the rows with one prepared statement when the connection supports it
+def _insert(db, rows):
+    if hasattr(db, "executemany"):
+        db.executemany(INSERT_LOG, rows)
+        return
+
+    for row in rows:
+        db.execute(INSERT_LOG, *row)
+
+
+# Write the pending rows when the process exits
+atexit.register(shutdown)
@@ -0,0 +1,114 @@
+"""
+Balances Module - Materialized Stock Levels
+-------------------------------------------
+This module owns the 'stock_balances' table, a per-product running total
+of the 'transactions' ledger. Reads use it instead of summing the whole
+movement history, so stock queries cost O(products) and not O(transactions).
+
+Key Responsibilities:
+- Write Path: Applies the quantity of every movement to its product balance.
+- Rebuild: Recomputes every balance from the ledger (backfill or repair).
+- Consistency Check: Compares the balances against the ledger and reports drift.
+
+Note: The ledger ('transactions' plus the checkpoints of snapshots.py) is
+always the source of truth.
+"""
+
+# Import the function to log system errors
+from helpers import log_system_error, rollback, insert_many
+
+# Import the live updates of the open dashboards (A rebuild reloads them)
+import events
+
+# Import the set of products to reorder (Rebuilt with the balances)
+import reorder
+
+# Import the ledger checkpoints (Balance = latest snapshot + movements after it)
+from snapshots import LEDGER_BALANCES
+
+# Adds a movement's signed quantity to the product balance (Returns False if stock would go negative)
+def apply_delta(db, product_id, quantity):
+    # Outgoing stock: conditional decrement, the check runs inside SQLite and not in Python
+    if quantity < 0:
+        updated = db.execute("""
+            UPDATE stock_balances
+            SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE product_id = ? AND quantity + ? >= 0
+        """, quantity, product_id, quantity)
+        return updated == 1
+
+    # Incoming stock: creates the row if it doesn't exist
+    db.execute("""
+        INSERT INTO stock_balances (product_id, quantity)
+        VALUES (?, ?)
+        ON CONFLICT(product_id) DO UPDATE SET
+            quantity = stock_balances.quantity + excluded.quantity,
+            updated_at = CURRENT_TIMESTAMP
+    """, product_id, quantity)
+    return True
+
+# Applies the net quantity of many products at once (Returns False if any balance would go negative)
+# Input: dictionary of {product_id: signed quantity}
+def apply_deltas(db, deltas):
+    if not deltas:
+        return True
+
+    # One upsert for every product of the batch
+    insert_many(db, "stock_balances", ["product_id", "quantity"], list(deltas.items()), suffix="""
+        ON CONFLICT(product_id) DO UPDATE SET
+            quantity = stock_balances.quantity + excluded.quantity,
+            updated_at = CURRENT_TIMESTAMP
+    """)
+
+    # Guard: the products that lost stock must still be non negative (Caller rolls back if not)
+    decreased = [product_id for product_id, quantity in deltas.items() if quantity < 0]
+    if not decreased:
+        return True
+
+    negative = db.execute("""
+        SELECT COUNT(*) AS count FROM stock_balances
+        WHERE product_id IN (?) AND quantity < 0
+    """, decreased)
+    return negative[0]["count"] == 0
+
+# Recomputes every balance from the transactions ledger (Returns the number of balances written)
+def rebuild_balances(db):
+    try:
+        # Take the write lock (And the table locks on PostgreSQL) so no movement lands between the delete and the insert
+        db.execute("BEGIN IMMEDIATE")
+        db.lock_table("transactions")
+        db.lock_table("stock_balances")
+
+        db.execute("DELETE FROM stock_balances")
+        db.execute("INSERT INTO stock_balances (product_id, quantity) " + LEDGER_BALANCES)
+        reorder.rebuild(db)
+
+        # Any balance can change: the dashboards reload and every KPI is recomputed (Saved with the rebuild)
+        events.publish(db, "reload", {"reason": "rebuild"})
+
+        db.execute("COMMIT")
+
+        # Count the rebuilt rows to show them in the console
+        return db.execute("SELECT COUNT(*) AS count FROM stock_balances")[0]["count"]
+
+    except Exception as e:
+        # Undo the partial rebuild, the old balances stay in place
+        rollback(db)
+
+        # Print for developer and register into logs table
+        print(f"Error in rebuild_balances: {e}")
+        log_system_error(db, e, action="REBUILD_BALANCES_FAIL")
+        raise
+
+# Compares every balance with its ledger (Returns a list with the products that don't match)
+def check_balances(db):
+    return db.execute(f"""
+        SELECT p.id, p.sku,
+               b.quantity AS balance,
+               l.quantity AS ledger
+        FROM products p
+        JOIN ({LEDGER_BALANCES}) l ON p.id = l.product_id
+        LEFT JOIN stock_balances b ON p.id = b.product_id
+        WHERE b.product_id IS NULL OR b.quantity != l.quantity
+        ORDER BY p.id
+    """)
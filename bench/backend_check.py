@@ -0,0 +1,332 @@
+"""
+Backend Conformance Check - SQLite & PostgreSQL
+-----------------------------------------------
+Runs the same scenario through logic.py, reports.py and the maintenance
+modules on one storage backend, and fails if any result differs from what
+the SQLite backend returns. Run it once per backend (The test matrix):
+
+    python bench/backend_check.py                                  # Temp SQLite file
+    python bench/backend_check.py --db-url postgresql://localhost/stockflow_check
+    python bench/backend_check.py --ephemeral-postgres             # Throwaway cluster
+    python bench/backend_check.py --writer                         # SQLite, writes through writer.py
+
+--db-url needs an EMPTY database (The script creates the tables).
+--ephemeral-postgres needs the PostgreSQL server binaries (initdb, pg_ctl) in
+the PATH: it creates a cluster in a temp folder, runs the check and removes it.
+Both need psycopg (pip install "psycopg[binary]").
+--writer runs the writer process in a thread (STOCKFLOW_WRITER_SOCKET in a
+temp folder), sends every buy, sell and new product to it, and adds checks of
+its group commit.
+"""
+
+import argparse
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Allow running the script from any directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Audit rows in the same transaction, so the checks see them at once
+os.environ.setdefault("STOCKFLOW_AUDIT_MODE", "sync")
+
+# Secret of the --writer thread (No default in writer.py)
+os.environ.setdefault("STOCKFLOW_WRITER_AUTHKEY", secrets.token_hex(16))
+
+import analytics
+import audit
+import balances
+import catalog
+import events
+import exports
+import fragment_cache
+import helpers
+import idempotency
+import importer
+import logic
+import reorder
+import reports
+import snapshots
+import writer
+
+
+# Every step of the scenario, with the result it must give on any backend
+def run_checks(db):
+    errors = []
+
+    def check(name, condition):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            errors.append(name)
+
+    # Products (And the duplicate SKU rule)
+    success, _, widget = logic.add_product(db, "Widget", "wid-1", 2.5, 10, 3)
+    check("add product", success and isinstance(widget, int))
+    success, _, gadget = logic.add_product(db, "gadget", "GAD-1", 4, 2, 5)
+    check("add product at its reorder level", success)
+    success, message, _ = logic.add_product(db, "Other", "WID-1", 1, 0, 0)
+    check("duplicate SKU rejected", not success and "already in use" in message)
+
+    # Catalog of this process, loaded once (The next steps read the products from it)
+    catalog.load(db)
+    check("catalog", catalog.get(db, widget)["sku"] == "WID-1" and catalog.find_sku(db, "GAD-1") == gadget
+          and catalog.stats()["products"] == 2)
+
+    # Movements (Guarded stock, no negative balances)
+    success, _, stock, _ = logic.add_transaction(db, widget, 8, "OUT")
+    check("sell", success and stock == 2)
+    success, message, _, _ = logic.add_transaction(db, widget, 5, "OUT")
+    check("oversell rejected", not success and "Insufficient" in message)
+    success, _, stock, _ = logic.add_transaction(db, widget, 4, "IN")
+    check("buy", success and stock == 6)
+
+    # Idempotent retries (Same key: one movement and the first result, another request with the key is rejected)
+    movements = len(db.execute("SELECT id FROM transactions"))
+    first = logic.add_transaction(db, widget, 1, "IN", "check-key-in")
+    retry = logic.add_transaction(db, widget, 1, "IN", "check-key-in")
+    check("idempotent retry", first[:3] == (True, "Success", 7) and retry == first
+          and len(db.execute("SELECT id FROM transactions")) == movements + 1)
+    success, message, _, _ = logic.add_transaction(db, widget, 1, "OUT", "check-key-in")
+    check("key reused for another movement rejected", not success and "different request" in message)
+    success, _, stock, _ = logic.add_transaction(db, widget, 1, "OUT", "check-key-out")
+    check("new key", success and stock == 6)
+
+    success, _, results = logic.add_transactions_batch(db, [
+        {"product_id": widget, "type": "OUT", "quantity": 1},
+        {"product_id": gadget, "type": "IN", "quantity": 10},
+    ], "atomic")
+    check("atomic batch", success and [line["new_stock"] for line in results] == [5, 12])
+
+    # Async audit rows are queued after COMMIT: a batch that rolls back (Or its savepoint, like a
+    # rejected command of a writer group) leaves no log
+    audit.AUDIT_MODE = "async"
+    db.execute("BEGIN IMMEDIATE")
+    audit.record_many(db, [("USER", "BULK_MOVE", "check: rolled back batch")])
+    helpers.rollback(db)
+    db.execute("BEGIN IMMEDIATE")
+    audit.record(db, "USER", "BULK_MOVE", "check: committed batch")
+    db.execute("SAVEPOINT command")
+    audit.record(db, "USER", "BULK_MOVE", "check: rolled back savepoint")
+    db.execute("ROLLBACK TO command")
+    db.execute("RELEASE command")
+    db.execute("COMMIT")
+    audit.shutdown()
+    audit.AUDIT_MODE = "sync"
+    logged = [row["description"] for row in db.execute("SELECT description FROM logs WHERE description LIKE 'check: %'")]
+    check("async audit rows only after COMMIT", logged == ["check: committed batch"])
+
+    # Live updates: every committed movement is a row of the shared events table, a rejected one is not
+    start = events.poll(db)["last_id"]
+    versions = [fragment_cache.version(db, "stock"), fragment_cache.version(db, "logs")]
+    logic.add_transaction(db, gadget, 1, "IN")
+    logic.add_transaction(db, gadget, 1000, "OUT")
+    logic.add_transaction(db, gadget, 1, "OUT")
+    changes = events.poll(db, start)["events"]
+    check("events of committed movements", [(event["type"], event["data"]["new_stock"]) for event in changes] == [("stock", 13), ("stock", 12)])
+    check("table page versions read from the database",
+          fragment_cache.version(db, "stock") not in versions and fragment_cache.version(db, "logs") != versions[1])
+
+    # Reads
+    report = reports.get_stock_report(db, per_page=1)
+    check("stock report keyset page", [item["name"] for item in report["products"]] == ["Widget"] and report["next_cursor"])
+    report = reports.get_stock_report(db, per_page=1, after=report["next_cursor"])
+    check("stock report next page", [item["name"] for item in report["products"]] == ["gadget"])
+
+    check("search by SKU prefix", [item["sku"] for item in reports.search_products(db, "gad")] == ["GAD-1"])
+    check("search by name prefix (Case insensitive)", [item["name"] for item in reports.search_products(db, "WID")] == ["Widget"])
+
+    summary = reports.compute_inventory_summary(db)
+    check("summary", summary["total_items"] == 2 and round(summary["total_value"], 2) == 60.5)
+
+    # Reorder list: gadget left it with the batch, widget never entered it (5 > 3)
+    check("reorder list", reorder.get_reorder_list(db)["total"] == 0)
+    logic.add_transaction(db, widget, 3, "OUT")
+    listed = reorder.get_reorder_list(db)["products"]
+    check("reorder suggestion", [item["id"] for item in listed] == [widget] and listed[0]["suggested_quantity"] > 0)
+
+    # Bulk import (One good row, one duplicate, one invalid)
+    success, _, report = importer.import_products(db, [
+        "name,sku,price,initial_stock\n", "Bolt,BLT-1,0.1,100\n", "Dup,WID-1,1,1\n", "Bad,BAD-1,x,1\n"])
+    check("import", report["imported"] == 1 and report["failed"] == 2)
+    bolt = catalog.find_sku(db, "BLT-1")
+    check("imported product in the catalog", bolt is not None and catalog.get(db, bolt)["name"] == "Bolt")
+
+    # Analytics: the rollups of every write path match the ledger, before and after a rebuild
+    start, end = analytics.parse_range()
+    sold = {row["product_id"]: row["quantity"] for row in db.execute(
+        "SELECT product_id, -SUM(quantity) AS quantity FROM transactions WHERE quantity < 0 GROUP BY product_id")}
+    movers = analytics.get_top_movers(db, start, end, "out", 100)
+    check("top movers", {row["id"]: row["quantity_out"] for row in movers if row["quantity_out"]} == sold
+          and movers[0]["id"] == widget and movers[0]["closing_stock"] == movers[0]["current_stock"])
+    totals = analytics.get_daily_totals(db, start, end)["totals"]
+    analytics.rebuild(db)
+    check("rebuild rollups", analytics.get_daily_totals(db, start, end)["totals"] == totals
+          and totals["movements"] == len(db.execute("SELECT id FROM transactions")))
+
+    # Ledger: snapshot, stock as of now, rebuild and check
+    count, _ = snapshots.take_snapshot(db)
+    check("snapshot", count == 3)
+    as_of = {row["id"]: row["quantity"] for row in snapshots.stock_as_of(db, "2999-12-31 23:59:59")}
+    current = {row["product_id"]: row["quantity"] for row in db.execute("SELECT product_id, quantity FROM stock_balances")}
+    check("stock as of matches the balances", as_of == current)
+    check("rebuild balances", balances.rebuild_balances(db) == 3 and balances.check_balances(db) == [])
+
+    # Streamed export (Server-side cursor)
+    rows = [row for chunk in exports.stock_chunks(db) for row in chunk]
+    check("streamed export", [row[1] for row in rows] == ["BLT-1", "WID-1", "GAD-1"])
+
+    logs = [row for chunk in exports.log_chunks(db) for row in chunk]
+    check("logs export", len(logs) >= 7 and isinstance(logs[0][1], str))
+
+    # Another worker deactivates a product: this one sees the new catalog version on its next movement
+    db.execute("BEGIN IMMEDIATE")
+    db.execute("UPDATE products SET is_active = 0 WHERE id = ?", bolt)
+    catalog.touch(db, [bolt])
+    db.execute("COMMIT")
+    success, message, _, _ = logic.add_transaction(db, bolt, 1, "OUT")
+    check("deactivation seen through the catalog version", not success and "deactivated" in message)
+
+    # The stock export at a date has the same products as the current one (Active only)
+    current = [row[1] for chunk in exports.stock_chunks(db) for row in chunk]
+    past = [row[1] for chunk in exports.stock_chunks(db, as_of="2999-12-31 23:59:59") for row in chunk]
+    check("as of export has the products of the current export", past == current == ["WID-1", "GAD-1"])
+
+    return errors
+
+
+# Group commit of the writer process: commands applied together in one transaction (Called with --writer)
+def run_writer_checks(db):
+    errors = []
+
+    def check(name, condition):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            errors.append(name)
+
+    success, _, product = logic.add_product(db, "Grouped", "GRP-1", 1, 5, 0)
+    check("add product through the writer", success and writer.stats()["commands"] > 0)
+
+    # One group: a sell, an oversell, the same key twice and a sell after them
+    # The rejected oversell and the repeated key leave nothing, the other commands are saved
+    key_fingerprint = idempotency.fingerprint(product, 1, "IN")
+    group = [
+        ("movement", (product, 2, "OUT", None, None), [], threading.Event()),
+        ("movement", (product, 10, "OUT", None, None), [], threading.Event()),
+        ("movement", (product, 1, "IN", "group-key", key_fingerprint), [], threading.Event()),
+        ("movement", (product, 1, "IN", "group-key", key_fingerprint), [], threading.Event()),
+        ("movement", (product, 1, "OUT", None, None), [], threading.Event()),
+    ]
+    groups = writer.stats()["groups"]
+    writer._apply_group(db, group)
+    replies = [reply[0] for _, _, reply, _ in group]
+
+    check("group answered", all(done.is_set() for _, _, _, done in group) and writer.stats()["groups"] == groups + 1)
+    check("sell in a group", replies[0][1][:3] == (True, "Success", 3))
+    check("oversell in a group rejected", replies[1][1][0] is False and "Insufficient" in replies[1][1][1])
+    check("same key twice in a group", replies[2][1][:3] == (True, "Success", 4) and replies[3][1:] == (None, None))
+    check("sell after a rejected command", replies[4][1][:3] == (True, "Success", 3))
+    check("group ledger", len(db.execute("SELECT id FROM transactions WHERE product_id = ?", product)) == 4
+          and db.execute("SELECT quantity FROM stock_balances WHERE product_id = ?", product)[0]["quantity"] == 3)
+
+    # The repeated key is replayed by its sender after the COMMIT
+    retry = logic.add_transaction(db, product, 1, "IN", "group-key")
+    check("replay of a grouped key", retry[:3] == (True, "Success", 4))
+
+    # A group whose COMMIT fails after a sell of its new product (Which refreshed the catalog to the group's version)
+    # The catalog must not keep that version: the next real product stamped with it would never be loaded
+    catalog.load(db)
+    execute = db.execute
+
+    def failing_commit(sql, *args, **kwargs):
+        if sql == "COMMIT":
+            db.execute = execute
+            raise RuntimeError("disk I/O error")
+        return execute(sql, *args, **kwargs)
+
+    db.execute = failing_commit
+    writer._apply_group(db, [
+        ("product", ("Phantom", "PHT-1", 1.0, 5, 0), [], threading.Event()),
+        ("movement", (product + 1, 1, "OUT", None, None), [], threading.Event()),
+    ])
+    db.execute = execute
+    version = catalog.stats()["version"]
+    check("failed group leaves no catalog version", version is None or version <= db.query("SELECT version FROM catalog_version WHERE id = 1")[0]["version"])
+
+    return errors
+
+# Starts a PostgreSQL cluster in a temp folder on a free port (Returns its URL and a function to remove it)
+def start_ephemeral_postgres():
+    for binary in ["initdb", "pg_ctl"]:
+        if shutil.which(binary) is None:
+            sys.exit(f"--ephemeral-postgres needs '{binary}' in the PATH.")
+
+    folder = tempfile.mkdtemp()
+    data = os.path.join(folder, "data")
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    subprocess.run(["initdb", "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["pg_ctl", "-D", data, "-l", os.path.join(folder, "log"), "-w",
+                    "-o", f"-p {port} -k {folder} -c listen_addresses=127.0.0.1", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    def stop():
+        subprocess.run(["pg_ctl", "-D", data, "-m", "immediate", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return f"postgresql://postgres@127.0.0.1:{port}/postgres", stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the same scenario on one storage backend.")
+    parser.add_argument("--db-url", default="", help="Backend URL of an empty database (Default: a temp SQLite file)")
+    parser.add_argument("--ephemeral-postgres", action="store_true", help="Run on a throwaway PostgreSQL cluster")
+    parser.add_argument("--writer", action="store_true", help="Send the writes to the single writer process (SQLite)")
+    args = parser.parse_args()
+
+    stop = None
+    if args.ephemeral_postgres:
+        args.db_url, stop = start_ephemeral_postgres()
+
+    try:
+        db = helpers.init_db(os.path.join(tempfile.mkdtemp(), "check.db"), args.db_url)
+        if db is None:
+            sys.exit("FAIL: could not open the database")
+
+        # The writer process in a thread of this one, on its own connections of the same file
+        if args.writer:
+            if db.dialect != "sqlite":
+                sys.exit("FAIL: --writer is only for SQLite")
+            writer.SOCKET = os.path.join(tempfile.mkdtemp(), "writer.sock")
+            threading.Thread(target=writer.serve, args=(db,), daemon=True).start()
+            while not os.path.exists(writer.SOCKET):
+                time.sleep(0.01)
+
+        print(f"Backend: {db.dialect}{' (Single writer)' if args.writer else ''}")
+        started = time.perf_counter()
+        errors = run_checks(db)
+        if args.writer:
+            errors += run_writer_checks(db)
+        db.close()
+
+    finally:
+        if stop:
+            stop()
+
+    if errors:
+        sys.exit(f"FAIL: {len(errors)} checks failed on {db.dialect}")
+    print(f"OK: {db.dialect} ({time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
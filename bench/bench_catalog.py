@@ -0,0 +1,119 @@
+"""
+Catalog Benchmark - In-Memory Product Catalog at 1M SKUs
+--------------------------------------------------------
+Builds a synthetic inventory (1M products by default), loads the catalog of
+catalog.py and prints:
+
+- Load: seconds of the full load, bytes of the catalog and growth of the
+  process memory (RSS).
+- Lookups: a product by id and by SKU from the catalog vs from the products table.
+- Hot paths: a sell (logic.add_transaction) and a stock table page
+  (reports.get_stock_report) with the catalog and with it turned off.
+
+Usage (From the project root):
+    python bench/bench_catalog.py [--products 1000000] [--repeat 2000] [--json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+# Shared synthetic inventory (Also puts the project root in sys.path)
+from synthetic import build_database, percentiles
+
+import catalog
+import helpers
+import logic
+import metrics
+import reports
+
+
+# Resident memory of this process in bytes (Linux, None elsewhere)
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return None
+
+# Latency percentiles of a function in microseconds
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return {key: round(value, 1) for key, value in percentiles(timings).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and latency of the in-memory product catalog.")
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    # No slow query log while building (Big inserts are expected)
+    metrics.SLOW_QUERY_MS = 0
+
+    print(f"Building {args.products} products...", file=sys.stderr)
+    path = build_database(products=args.products, transactions=args.products, logs=0)
+    db = helpers.connect_db(path)
+    rng = random.Random(7)
+    results = {"products": args.products}
+
+    # Full load (The loader thread runs the same function)
+    before = rss()
+    started = time.perf_counter()
+    catalog.load(db)
+    stats = catalog.stats()
+    results["load"] = {
+        "seconds": round(time.perf_counter() - started, 2),
+        "catalog_mb": round(stats["bytes"] / 1024 / 1024, 1),
+        "bytes_per_product": round(stats["bytes"] / args.products, 1),
+        "rss_growth_mb": round((rss() - before) / 1024 / 1024, 1) if before else None,
+    }
+
+    version = db.query("SELECT version FROM catalog_version WHERE id = 1")[0]["version"]
+    ids = lambda: rng.randint(1, args.products)
+    results["lookup_us"] = {
+        "catalog_by_id": measure(lambda: catalog.get(db, ids(), version), args.repeat),
+        "catalog_by_id_with_version_read": measure(lambda: catalog.get(db, ids()), args.repeat),
+        "catalog_by_sku": measure(lambda: catalog.find_sku(db, f"SKU-{ids():06d}", version), args.repeat),
+        "table_by_id": measure(lambda: db.query(f"SELECT {catalog.COLUMNS} FROM products WHERE id = ?", ids()), args.repeat),
+        "table_by_sku": measure(lambda: db.query("SELECT id FROM products WHERE sku = ?", f"SKU-{ids():06d}"), args.repeat),
+    }
+
+    def hot_paths():
+        return {
+            "sell": measure(lambda: logic.add_transaction(db, ids(), 1, "OUT"), args.repeat),
+            "stock_page": measure(lambda: reports.get_stock_report(db, page=rng.randint(1, 50)), args.repeat),
+        }
+
+    results["hot_paths_us"] = {"catalog": hot_paths()}
+
+    # The same paths reading the products table (Like a process whose catalog is still loading or over its memory bound)
+    catalog._state["catalog"] = None
+    catalog._state["disabled"] = True
+    results["hot_paths_us"]["products_table"] = hot_paths()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    load = results["load"]
+    print(f"{args.products} products: loaded in {load['seconds']}s, catalog {load['catalog_mb']} MB "
+          f"({load['bytes_per_product']} bytes per product), RSS +{load['rss_growth_mb']} MB")
+    print(f"{'lookup':<34} {'p50 us':>8} {'p99 us':>8}")
+    for name, timing in results["lookup_us"].items():
+        print(f"{name:<34} {timing['p50']:>8} {timing['p99']:>8}")
+    print(f"{'hot path':<34} {'p50 us':>8} {'p99 us':>8}")
+    for source, paths in results["hot_paths_us"].items():
+        for name, timing in paths.items():
+            print(f"{name + ' (' + source + ')':<34} {timing['p50']:>8} {timing['p99']:>8}")
+
+
+if __name__ == "__main__":
+    main()
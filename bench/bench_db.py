@@ -0,0 +1,118 @@
+"""
+Micro-benchmark - cs50.SQL vs the pooled sqlite3 layer
+------------------------------------------------------
+Runs the report queries of reports.py and logic.py against the same
+synthetic database with three drivers:
+
+- cs50:     cs50.SQL.execute (sqlparse + own parameter escaping + dicts)
+- execute:  database.Database.execute (sqlite3, cached statements, dicts)
+- query:    database.Database.query (sqlite3, cached statements, Row tuples)
+
+Usage (From the project root):
+    python bench/bench_db.py --products 5000 --transactions 100000 --repeat 200
+    python bench/bench_db.py --json > bench_output.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+# Shared synthetic inventory (Also puts the project root in sys.path)
+from synthetic import build_database, percentiles
+
+import helpers
+import reports
+
+# Queries to compare (Same SQL the app runs, with fixed parameters)
+QUERIES = {
+    "stock_page": (reports.STOCK_COLUMNS + """
+        WHERE p.is_active = 1
+        ORDER BY p.name ASC, p.id ASC
+        LIMIT ? OFFSET ?
+    """, (11, 0)),
+    "stock_page_cursor": (reports.STOCK_COLUMNS + """
+        WHERE p.is_active = 1 AND (p.name, p.id) > (?, ?)
+        ORDER BY p.name ASC, p.id ASC
+        LIMIT ?
+    """, ("Product 2500", 2500, 11)),
+    "logs_page": ("""
+        SELECT id, type, action, description, timestamp
+        FROM logs
+        WHERE id < ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (1000, 11)),
+    "product_lookup": ("""
+        SELECT p.name, p.sku, p.price, p.is_active, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+        FROM products p
+        LEFT JOIN stock_balances b ON p.id = b.product_id
+        WHERE p.id = ?
+    """, (1234,)),
+    "search_sku": ("""
+        SELECT p.id, p.name, p.sku, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+        FROM products p
+        LEFT JOIN stock_balances b ON p.id = b.product_id
+        WHERE p.sku >= ? AND p.sku < ? AND p.is_active = 1
+        ORDER BY p.sku
+        LIMIT ?
+    """, ("SKU-12", "SKU-12" + reports.PREFIX_END, 20)),
+}
+
+
+# Runs a callable many times and returns the timings in microseconds
+def measure(run, repeat):
+    run()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1e6)
+    result = {"mean_us": round(statistics.mean(timings), 1)}
+    result.update({f"{name}_us": round(value, 1) for name, value in percentiles(timings).items()})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cs50.SQL vs database.Database on the report queries.")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON only")
+    args = parser.parse_args()
+
+    path = build_database(args.products, args.transactions, args.transactions)
+
+    # Drivers to compare (cs50 is optional)
+    db = helpers.connect_db(path)
+    drivers = {
+        "execute": lambda sql, params: db.execute(sql, *params),
+        "query": lambda sql, params: db.query(sql, *params),
+    }
+    try:
+        from cs50 import SQL
+        cs50_db = SQL(f"sqlite:///{path}")
+        drivers = dict({"cs50": lambda sql, params: cs50_db.execute(sql, *params)}, **drivers)
+    except ImportError:
+        print("cs50 is not installed, skipping the cs50.SQL driver.", file=sys.stderr)
+
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        results[name] = {driver: measure(lambda: run(sql, params), args.repeat) for driver, run in drivers.items()}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    # Table for humans: mean per query and driver, and the speedup against cs50
+    print(f"{'query':<20}" + "".join(f"{driver + ' (us)':>16}" for driver in drivers) + f"{'speedup':>10}")
+    for name, timings in results.items():
+        row = f"{name:<20}" + "".join(f"{timings[driver]['mean_us']:>16}" for driver in drivers)
+        if "cs50" in timings:
+            row += f"{timings['cs50']['mean_us'] / timings['query']['mean_us']:>9.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
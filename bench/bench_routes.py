@@ -0,0 +1,158 @@
+"""
+Route Benchmark and Load Test
+-----------------------------
+Generates a synthetic inventory in a temp SQLite file, then drives the
+Flask routes of app.py through the test client:
+
+1. Sequential: every route alone, to measure its latency.
+2. Load: a mix of all routes from several threads at the same time.
+
+Prints p50/p95/p99 latency (ms) and throughput (req/s) per route as JSON.
+With --baseline it compares the p95 of every route with a previous run and
+exits with code 1 on a regression, so it can gate a deploy.
+
+Usage (From the project root):
+    python bench/bench_routes.py --products 20000 --transactions 500000 --logs 500000
+    python bench/bench_routes.py --output bench_output.json
+    python bench/bench_routes.py --baseline bench_output.json --tolerance 0.25
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# The app reads the database path when its modules are imported, so it's set before any import
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["STOCKFLOW_DB_PATH"] = DB_PATH
+
+# Shared synthetic inventory (Also puts the project root in sys.path)
+from synthetic import build_database, percentiles
+
+
+# Routes to measure: name -> function(client, products, counter) that sends one request
+ROUTES = {
+    "GET /": lambda client, products, n: client.get("/"),
+    "GET / (ajax, page 1)": lambda client, products, n: client.get("/?ajax=1"),
+    "GET /logs (ajax)": lambda client, products, n: client.get("/logs?ajax=1"),
+    "GET /products/search": lambda client, products, n: client.get(f"/products/search?q=SKU-{random.randint(1, 99):02d}"),
+    "POST /buy": lambda client, products, n: client.post("/buy", data={
+        "product_id": random.randint(1, products), "quantity": random.randint(1, 5)}),
+    "POST /sell": lambda client, products, n: client.post("/sell", data={
+        "product_id": random.randint(1, products), "quantity": random.randint(1, 5)}),
+    "POST /add_product": lambda client, products, n: client.post("/add_product", data={
+        "name": f"Bench Product {n}", "sku": f"BENCH-{os.getpid()}-{n}", "price": "9.99",
+        "initial_stock": "10", "reorder_level": "5"}),
+    "POST /movements/bulk": lambda client, products, n: client.post("/movements/bulk", json={
+        "mode": "best_effort",
+        "items": [{"product_id": random.randint(1, products), "quantity": 1, "type": "IN"} for _ in range(100)]}),
+}
+
+
+# Sends requests to one route and returns its timings (ms) and errors
+def run_route(client, send, products, requests, counter):
+    timings = []
+    errors = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = send(client, products, next(counter))
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    return timings, errors
+
+
+# Summary of one route: count, errors, percentiles and throughput
+def summarize(timings, errors, elapsed):
+    result = {"requests": len(timings), "errors": errors}
+    result.update({f"{name}_ms": round(value, 3) for name, value in percentiles(timings).items()})
+    result["throughput_rps"] = round(len(timings) / elapsed, 1) if elapsed else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and load test of the Flask routes.")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--logs", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route (Sequential phase)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads in the load phase")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of the load phase")
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--baseline", help="Previous JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    # Fill the database and start the app on it
+    build_database(args.products, args.transactions, args.logs, path=DB_PATH)
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+
+    counter = itertools.count()
+
+    # 1. Sequential phase: one route at a time
+    sequential = {}
+    for name, send in ROUTES.items():
+        client = app.app.test_client()
+        started = time.perf_counter()
+        timings, errors = run_route(client, send, args.products, args.requests, counter)
+        sequential[name] = summarize(timings, errors, time.perf_counter() - started)
+
+    # 2. Load phase: every thread sends a random mix of routes until the time is over
+    def load_worker():
+        client = app.app.test_client()
+        deadline = time.monotonic() + args.duration
+        results = {name: ([], 0) for name in ROUTES}
+        while time.monotonic() < deadline:
+            name = random.choice(list(ROUTES))
+            timings, errors = run_route(client, ROUTES[name], args.products, 1, counter)
+            results[name] = (results[name][0] + timings, results[name][1] + errors)
+        return results
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        workers = [executor.submit(load_worker) for _ in range(args.concurrency)]
+        merged = {name: ([], 0) for name in ROUTES}
+        for worker in workers:
+            for name, (timings, errors) in worker.result().items():
+                merged[name] = (merged[name][0] + timings, merged[name][1] + errors)
+    elapsed = time.perf_counter() - started
+
+    load = {name: summarize(timings, errors, elapsed) for name, (timings, errors) in merged.items()}
+    total = sum(result["requests"] for result in load.values())
+
+    report = {
+        "config": vars(args),
+        "sequential": sequential,
+        "load": {"concurrency": args.concurrency, "total_throughput_rps": round(total / elapsed, 1), "routes": load},
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    # Regression gate against a previous run
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["sequential"]
+
+        regressions = [
+            f"{name}: p95 {result['p95_ms']}ms vs {baseline[name]['p95_ms']}ms"
+            for name, result in sequential.items()
+            if name in baseline and baseline[name]["p95_ms"]
+            and result["p95_ms"] > baseline[name]["p95_ms"] * (1 + args.tolerance)
+        ]
+        if regressions:
+            sys.exit("Regressions:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
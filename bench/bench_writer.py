@@ -0,0 +1,168 @@
+"""
+Write Throughput Benchmark - Direct Writes vs Single Writer
+-----------------------------------------------------------
+Several worker processes (like gunicorn workers, each with a few request
+threads) buy and sell random products through logic.add_transaction for a
+few seconds, first with every worker writing to the SQLite file directly,
+then with the single writer process of writer.py (STOCKFLOW_WRITER_SOCKET).
+
+Prints, for every mode and number of workers: movements per second, latency
+percentiles, failed movements ("database is locked") and, for the writer,
+the average number of movements per COMMIT.
+
+Usage (From the project root):
+    python bench/bench_writer.py [--workers 1,2,4,8] [--threads 4] [--seconds 3] [--synchronous FULL]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+
+# Allow running the script from any directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Secret of this run's writer (Inherited by the worker processes)
+os.environ.setdefault("STOCKFLOW_WRITER_AUTHKEY", secrets.token_hex(16))
+
+import audit
+import database
+import helpers
+import logic
+import metrics
+import writer
+
+
+# Writer process: serves the workers until stop is set, then reports its counters
+def writer_process(db_path, socket_path, stop, stats):
+    db = helpers.connect_db(db_path)
+    threading.Thread(target=writer.serve, args=(db, socket_path), daemon=True).start()
+
+    stop.wait()
+    stats.put(writer.stats())
+
+# Worker process: 'threads' request threads moving stock until the deadline
+def worker_process(db_path, socket_path, products, threads, seconds, start_event, results):
+    writer.SOCKET = socket_path
+    db = helpers.connect_db(db_path)
+    latencies = []
+    failed = [0]
+
+    def request_thread(seed):
+        rng = random.Random(seed)
+        start_event.wait()
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            success, _, _, _ = logic.add_transaction(db, rng.randint(1, products), 1, rng.choice(["IN", "OUT"]))
+            latencies.append(time.perf_counter() - started)
+            failed[0] += not success
+
+        db.release()
+
+    pool = [threading.Thread(target=request_thread, args=(os.getpid() * 100 + index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    results.put((latencies, failed[0]))
+
+
+# One run: 'workers' processes for 'seconds' seconds (socket_path empty: direct writes)
+def run(db_path, socket_path, workers, args):
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker_process,
+                                args=(db_path, socket_path, args.products, args.threads, args.seconds, start_event, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # Let every process open its connections before the clock starts
+    time.sleep(0.5)
+    start_event.set()
+
+    latencies, failed = [], 0
+    for _ in processes:
+        worker_latencies, worker_failed = results.get()
+        latencies += worker_latencies
+        failed += worker_failed
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    return {"movements": len(latencies) - failed, "failed": failed, "per_second": (len(latencies) - failed) / args.seconds,
+            "p50": percentile(0.50), "p99": percentile(0.99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write throughput with direct writes and with the single writer process.")
+    parser.add_argument("--workers", default="1,2,4,8", help="Worker process counts to compare")
+    parser.add_argument("--threads", type=int, default=4, help="Request threads per worker")
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--synchronous", default=database.SYNCHRONOUS, help="SQLite synchronous pragma (NORMAL, FULL)")
+    args = parser.parse_args()
+
+    # Same pragma for every process (They are forked from this one), and no slow query log (Lock waits are expected)
+    database.SYNCHRONOUS = args.synchronous
+    metrics.SLOW_QUERY_MS = 0
+
+    folder = tempfile.mkdtemp()
+    db_path = os.path.join(folder, "writer.db")
+    socket_path = os.path.join(folder, "writer.sock")
+
+    # Products with enough stock that sells rarely fail
+    db = helpers.init_db(db_path)
+    for index in range(args.products):
+        logic.add_product(db, f"Product {index}", f"BENCH-{index}", 1, 1000000, 0)
+
+    # Write the audit rows of the setup before forking (No write of this process during the runs)
+    audit.shutdown()
+    db.close()
+
+    print(f"synchronous={args.synchronous}, {args.threads} request threads per worker, {args.seconds}s per run")
+    print(f"{'mode':<8} {'workers':>7} {'moves/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7} {'per commit':>10}")
+
+    for workers in [int(value) for value in args.workers.split(",")]:
+        direct = run(db_path, "", workers, args)
+        print(f"{'direct':<8} {workers:>7} {direct['per_second']:>9.0f} {direct['p50']:>8.2f} {direct['p99']:>8.2f} "
+              f"{direct['failed']:>7} {1:>10}")
+
+        stop = multiprocessing.Event()
+        stats = multiprocessing.Queue()
+        server = multiprocessing.Process(target=writer_process, args=(db_path, socket_path, stop, stats))
+        server.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+
+        grouped = run(db_path, socket_path, workers, args)
+        stop.set()
+        counters = stats.get()
+        server.join()
+
+        # The listener removes its socket file when the process exits
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        per_commit = counters["commands"] / counters["groups"] if counters["groups"] else 0
+        print(f"{'writer':<8} {workers:>7} {grouped['per_second']:>9.0f} {grouped['p50']:>8.2f} {grouped['p99']:>8.2f} "
+              f"{grouped['failed']:>7} {per_commit:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Query Plan Check - No Full Scans, No Temp Sorts
+-----------------------------------------------
+Runs the read and write paths of reports.py, logic.py, reorder.py,
+analytics.py and the exports on a synthetic database, records every
+statement they send to SQLite, and runs EXPLAIN QUERY PLAN on each one with
+its real arguments.
+
+Fails (Exit code 1) if any plan:
+- Scans a whole table without an index ("SCAN products").
+- Sorts with a temp B-tree ("USE TEMP B-TREE FOR ORDER BY / GROUP BY / DISTINCT").
+
+Every plan is checked twice: with the statistics of 'ANALYZE', and without
+any (A database that never ran it, the normal case of a deployment).
+
+Index walks ("SCAN p USING INDEX ...") are accepted: with the ORDER BY of the
+index and a LIMIT they stop after one page. The few full scans that are the
+design itself are listed in ALLOWED, each one with its reason.
+
+Usage (From the project root):
+    python bench/explain_check.py [--verbose]
+"""
+
+import argparse
+import os
+import re
+import sys
+
+# Allow running the script from any directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Audit rows in the same transaction (Their INSERT is checked too)
+os.environ.setdefault("STOCKFLOW_AUDIT_MODE", "sync")
+
+from synthetic import build_database
+
+import analytics
+import catalog
+import database
+import events
+import exports
+import fragment_cache
+import importer
+import logic
+import reorder
+import reports
+import summary_cache
+
+# Plan steps that fail the check
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+
+# Statements without a plan
+NO_PLAN = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA|CREATE|ATTACH|DETACH|ANALYZE)\b", re.IGNORECASE)
+
+# Full scans on purpose: (Pattern of the statement, reason)
+ALLOWED = [
+    (re.compile(r"FROM logs ORDER BY id DESC LIMIT \? OFFSET \?"),
+     "Page number of the logs: walks the rowid backwards and stops after the page (No sort)"),
+    (re.compile(r"SELECT COUNT\(\*\) AS count FROM reorder_alerts$"),
+     "Size of the reorder list: the table only has the products at risk"),
+    (re.compile(r"GROUP BY product_id \) AS m"),
+     "Ranking of the products of a range: groups the rollups read with the day index, then sorts by the total"),
+    (re.compile(r"FROM logs\s+ORDER BY id ASC$"),
+     "Export of every log: reads the whole table in rowid order on purpose"),
+    (re.compile(r"FROM products ORDER BY id$"),
+     "Full load of the product catalog: every product once per process, in rowid order"),
+]
+
+
+class RecordingDatabase(database.Database):
+    """database.Database that keeps every statement with its arguments."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.statements = {}
+
+    def _execute(self, sql, args):
+        self._record(sql, args)
+        return super()._execute(sql, args)
+
+    def _query(self, sql, args):
+        self._record(sql, args)
+        return super()._query(sql, args)
+
+    def _executemany(self, sql, rows):
+        if rows:
+            self._record(sql, rows[0])
+        return super()._executemany(sql, rows)
+
+    def iterate(self, sql, *args, **kwargs):
+        self._record(sql, args)
+        return super().iterate(sql, *args, **kwargs)
+
+    # First arguments seen for every statement text (With the lists already expanded)
+    def _record(self, sql, args):
+        if not NO_PLAN.match(sql) and sql not in self.statements:
+            self.statements[sql] = database._expand_lists(sql, args)
+
+
+# Calls every read and write path at least once (Every branch of the pagination too)
+def run_scenario(db):
+    report = reports.get_stock_report(db, page=1)
+    reports.get_stock_report(db, page=3)
+    after = reports.get_stock_report(db, after=report["next_cursor"])
+    reports.get_stock_report(db, before=after["prev_cursor"])
+
+    reports.search_products(db, "")
+    reports.search_products(db, "sku-0001")
+    reports.search_products(db, "product 12")
+
+    logs, _, _, next_cursor, _ = reports.get_transaction_logs(db, page=1)
+    logs, _, _, _, prev_cursor = reports.get_transaction_logs(db, after=next_cursor)
+    reports.get_transaction_logs(db, before=prev_cursor)
+    reports.get_transaction_logs(db, page=4)
+
+    summary_cache.invalidate()
+    reports.get_inventory_summary(db)
+
+    logic.add_product(db, "Plan Product", "PLAN-1", 1, 10, 2)
+    logic.add_product(db, "Plan Product Empty", "PLAN-2", 1, 0, 2)
+    logic.add_transaction(db, 1, 5, "IN")
+    logic.add_transaction(db, 1, 5, "OUT")
+    logic.add_transaction(db, 1, 5, "IN", "plan-key")
+    logic.add_transaction(db, 1, 5, "IN", "plan-key")
+    logic.add_transactions_batch(db, [
+        {"product_id": 2, "type": "IN", "quantity": 3},
+        {"product_id": 3, "type": "OUT", "quantity": 1},
+    ], "atomic")
+
+    # Products written by an import: the next movement loads them into the catalog (Refresh by version)
+    importer.import_products(db, ["name,sku,price", "Plan Import,PLAN-3,1"])
+    logic.add_transaction(db, 2, 1, "IN")
+
+    # Live updates, the KPIs and cached table pages that follow them (Events after an id, cleanup, data versions)
+    reports.get_inventory_summary(db)
+    events.poll(db, 0, summary=lambda: reports.get_inventory_summary(db))
+    events.prune(db)
+    fragment_cache.version(db, "stock")
+    fragment_cache.version(db, "logs")
+
+    page = reorder.get_reorder_list(db, per_page=5)
+    page = reorder.get_reorder_list(db, after=page["next_cursor"], per_page=5)
+    reorder.get_reorder_list(db, before=page["prev_cursor"], per_page=5)
+
+    # Analytics of a range from the daily rollups
+    start, end = analytics.parse_range()
+    analytics.get_daily_totals(db, start, end)
+    analytics.get_top_movers(db, start, end, "turnover")
+
+    # Streamed exports (Only the statement is needed: one chunk each)
+    next(exports.stock_chunks(db), None)
+    next(exports.log_chunks(db), None)
+    next(exports.log_chunks(db, "2000-01-01 00:00:00", "2999-12-31 23:59:59"), None)
+
+
+# Plan steps of one statement
+def explain(connection, sql, args):
+    return [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + sql, args)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN of every report and movement query.")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not only the failures")
+    args = parser.parse_args()
+
+    path = build_database(products=args.products, transactions=args.products * 10, logs=args.products * 10)
+    db = RecordingDatabase(path)
+
+    # Some products must be in the reorder list (Every page branch runs)
+    db.execute("UPDATE products SET reorder_level = 2000000 WHERE id % 3 = 0")
+    reorder.rebuild(db)
+
+    # The events table of a busy database (Up to EVENTS_BUFFER rows, not the empty table of a fresh one)
+    events.publish_many(db, [("reload", {"reason": "bench"})] * args.products)
+    db.statements.clear()
+
+    # Fresh statistics, like a database that ran 'ANALYZE' (The planner sees real table sizes)
+    db.execute("ANALYZE")
+
+    # The catalog of a worker that finished its first load
+    catalog.load(db)
+
+    run_scenario(db)
+
+    # A copy of the database without the statistics (The planner falls back to its default estimates)
+    unanalyzed = path + ".unanalyzed"
+    plain = database.open_connection(unanalyzed)
+    database.open_connection(path).backup(plain)
+    plain.execute("DELETE FROM sqlite_stat1")
+    plain.commit()
+    plain.close()
+
+    connections = [("analyzed", database.open_connection(path)), ("no statistics", database.open_connection(unanalyzed))]
+    failures = 0
+
+    for sql, (expanded, values) in db.statements.items():
+        text = " ".join(sql.split())
+        reason = next((reason for pattern, reason in ALLOWED if pattern.search(text)), None)
+
+        for label, connection in connections:
+            plan = explain(connection, expanded, values)
+            problems = [step for step in plan if FULL_SCAN.match(step) or TEMP_SORT.search(step)]
+
+            if problems and reason:
+                problems = []
+            failures += bool(problems)
+
+            if problems or args.verbose:
+                print(f"{'FAIL' if problems else 'ok  '} ({label}) {text[:150]}")
+                for step in plan:
+                    print(f"       {'!' if step in problems else ' '} {step}")
+                if reason:
+                    print(f"         Allowed: {reason}")
+
+    print(f"{len(db.statements)} statements, {failures} plans with a full scan or a temp sort.")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Concurrency Stress Test - No Oversell
+-------------------------------------
+Several worker processes (like gunicorn workers) sell the same product at
+the same time through logic.add_transaction. The product has less stock
+than all the workers try to sell, so some sells must fail.
+
+Checks at the end:
+- The stock balance never goes negative.
+- Units sold are exactly the initial stock (No oversell, no lost sale).
+- The balance matches the transactions ledger.
+
+Usage (From the project root):
+    python bench/stress_oversell.py --workers 8 --sells 50 --stock 100
+
+With --db-url postgresql://... it runs on an empty PostgreSQL database instead
+of a temp SQLite file (Same checks).
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Allow running the script from any directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import balances
+import helpers
+import logic
+
+
+# Every worker opens its own connection and sells 1 unit many times
+def sell_worker(db_path, db_url, product_id, sells, start_event, results):
+    db = helpers.connect_db(db_path, db_url)
+
+    # All the workers start at the same moment
+    start_event.wait()
+
+    sold = 0
+    for _ in range(sells):
+        success, message, new_stock, _ = logic.add_transaction(db, product_id, 1, 'OUT')
+        if success:
+            sold += 1
+
+    results.put(sold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /sell stress test (No oversell).")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sells", type=int, default=50, help="Sell attempts per worker")
+    parser.add_argument("--stock", type=int, default=100, help="Initial stock of the product")
+    parser.add_argument("--db-url", default="", help="Backend URL (Default: a temp SQLite file)")
+    args = parser.parse_args()
+
+    # Fresh database in a temp folder
+    db_path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    open(db_path, "w").close()
+    db = helpers.init_db(db_path, args.db_url)
+
+    success, message, product_id = logic.add_product(db, "Stress Product", "STRESS-1", 1, args.stock, 0)
+    if not success:
+        sys.exit(f"Could not create the product: {message}")
+
+    # Start every worker and release them together
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=sell_worker, args=(db_path, args.db_url, product_id, args.sells, start_event, results))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    started = time.perf_counter()
+    start_event.set()
+    sold = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    # Final state
+    balance = db.execute("SELECT quantity FROM stock_balances WHERE product_id = ?", product_id)[0]["quantity"]
+    ledger = db.execute("SELECT COALESCE(SUM(quantity), 0) AS total FROM transactions WHERE product_id = ?", product_id)[0]["total"]
+    attempts = args.workers * args.sells
+
+    print(f"Attempts: {attempts}  Sold: {sold}  Balance: {balance}  Ledger: {ledger}  Time: {elapsed:.2f}s")
+
+    # Checks
+    errors = []
+    if balance < 0:
+        errors.append("stock balance went negative")
+    if sold != min(attempts, args.stock):
+        errors.append(f"expected {min(attempts, args.stock)} units sold, got {sold}")
+    if balance != ledger or balances.check_balances(db):
+        errors.append("stock balance doesn't match the ledger")
+
+    if errors:
+        sys.exit("FAIL: " + "; ".join(errors))
+    print("OK: no oversell")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Synthetic Data - Shared by the benchmark scripts
+------------------------------------------------
+Builds a temp SQLite inventory with a configurable number of products,
+transactions and logs, and computes latency percentiles.
+"""
+
+import contextlib
+import os
+import random
+import sys
+import tempfile
+
+# Allow importing the app modules from the benchmark scripts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import balances
+import helpers
+
+
+# Creates a new database file in a temp folder and fills it (Returns its path)
+# Every product gets enough incoming stock for the sell benchmarks
+def build_database(products=5000, transactions=100000, logs=100000, path=None, seed=42):
+    random.seed(seed)
+    path = path or os.path.join(tempfile.mkdtemp(), "bench.db")
+    open(path, "w").close()
+
+    # init_db prints to stdout, keep stdout clean for machine-readable output
+    with contextlib.redirect_stdout(sys.stderr):
+        db = helpers.init_db(path)
+
+    db.execute("BEGIN")
+    db.executemany("INSERT INTO products (name, sku, price, reorder_level) VALUES (?, ?, ?, ?)",
+                   [(f"Product {i}", f"SKU-{i:06d}", round(random.uniform(1, 100), 2), random.randint(0, 20))
+                    for i in range(1, products + 1)])
+
+    # One big IN per product first, then random movements that never go negative
+    db.executemany("INSERT INTO transactions (product_id, quantity, type) VALUES (?, ?, 'IN')",
+                   [(i, 1000000) for i in range(1, products + 1)])
+    db.executemany("INSERT INTO transactions (product_id, quantity, type) VALUES (?, ?, ?)",
+                   [_movement(products) for _ in range(max(transactions - products, 0))])
+
+    db.executemany("INSERT INTO logs (type, action, description) VALUES ('USER', 'MANUAL_MOVE', ?)",
+                   [(f"Synthetic movement {i}",) for i in range(logs)])
+    db.execute("COMMIT")
+
+    # Balances for the new ledger
+    balances.rebuild_balances(db)
+    db.close()
+    return path
+
+
+# Random movement (product_id, signed quantity, type)
+def _movement(products):
+    quantity = random.randint(1, 10)
+    if random.random() < 0.5:
+        return (random.randint(1, products), quantity, "IN")
+    return (random.randint(1, products), -quantity, "OUT")
+
+
+# p50, p95 and p99 of a list of timings (Same unit as the input)
+def percentiles(timings):
+    if not timings:
+        return {"p50": None, "p95": None, "p99": None}
+
+    timings = sorted(timings)
+    pick = lambda q: timings[min(len(timings) - 1, int(len(timings) * q))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
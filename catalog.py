@@ -0,0 +1,357 @@
+"""
+Catalog Module - In-Memory Product Catalog
+------------------------------------------
+This module keeps the static attributes of every product (Name, SKU, price,
+reorder level and status) in the memory of each process, so a buy or sell
+validates and describes its product without reading the products table, and
+the stock table reads only the ids and the stock of a page.
+
+Key Responsibilities:
+- Compact Storage: One typed array per attribute, indexed by product id, and
+  the names and SKUs as UTF-8 in two buffers (No Python object per product).
+  SKUs are found through an open-addressing hash table of ids.
+- Versions: Every write to the products table bumps the 'catalog_version' row
+  and stamps the products it wrote with the new version ('touch', in the same
+  transaction). A process that reads a newer version loads only the products
+  stamped after its own version (One indexed read).
+- Loading: The full catalog is loaded once per process by a background thread.
+  Until it's ready, or if it needs more than STOCKFLOW_CATALOG_CACHE_MB, the
+  lookups read the products table like before.
+
+Note: Any new write to the products table (Edits, deactivation) must call
+'touch' with the ids it changed before COMMIT, or the other workers won't see it.
+"""
+
+# Import array for the columns, os to read the settings, threading for the lock and the loader
+import array
+import os
+import threading
+
+# Import time for the load duration
+import time
+
+# Max memory of the catalog (MB). Over it, the catalog is turned off and lookups read the products table
+MAX_BYTES = int(float(os.environ.get("STOCKFLOW_CATALOG_CACHE_MB", 256)) * 1024 * 1024)
+
+# Max products loaded inline by a version check (More: a bulk import, the background thread reloads everything)
+REFRESH_MAX_ROWS = 5000
+
+# Products read per chunk by the full load
+LOAD_CHUNK_ROWS = 10000
+
+# Status of an id in the catalog
+MISSING, ACTIVE, INACTIVE = 0, 1, 2
+
+# Columns of a product, like the rows of the products table
+COLUMNS = "id, name, sku, price, reorder_level, is_active"
+
+# The loaded catalog (None while loading or turned off), its lock and the loader thread
+_lock = threading.Lock()
+_state = {"catalog": None, "loader_pid": None, "disabled": False}
+
+# Counters for monitoring
+_stats = {"hits": 0, "misses": 0, "refreshes": 0, "loads": 0, "load_seconds": 0.0}
+
+
+class _Catalog:
+    """Products as columns of typed arrays indexed by id (About 45 bytes per product plus its name and SKU)."""
+
+    __slots__ = ("version", "status", "prices", "reorder_levels", "name_starts", "name_lengths", "names",
+                 "sku_starts", "sku_lengths", "skus", "sku_table", "count", "garbage")
+
+    def __init__(self, version):
+        self.version = version
+        self.status = bytearray(1)
+        self.prices = array.array("d", [0.0])
+        self.reorder_levels = array.array("q", [0])
+        # Offsets in the buffers are 32-bit (The memory bound keeps them far under 4 GB)
+        self.name_starts = array.array("I", [0])
+        self.name_lengths = array.array("I", [0])
+        self.names = bytearray()
+        self.sku_starts = array.array("I", [0])
+        self.sku_lengths = array.array("I", [0])
+        self.skus = bytearray()
+
+        # Hash table of ids by SKU (0 is an empty slot, product ids start at 1), always under half full
+        self.sku_table = array.array("i", bytes(4 * 1024))
+        self.count = 0
+
+        # Bytes of the names and SKUs that were replaced (Reclaimed by the next full load)
+        self.garbage = 0
+
+    # Adds or replaces a product
+    def set(self, product_id, name, sku, price, reorder_level, is_active):
+        self._grow(product_id)
+        name = name.encode("utf-8")
+        sku = sku.encode("utf-8")
+        known = self.status[product_id] != MISSING
+
+        if known:
+            self.garbage += self.name_lengths[product_id] + self.sku_lengths[product_id]
+            renamed = self._sku(product_id) != sku
+        else:
+            self.count += 1
+
+        self.name_starts[product_id] = len(self.names)
+        self.name_lengths[product_id] = len(name)
+        self.names += name
+        self.sku_starts[product_id] = len(self.skus)
+        self.sku_lengths[product_id] = len(sku)
+        self.skus += sku
+
+        # NULL columns of old rows are stored as zero (Like the reports read them)
+        self.prices[product_id] = price or 0
+        self.reorder_levels[product_id] = reorder_level or 0
+        self.status[product_id] = ACTIVE if is_active else INACTIVE
+
+        # A new SKU goes in the hash table. A changed one rebuilds it (The old SKU must stop matching)
+        if not known:
+            if self.count * 2 > len(self.sku_table):
+                self._rehash(len(self.sku_table) * 2)
+            else:
+                self._insert_sku(product_id, sku)
+        elif renamed:
+            self._rehash(len(self.sku_table))
+
+    # A product as a dict like a row of the products table (None if it doesn't exist)
+    def get(self, product_id):
+        if not 0 < product_id < len(self.status) or self.status[product_id] == MISSING:
+            return None
+
+        start = self.name_starts[product_id]
+        return {
+            "id": product_id,
+            "name": self.names[start:start + self.name_lengths[product_id]].decode("utf-8"),
+            "sku": self._sku(product_id).decode("utf-8"),
+            "price": self.prices[product_id],
+            "reorder_level": self.reorder_levels[product_id],
+            "is_active": 1 if self.status[product_id] == ACTIVE else 0,
+        }
+
+    # Id of the product with a SKU (None if no product has it)
+    def find(self, sku):
+        sku = sku.encode("utf-8")
+        mask = len(self.sku_table) - 1
+        slot = hash(sku) & mask
+
+        while self.sku_table[slot]:
+            if self._sku(self.sku_table[slot]) == sku:
+                return self.sku_table[slot]
+            slot = (slot + 1) & mask
+        return None
+
+    # Memory of the columns and buffers
+    def nbytes(self):
+        columns = [self.prices, self.reorder_levels, self.name_starts, self.name_lengths,
+                   self.sku_starts, self.sku_lengths, self.sku_table]
+        return sum(column.itemsize * len(column) for column in columns) + len(self.status) + len(self.names) + len(self.skus)
+
+    # Makes room for an id (Columns grow by at least a quarter, like a list)
+    def _grow(self, product_id):
+        size = len(self.status)
+        if product_id < size:
+            return
+
+        extra = max(product_id + 1, size + size // 4) - size
+        self.status += bytes(extra)
+        for column in [self.prices, self.reorder_levels, self.name_starts, self.name_lengths,
+                       self.sku_starts, self.sku_lengths]:
+            column.frombytes(bytes(column.itemsize * extra))
+
+    def _sku(self, product_id):
+        start = self.sku_starts[product_id]
+        return bytes(self.skus[start:start + self.sku_lengths[product_id]])
+
+    def _insert_sku(self, product_id, sku):
+        mask = len(self.sku_table) - 1
+        slot = hash(sku) & mask
+        while self.sku_table[slot]:
+            slot = (slot + 1) & mask
+        self.sku_table[slot] = product_id
+
+    # Builds the hash table again with 'size' slots (A power of two)
+    def _rehash(self, size):
+        self.sku_table = array.array("i", bytes(4 * size))
+        for product_id, status in enumerate(self.status):
+            if status != MISSING:
+                self._insert_sku(product_id, self._sku(product_id))
+
+
+# A product by id, current as of the catalog version read in the caller's transaction (None if it doesn't exist)
+# version: the 'catalog_version' read by the caller (None: read it here)
+def get(db, product_id, version=None):
+    try:
+        product_id = int(product_id)
+    except (ValueError, TypeError):
+        return None
+
+    catalog = _current(db, version)
+    if catalog is None:
+        _stats["misses"] += 1
+        rows = db.execute(f"SELECT {COLUMNS} FROM products WHERE id = ?", product_id)
+        return rows[0] if rows else None
+
+    with _lock:
+        _stats["hits"] += 1
+        return catalog.get(product_id)
+
+# Products of a list of ids, by id (Missing ids are left out)
+def get_many(db, product_ids, version=None):
+    product_ids = [int(product_id) for product_id in product_ids]
+
+    catalog = _current(db, version)
+    if catalog is None:
+        _stats["misses"] += 1
+        products = {}
+        for start in range(0, len(product_ids), 500):
+            for row in db.execute(f"SELECT {COLUMNS} FROM products WHERE id IN (?)", product_ids[start:start + 500]):
+                products[row["id"]] = row
+        return products
+
+    with _lock:
+        _stats["hits"] += 1
+        products = {product_id: catalog.get(product_id) for product_id in product_ids}
+    return {product_id: product for product_id, product in products.items() if product is not None}
+
+# Id of the product with a SKU (None if it's free)
+def find_sku(db, sku, version=None):
+    catalog = _current(db, version)
+    if catalog is None:
+        _stats["misses"] += 1
+        rows = db.execute("SELECT id FROM products WHERE sku = ?", sku)
+        return rows[0]["id"] if rows else None
+
+    with _lock:
+        _stats["hits"] += 1
+        return catalog.find(sku)
+
+# Marks products as changed for every process (Inside the transaction that wrote them, before COMMIT)
+# Returns the new catalog version
+def touch(db, product_ids):
+    db.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    version = db.execute("SELECT version FROM catalog_version WHERE id = 1")[0]["version"]
+
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 500):
+        db.execute("UPDATE products SET catalog_version = ? WHERE id IN (?)", version, product_ids[start:start + 500])
+    return version
+
+# Adds a product written by this process to its catalog (After COMMIT, with the version returned by touch)
+# The other processes load it when they read the new version
+def add(version, product):
+    with _lock:
+        catalog = _state["catalog"]
+        if catalog is None:
+            return
+
+        catalog.set(product["id"], product["name"], product["sku"], product["price"], product["reorder_level"],
+                    product.get("is_active", 1))
+
+        # Only if no other write came in between (Else the next version check loads them all)
+        if version == catalog.version + 1:
+            catalog.version = version
+
+# Drops the loaded catalog after a rolled back transaction that may have refreshed it (The next lookup loads it again)
+# A version read inside that transaction was never committed: the next product stamped with it would never be loaded
+def reset():
+    with _lock:
+        _state["catalog"] = None
+
+# Counters and size of the catalog (For monitoring)
+def stats():
+    with _lock:
+        catalog = _state["catalog"]
+        return dict(_stats, products=catalog.count if catalog else 0, bytes=catalog.nbytes() if catalog else 0,
+                    version=catalog.version if catalog else None, disabled=_state["disabled"])
+
+
+# Reads every product into a new catalog (The version first: products written during the load are read again later)
+# Runs in the loader thread, or at once from a script that needs the catalog ready
+def load(db):
+    started = time.perf_counter()
+
+    try:
+        catalog = _Catalog(_read_version(db))
+        db.release()
+
+        for chunk in db.iterate(f"SELECT {COLUMNS} FROM products ORDER BY id", chunk_size=LOAD_CHUNK_ROWS):
+            for row in chunk:
+                catalog.set(*row)
+
+            # Over the memory bound: stay on the products table
+            if catalog.nbytes() > MAX_BYTES:
+                print(f"Catalog cache turned off: more than {MAX_BYTES // (1024 * 1024)} MB (STOCKFLOW_CATALOG_CACHE_MB)")
+                _state["disabled"] = True
+                return
+
+        with _lock:
+            _state["catalog"] = catalog
+            _stats["loads"] += 1
+            _stats["load_seconds"] = round(time.perf_counter() - started, 3)
+
+    except Exception as e:
+        # Lookups keep reading the products table, the next one tries again
+        print(f"Error in catalog load: {e}")
+
+    finally:
+        db.release()
+        with _lock:
+            _state["loader_pid"] = None
+
+# The catalog, refreshed up to the version of the database (None if it isn't loaded: read the products table)
+def _current(db, version):
+    catalog = _state["catalog"]
+    if catalog is None:
+        _start_loader(db)
+        return None
+
+    if version is None:
+        version = _read_version(db)
+    if version <= catalog.version:
+        return catalog
+
+    with _lock:
+        # Another thread may have refreshed or replaced it while this one waited
+        if _state["catalog"] is catalog and version > catalog.version and not _refresh(db, catalog, version):
+            _state["catalog"] = None
+
+    # Checked again: refreshed, replaced by a new load, or dropped for a full load
+    return _current(db, version)
+
+# Loads the products written since the version of the catalog (Returns False if a full load is better)
+def _refresh(db, catalog, version):
+    # Seek in the catalog_version index
+    rows = db.query(f"""
+        SELECT {COLUMNS} FROM products
+        WHERE catalog_version > ?
+        ORDER BY catalog_version, id
+        LIMIT ?
+    """, catalog.version, REFRESH_MAX_ROWS + 1)
+
+    # Too many (A bulk import): load everything in the background, read the table meanwhile
+    if len(rows) > REFRESH_MAX_ROWS:
+        return False
+
+    for row in rows:
+        catalog.set(*row)
+    catalog.version = version
+    _stats["refreshes"] += 1
+
+    # Replaced names and SKUs take half of the buffers: load a compact copy
+    return catalog.garbage * 2 <= len(catalog.names) + len(catalog.skus)
+
+def _read_version(db):
+    return db.query("SELECT version FROM catalog_version WHERE id = 1")[0]["version"]
+
+# Starts the full load in a background thread (Once per process, again after a fork)
+def _start_loader(db):
+    if _state["disabled"] or _state["loader_pid"] == os.getpid():
+        return
+
+    with _lock:
+        if _state["disabled"] or _state["loader_pid"] == os.getpid():
+            return
+        _state["loader_pid"] = os.getpid()
+
+    threading.Thread(target=load, args=(db,), name="catalog-loader", daemon=True).start()
+
@@ -0,0 +1,222 @@
+"""
+Events Module - Live Stock Updates
+----------------------------------
+This module pushes the changes made by the write paths to every open
+dashboard, so the browsers patch the affected rows in place instead of
+re-fetching and re-rendering whole tables.
+
+Event types (The 'data' is JSON):
+- stock:   {"id", "new_stock", "status"} after a committed movement (And the
+           old stock, price and reorder level, for the KPIs of summary_cache.py).
+- product: The new product (Same fields as the /add_product response).
+- reload:  {"reason"} after changes too big to send one by one (Import, rebuild).
+- summary: {"total_items", "total_value", "low_stock_count"}, added by the
+           reader after the other events (Not saved).
+
+Key Responsibilities:
+- Publishing: logic.py, importer.py and balances.py write their events to the
+  'events' table in the same transaction as the change, so every worker
+  process (And every app server on PostgreSQL) sees them, and only if the
+  change is saved.
+- Reading: The browsers poll /events/poll with the last id they got
+  (STOCKFLOW_EVENTS_MODE=poll, default), or keep an /events stream open
+  (STOCKFLOW_EVENTS_MODE=sse) that reads the table every
+  STOCKFLOW_EVENTS_POLL_SECONDS.
+- Retention: The last STOCKFLOW_EVENTS_BUFFER events are kept, so a browser
+  that comes back gets what it missed (Or a 'reload').
+
+Note: An open SSE stream holds a worker thread for as long as the page is
+open. Use 'sse' only with threaded or async workers that can hold them
+(gthread with enough threads, gevent). A poll is a short request.
+"""
+
+# Import json to encode the events, os to read the settings, random to spread the cleanup,
+# threading for the stream counter and time for the stream loop
+import json
+import os
+import random
+import threading
+import time
+
+# Import the multi-row insert of the write paths
+from helpers import insert_many
+
+# How the browsers get the events: 'poll' (Short requests) or 'sse' (One open stream per browser)
+MODE = os.environ.get("STOCKFLOW_EVENTS_MODE", "poll").lower()
+
+# Events kept in the table for the browsers that come back (Older ones are deleted)
+EVENTS_BUFFER = int(os.environ.get("STOCKFLOW_EVENTS_BUFFER", 10000))
+
+# Seconds between two reads of the table (Browser polls, and every open stream)
+POLL_SECONDS = float(os.environ.get("STOCKFLOW_EVENTS_POLL_SECONDS", 2))
+
+# Seconds between keepalive comments (Keeps proxies from closing idle streams)
+KEEPALIVE_SECONDS = float(os.environ.get("STOCKFLOW_EVENTS_KEEPALIVE", 15))
+
+# Max open streams per process in 'sse' mode (Every stream holds a worker thread)
+MAX_CLIENTS = int(os.environ.get("STOCKFLOW_EVENTS_MAX_CLIENTS", 100))
+
+# Milliseconds the browser waits before reconnecting a stream
+RETRY_MS = 3000
+
+# Max events returned by one read
+READ_LIMIT = 500
+
+# Seconds a missing id can still be committed by another transaction (PostgreSQL takes ids before COMMIT)
+# A missing id older than this belongs to a rolled back transaction
+SETTLE_SECONDS = 5
+
+# Events published between two cleanups of the table (On average)
+PRUNE_EVERY = 1000
+
+# Open streams of this process
+_lock = threading.Lock()
+_state = {"clients": 0}
+
+
+# Reorder status shown in the stock table (Same rule as the /buy and /sell responses)
+def stock_status(stock, reorder_level):
+    return "Ok" if stock > reorder_level else "Pedir más"
+
+# Saves one event (Inside the caller's transaction: the event exists only if the change is saved)
+def publish(db, type, data):
+    publish_many(db, [(type, data)])
+
+# Saves many events with one statement: list of (type, data)
+def publish_many(db, events):
+    insert_many(db, "events", ["type", "data"], [(type, json.dumps(data, ensure_ascii=False)) for type, data in events])
+
+    # About every PRUNE_EVERY events (No counter to share between processes)
+    if random.random() * PRUNE_EVERY < len(events):
+        prune(db)
+
+# Deletes the events older than the last EVENTS_BUFFER
+def prune(db):
+    db.execute("DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?", EVENTS_BUFFER)
+
+# Events after an id, oldest first: list of (id, type, data)
+# None if the ones right after it were already deleted, or if it's newer than the last one (A new database)
+# Stops before a missing id that a transaction still open may commit
+def read(db, after, limit=READ_LIMIT):
+    rows = db.query("""
+        SELECT id, type, data, created_at <= datetime('now', ?) AS settled,
+               (SELECT MIN(id) FROM events) AS oldest
+        FROM events
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """, f"-{SETTLE_SECONDS} seconds", after, limit)
+
+    # The row of 'after' is gone, and the ones after it with it
+    if rows and rows[0]["oldest"] > after + 1:
+        return None
+    if not rows and after > last_id(db):
+        return None
+
+    events = []
+    expected = after + 1
+    for row in rows:
+        if row["id"] != expected and not row["settled"]:
+            break
+
+        events.append((row["id"], row["type"], json.loads(row["data"])))
+        expected = row["id"] + 1
+
+    return events
+
+# Id of the newest event (Where a new reader starts)
+def last_id(db):
+    return db.query("SELECT COALESCE(MAX(id), 0) AS id FROM events")[0]["id"]
+
+
+# Answer of /events/poll: the events after the last id the browser got (None or invalid: a new browser)
+# summary: optional function that returns the KPIs, added after any change
+def poll(db, after=None, summary=None):
+    try:
+        cursor = int(after)
+    except (ValueError, TypeError):
+        cursor = None
+
+    if cursor is None:
+        cursor, changes = last_id(db), []
+    else:
+        cursor, changes = _next(db, cursor, summary)
+
+    return {
+        "last_id": cursor,
+        "poll_ms": int(POLL_SECONDS * 1000),
+        "events": [{"id": id, "type": type, "data": data} for id, type, data in changes],
+    }
+
+# Generator with the SSE text of every event after last_event_id (Header of a reconnecting browser)
+# Returns None if there are already MAX_CLIENTS open streams
+def stream(db, last_event_id=None, summary=None):
+    with _lock:
+        if _state["clients"] >= MAX_CLIENTS:
+            return None
+        _state["clients"] += 1
+
+    # Resume point taken now, not when the response starts, so nothing published meanwhile is lost
+    try:
+        cursor = last_id(db) if last_event_id is None else int(last_event_id)
+    except (ValueError, TypeError):
+        cursor = None
+
+    return _stream(db, cursor, summary)
+
+# Number of open streams (For monitoring)
+def clients():
+    with _lock:
+        return _state["clients"]
+
+
+# Body of stream: sends the new events of every read, and a keepalive when nothing happens
+def _stream(db, cursor, summary):
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        idle = 0.0
+
+        while True:
+            cursor, changes = _next(db, cursor, summary)
+
+            # No connection is held while the stream waits
+            db.release()
+
+            if changes:
+                idle = 0.0
+                yield "".join(_format(*change) for change in changes)
+            elif idle >= KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keepalive\n\n"
+
+            time.sleep(POLL_SECONDS)
+            idle += POLL_SECONDS
+
+    finally:
+        # The browser closed the stream (Or the server is stopping)
+        db.release()
+        with _lock:
+            _state["clients"] -= 1
+
+# Events of one reader after its cursor: (new cursor, list of (id, type, data))
+# A reader that missed events (Deleted, or an unknown id) gets a 'reload' instead
+def _next(db, cursor, summary):
+    changes = read(db, cursor) if cursor is not None else None
+
+    if changes is None:
+        cursor = last_id(db)
+        changes = [(cursor, "reload", {"reason": "missed"})]
+    elif changes:
+        cursor = changes[-1][0]
+
+    # The KPIs after the changes (From the summary cache, which follows the same events)
+    if changes and summary is not None:
+        value = summary()
+        if value is not None:
+            changes.append((cursor, "summary", value))
+
+    return cursor, changes
+
+# One SSE message
+def _format(id, type, data):
+    return f"id: {id}\nevent: {type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,151 @@
+"""
+Exports Module - Streaming CSV & NDJSON Downloads
+-------------------------------------------------
+This module turns the stock report and the audit log into downloadable
+files for accounting. Rows are read from a server-side cursor in chunks
+(database.Database.iterate) and written out as they arrive, so memory stays
+flat whatever the size of the table.
+
+Key Responsibilities:
+- Row Sources: The stock report (Current or at a past date, with snapshots.py)
+  and the 'logs' table (Optional date range).
+- Formats: CSV with a header row, or NDJSON (One JSON object per line).
+- Compression: Optional gzip of the stream, chunk by chunk.
+"""
+
+# Import csv, io and json to format the rows, os to read the settings
+import csv
+import io
+import json
+import os
+
+# Import datetime to validate the date filters
+from datetime import datetime
+
+# Import zlib to gzip the stream without buffering it
+import zlib
+
+# Import the ledger checkpoints for the stock at a past date
+import snapshots
+
+# Rows read from SQLite per chunk (Also the rows per piece of the HTTP response)
+EXPORT_CHUNK_ROWS = int(os.environ.get("STOCKFLOW_EXPORT_CHUNK_ROWS", 1000))
+
+# Export formats and their content types
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Columns of every export (Same order in the CSV header and the NDJSON keys)
+STOCK_FIELDS = ["id", "sku", "name", "price", "current_stock", "reorder_level", "value", "status"]
+LOG_FIELDS = ["id", "timestamp", "type", "action", "description"]
+
+# Accepted date formats in the filters ('to' with only a date means the end of that day)
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"]
+
+
+# Validates a date filter and returns it like SQLite saves timestamps ('YYYY-MM-DD HH:MM:SS')
+# Returns None if it's empty and raises ValueError if it's invalid
+def parse_date(value, end_of_day=False):
+    value = (value or "").strip()
+    if not value:
+        return None
+
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+
+        # Only a date: 'from' starts at 00:00:00, 'to' ends at 23:59:59
+        if date_format == "%Y-%m-%d" and end_of_day:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+    raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.")
+
+
+# Chunks of stock rows (Tuples in STOCK_FIELDS order) of the active products, by name
+# With as_of, the stock at that date (Snapshot + movements up to the date) instead of the current one
+# The query is built now, so a missing ledger archive raises ValueError before the download starts
+def stock_chunks(db, as_of=None):
+    if as_of is None:
+        sql = """
+            SELECT p.id, p.sku, p.name, p.price, COALESCE(b.quantity, 0) AS current_stock, p.reorder_level
+            FROM products p
+            LEFT JOIN stock_balances b ON p.id = b.product_id
+            WHERE p.is_active = 1
+            ORDER BY p.name ASC, p.id ASC
+        """
+        args, attach = [], None
+    else:
+        # Same products as the current stock export
+        query, args, archive_path = snapshots.stock_as_of_query(db, as_of, active_only=True)
+        sql = f"""
+            SELECT id, sku, name, price, quantity, reorder_level
+            FROM ({query}) AS stock
+        """
+        attach = {"archive": archive_path} if archive_path else None
+
+    return _stock_rows(db.iterate(sql, *args, chunk_size=EXPORT_CHUNK_ROWS, attach=attach))
+
+# Adds the value and status columns to every stock row
+def _stock_rows(chunks):
+    for chunk in chunks:
+        # Same value and status as the dashboard
+        yield [row + (round((row[4] or 0) * (row[3] or 0), 2), "Ok" if (row[4] or 0) > (row[5] or 0) else "Pedir más")
+               for row in chunk]
+
+# Chunks of log rows (Tuples in LOG_FIELDS order), oldest first, optionally between two dates
+def log_chunks(db, start=None, end=None):
+    conditions = []
+    args = []
+
+    if start:
+        conditions.append("timestamp >= ?")
+        args.append(start)
+    if end:
+        conditions.append("timestamp <= ?")
+        args.append(end)
+
+    # With dates, seek in the timestamp index (Same order: logs are written in time order)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "timestamp ASC, id ASC" if conditions else "id ASC"
+    sql = f"SELECT id, timestamp, type, action, description FROM logs {where} ORDER BY {order}"
+    return db.iterate(sql, *args, chunk_size=EXPORT_CHUNK_ROWS)
+
+
+# Formats the chunks as CSV text: header first, then one piece of text per chunk
+def csv_stream(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(fields)
+    yield _take(buffer)
+
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield _take(buffer)
+
+# Formats the chunks as NDJSON: one JSON object per line
+def ndjson_stream(fields, chunks):
+    for chunk in chunks:
+        yield "".join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n" for row in chunk)
+
+# Encodes the text pieces as UTF-8 and gzips them on the fly (Only the compressor state stays in memory)
+def gzip_stream(pieces):
+    # wbits=31: gzip header and trailer, readable by browsers and 'gunzip'
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for piece in pieces:
+        data = compressor.compress(piece.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Returns the text written to the buffer and empties it
+def _take(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return text
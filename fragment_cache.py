@@ -0,0 +1,115 @@
+"""
+Fragment Cache Module - Rendered Partials & Conditional Requests
+----------------------------------------------------------------
+This module keeps the HTML of the table fragments ('partials/stock_table.html'
+and 'partials/logs_table.html') already rendered, so paginating back and forth
+doesn't run the same queries and templates again while nothing has changed.
+
+Key Responsibilities:
+- Data Versions: Read from the database for every request, so the writes of
+  every worker process count: the last event and the catalog version for
+  'stock', the last log id for 'logs'. A fragment of an older version is dead.
+- LRU Storage: Fragments keyed by dataset, version and URL, evicted by least
+  recent use when the memory bound (STOCKFLOW_FRAGMENT_CACHE_MB) is reached.
+- Validators: A content hash (ETag) and the render time (Last-Modified) for
+  every fragment, so the browser can revalidate and get a 304 (The same ETag
+  from every worker).
+
+Note: On PostgreSQL ids are taken before COMMIT, so a transaction that
+commits after a newer one doesn't change the last id. Its change is seen
+when the fragment expires (STOCKFLOW_FRAGMENT_TTL seconds), like changes
+made by hand in the database.
+"""
+
+# Import hashlib for the ETags, os to read the settings, threading for the lock and time for the TTL
+import collections
+import hashlib
+import os
+import threading
+import time
+
+# Max memory of the cached fragments (MB) and max seconds a fragment is served
+MAX_BYTES = int(float(os.environ.get("STOCKFLOW_FRAGMENT_CACHE_MB", 32)) * 1024 * 1024)
+FRAGMENT_TTL = float(os.environ.get("STOCKFLOW_FRAGMENT_TTL", 30))
+
+# Version query of every dataset (A stock write doesn't invalidate the logs pages and vice versa)
+# Every stock change publishes an event (events.py), and every product change bumps the catalog version
+VERSIONS = {
+    "stock": """
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM events) || '.' || (SELECT version FROM catalog_version WHERE id = 1) AS version
+    """,
+    "logs": "SELECT COALESCE(MAX(id), 0) AS version FROM logs",
+}
+
+# Fragments by (dataset, version, url), in least recently used order, and their total size
+_lock = threading.Lock()
+_entries = collections.OrderedDict()
+_state = {"bytes": 0}
+
+# Counters for monitoring
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+# Current version of a dataset (Read it BEFORE querying, and pass it to get and put)
+# A write in between only makes the render newer than its version: it's never served for a newer one
+def version(db, dataset):
+    return str(db.query(VERSIONS[dataset])[0]["version"])
+
+# Returns the cached fragment of a URL for a version (None if it's missing or expired)
+# A fragment is a dict: body (bytes), etag and created (Unix time)
+def get(dataset, data_version, url):
+    with _lock:
+        key = (dataset, data_version, url)
+        entry = _entries.get(key)
+
+        if entry is None or time.time() - entry["created"] >= FRAGMENT_TTL:
+            if entry is not None:
+                _remove(key)
+            _stats["misses"] += 1
+            return None
+
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry
+
+# Saves a rendered fragment under the version read before its queries and returns it
+# store=False only builds the entry (Empty pages, like the fallback of a failed query, aren't kept)
+def put(dataset, data_version, url, html, store=True):
+    body = html.encode("utf-8")
+    entry = {"body": body, "etag": hashlib.blake2b(body, digest_size=16).hexdigest(), "created": time.time()}
+
+    # Too big to cache
+    with _lock:
+        if not store or len(body) > MAX_BYTES:
+            return entry
+
+        key = (dataset, data_version, url)
+        if key in _entries:
+            _remove(key)
+
+        _entries[key] = entry
+        _state["bytes"] += len(body)
+
+        # Least recently used first, until it fits (Old versions are never used again, so they go first too)
+        while _state["bytes"] > MAX_BYTES:
+            _remove(next(iter(_entries)))
+            _stats["evictions"] += 1
+
+    return entry
+
+# Drops every fragment (Maintenance)
+def clear():
+    with _lock:
+        _entries.clear()
+        _state["bytes"] = 0
+
+# Returns a copy of the counters, with the entries and bytes in use
+def stats():
+    with _lock:
+        return dict(_stats, entries=len(_entries), bytes=_state["bytes"])
+
+
+# Removes one fragment and its size (Called with the lock held)
+def _remove(key):
+    entry = _entries.pop(key)
+    _state["bytes"] -= len(entry["body"])
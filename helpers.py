@@ -2,53 +2,53 @@
 Helpers Module - Infrastructure & Support Utilities
 --------------------------------------------------
 This module provides low-level support for the application, including:
-- Database schema initialization (Auto-setup on startup).
+- Database schema initialization (Version check and pending migrations on startup).
 - System-level error logging for debugging and maintenance.
 - Cross-functional utility tools used by the Service Layer.
 """
 
 # Import os for files manipulation
 import os
-from cs50 import SQL
+
+# Import base64 and json for the pagination cursors
+import base64
+import json
+# Import the connection layer (SQLite with WAL and a connection pool, or PostgreSQL)
+import database
+
+# Import the audit writer for the system errors
+import audit
+
+# Import the versioned schema migrations
+import migrations
+
+# Open a connection pool to an existing database (Without running the schema)
+# SQLite file by default, or the backend of db_url (STOCKFLOW_DB_URL, see database.connect)
+def connect_db(db_path=database.DB_PATH, db_url=database.DB_URL):
+    return database.connect(db_url, db_path)
 
 # Init the database if it's the first time you use the program
-def init_db():
+# Every process only checks the schema version, the pending migrations are applied once (migrations.py)
+def init_db(db_path=database.DB_PATH, db_url=database.DB_URL):
     try:
-        # Database name and schema file
-        db_path = "inventory.db"
-        schema_path = os.path.join("sql", "schema.sql")
+        # Connect with the pooled layer of the backend (SQLite or PostgreSQL)
+        db_connection = connect_db(db_path, db_url)
 
-        # Create database if doesn't exist
-        if not os.path.exists(db_path):
-            open(db_path, "w").close()
-            print(f"File {db_path} created")
+        # Create database file if doesn't exist (SQLite)
+        if db_connection.dialect == "sqlite" and not os.path.exists(db_connection.path):
+            open(db_connection.path, "w").close()
+            print(f"File {db_connection.path} created")
 
-        # Connect with CS50 host
-        db_connection = SQL(f"sqlite:///{db_path}")
+        # Bring the schema up to date (Only a version check when it already is)
+        migrations.check(db_connection)
 
     # If something goes wrong
     except Exception as e:
         print(f"Critical error during DB creation: {e}")
+        return None
 
-    if os.path.exists(schema_path):
-        with open(schema_path, "r") as f:
-            # Separate commands by ; to execute them one by one
-            commands = f.read().split(";")
-
-            # Execute every command
-            for command in commands:
-                # Clean command and execute it
-                clean_command = command.strip()
-                if clean_command:
-                    db_connection.execute(clean_command)
-
-        # Return the database connection to app.py
-        print("Database initialized from schema.sql.")
-        return db_connection
-
-    else:
-        # If someway you delete schema.sql, and it's int the roor directory
-        print(f"Warning: {schema_path} not found. Ensure the file exists in the root directory.")
+    # Return the database connection to app.py
+    return db_connection
 
 
 # Centralized function to record technical failures
@@ -59,12 +59,9 @@ def log_system_error(db, error, action="GENERAL_ERROR"):
         # Convert the error object to a string to store it
         error_details = str(error)
 
-        # Attempt to insert into the logs table
+        # Attempt to insert into the logs table (Through the audit writer)
         # We use 'SYSTEM' type to distinguish these from manual user actions
-        db.execute("""
-            INSERT INTO logs (type, action, description)
-            VALUES (?, ?, ?)
-        """, 'SYSTEM', action, f"Technical Failure: {error_details}")
+        audit.record(db, 'SYSTEM', action, f"Technical Failure: {error_details}")
 
         # Also print to the server console for immediate debugging during development
         print(f"\n[SYSTEM LOG] {action}: {error_details}\n")
@@ -74,3 +71,64 @@ def log_system_error(db, error, action="GENERAL_ERROR"):
         print("\n!!! CRITICAL INFRASTRUCTURE ERROR !!!")
         print(f"Could not write log to DB. Original error: {error}")
         print(f"Logging attempt failed due to: {e}\n")
+
+
+# Undo the open transaction without raising (Used on every error path of a write)
+def rollback(db):
+    try:
+        db.execute("ROLLBACK")
+
+    except Exception:
+        # There was no transaction open, or the connection is already gone
+        pass
+
+
+# Rows per multi-row INSERT (Keeps every statement under SQLite's bound parameters limit)
+INSERT_CHUNK_SIZE = 500
+
+# Insert many rows with executemany, or one multi-row statement per chunk, instead of one statement per row
+# Inputs: Database connection, table name, list of columns, list of row tuples and an optional clause (ON CONFLICT ...)
+def insert_many(db, table, columns, rows, suffix=""):
+    # Placeholders of a single row, e.g. "(?, ?, ?)"
+    row_placeholders = "(" + ", ".join("?" for _ in columns) + ")"
+
+    # Pooled SQLite layer: one prepared statement for every row
+    if hasattr(db, "executemany"):
+        if rows:
+            db.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {row_placeholders} {suffix}", rows)
+        return len(rows)
+
+    # Other connections (cs50.SQL): one multi-row statement per chunk
+
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+
+        # Flatten the values of the chunk in the same order as the placeholders
+        values = [value for row in chunk for value in row]
+        db.execute(f"""
+            INSERT INTO {table} ({", ".join(columns)})
+            VALUES {", ".join([row_placeholders] * len(chunk))}
+            {suffix}
+        """, *values)
+
+    # Return the number of inserted rows
+    return len(rows)
+
+
+# Encode the values of the last row shown into a URL-safe pagination cursor
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+# Decode a pagination cursor back into its values (None if it's missing or was modified)
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+
+    try:
+        # Restore the padding removed by encode_cursor
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+    except (ValueError, TypeError):
+        return None
+
+    return values if isinstance(values, list) and values else None
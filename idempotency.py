@@ -0,0 +1,97 @@
+"""
+Idempotency Module - Safe Retries of Stock Movements
+----------------------------------------------------
+This module lets a client send a buy or sell again after a timeout without
+moving the stock twice. The client sends an "Idempotency-Key" header (A new
+random value per movement, the same one on every retry), and the key is
+saved with the result in the same transaction as the movement.
+
+Key Responsibilities:
+- Replay: A retry of a saved movement returns the original result with one
+  primary key read (No write lock, no validation, no new movement).
+- Concurrency: Two requests with the same key at the same time are serialized
+  by the write lock (SQLite) or the primary key (PostgreSQL): the second one
+  gets the result of the first.
+- Misuse: The same key with a different product, quantity or type is rejected.
+- Expiry: Keys are kept for STOCKFLOW_IDEMPOTENCY_TTL_HOURS hours. Every new
+  key deletes a few expired ones, so the table cleans itself without a cron job.
+
+Note: Only saved movements are remembered. A rejected request wrote nothing,
+so its retry is validated again (Stock may have arrived in between).
+"""
+
+# Import hashlib for the request fingerprints, json for the saved results, os to read the settings
+import hashlib
+import json
+import os
+
+# Hours a key (And its result) is kept
+TTL_HOURS = int(os.environ.get("STOCKFLOW_IDEMPOTENCY_TTL_HOURS", 24))
+
+# HTTP header of the key, and its max length
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# Expired keys deleted by every new key (More than one, so the table shrinks after a peak)
+PURGE_PER_CLAIM = 2
+
+
+# Fingerprint of the request a key was used for (Detects a key reused for another movement)
+def fingerprint(*values):
+    text = json.dumps([str(value).strip() for value in values])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Result saved with a key that isn't expired (None if the key is new)
+# Raises ValueError if the key is invalid or was used for a different request
+def replay(db, key, request_fingerprint):
+    _validate(key)
+
+    rows = db.query("""
+        SELECT fingerprint, result FROM idempotency_keys
+        WHERE idempotency_key = ? AND expires_at > datetime('now')
+    """, key)
+
+    if not rows or rows[0]["result"] is None:
+        return None
+
+    if rows[0]["fingerprint"] != request_fingerprint:
+        raise ValueError(f"This {HEADER} was already used for a different request.")
+
+    return tuple(json.loads(rows[0]["result"]))
+
+# Takes a key inside the movement's transaction (Called right after BEGIN IMMEDIATE)
+# Returns False if another request saved it first (Roll back and replay it)
+def claim(db, key, request_fingerprint):
+    # An expired key can be used again
+    db.execute("DELETE FROM idempotency_keys WHERE idempotency_key = ? AND expires_at <= datetime('now')", key)
+
+    try:
+        db.execute("""
+            INSERT INTO idempotency_keys (idempotency_key, fingerprint, expires_at)
+            VALUES (?, ?, datetime('now', ?))
+        """, key, request_fingerprint, f"+{TTL_HOURS} hours")
+
+    # Primary key taken: the other request committed (On PostgreSQL this INSERT waited for it)
+    except ValueError:
+        return False
+
+    # A few expired keys, oldest first (Seek in the expires_at index)
+    db.execute("""
+        DELETE FROM idempotency_keys WHERE idempotency_key IN (
+            SELECT idempotency_key FROM idempotency_keys
+            WHERE expires_at <= datetime('now')
+            ORDER BY expires_at
+            LIMIT ?
+        )
+    """, PURGE_PER_CLAIM)
+    return True
+
+# Saves the result of the movement with its key (Same transaction, before COMMIT)
+def save(db, key, result):
+    db.execute("UPDATE idempotency_keys SET result = ? WHERE idempotency_key = ?", json.dumps(list(result)), key)
+
+
+# Keys are opaque text of a reasonable size (A UUID from the browser)
+def _validate(key):
+    if not isinstance(key, str) or not key.strip() or len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{HEADER} must be between 1 and {MAX_KEY_LENGTH} characters.")
@@ -0,0 +1,251 @@
+"""
+Importer Module - Bulk CSV Product Import
+-----------------------------------------
+This module loads whole catalogs from a CSV file instead of creating the
+products one by one with logic.add_product. The file is streamed, so it can
+have hundreds of thousands of rows.
+
+Expected columns (Header row, any order): name, sku, price, and optionally
+initial_stock (Default 0) and reorder_level (Default 5).
+
+Key Responsibilities:
+- Staged Validation: Rows are read and validated in chunks with the same
+  rules as logic.add_product, and SKUs repeated inside the file are rejected.
+- Duplicate Detection: One set-based query per chunk finds the SKUs that
+  already exist, instead of one failed INSERT per row.
+- Chunked Writes: Products, balances, initial stock transactions and logs of
+  a chunk are inserted with executemany in one transaction (One commit per chunk).
+- Report: Per-row errors (Line number, SKU and reason) and throughput.
+
+Note: Import is best effort by chunk. A bad row never stops the import, it's
+reported and skipped, and the chunks already committed stay saved. A line the
+CSV reader can't parse stops it: the rows read before it are still imported.
+"""
+
+# Import csv to read the file, os to read the settings, time for the throughput
+import csv
+import os
+import time
+
+# Import a Flask function for security (Same escaping as logic.add_product)
+import markupsafe
+
+# Import helpers functions
+from helpers import log_system_error, rollback, insert_many, INSERT_CHUNK_SIZE
+
+# Import the audit writer (Batched inserts into the logs table)
+import audit
+
+# Import the live updates of the open dashboards (One reload per chunk instead of an event per product)
+import events
+
+# Import the set of products to reorder (New products at their reorder level enter it)
+import reorder
+
+# Import the daily rollups (Initial stock counts as units in)
+import analytics
+
+# Import the in-memory product catalog (Every chunk bumps its version)
+import catalog
+
+# Rows validated and written per transaction
+IMPORT_CHUNK_ROWS = int(os.environ.get("STOCKFLOW_IMPORT_CHUNK_ROWS", 5000))
+
+# Max row errors kept in the report (The count is always exact)
+MAX_REPORTED_ERRORS = 1000
+
+# Columns of the CSV file
+REQUIRED_COLUMNS = ["name", "sku", "price"]
+OPTIONAL_COLUMNS = {"initial_stock": 0, "reorder_level": 5}
+
+
+# Imports every product of a CSV file (Any iterable of text lines, like an open file)
+# Returns (success, message, report) with the counts, the row errors and the throughput
+def import_products(db, lines, chunk_size=IMPORT_CHUNK_ROWS):
+    started = time.perf_counter()
+    report = {"rows": 0, "imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    reader = csv.DictReader(lines)
+
+    # Header names without spaces or case differences
+    if reader.fieldnames is None:
+        return False, "The file is empty.", report
+    reader.fieldnames = [(field or "").strip().lower() for field in reader.fieldnames]
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        return False, f"Missing columns: {', '.join(missing)}.", report
+
+    # SKUs already seen in this file (Duplicates inside the file are rejected too)
+    seen_skus = set()
+    chunk = []
+    line = 1
+
+    try:
+        # Line 1 is the header, so the first row is line 2
+        for line, row in enumerate(reader, start=2):
+            report["rows"] += 1
+            chunk.append((line, row))
+
+            if len(chunk) >= chunk_size:
+                _import_chunk(db, chunk, seen_skus, report)
+                chunk = []
+
+        if chunk:
+            _import_chunk(db, chunk, seen_skus, report)
+
+    # The file can't be read past this line: the rows already read are still imported, and the line is one failed row
+    # (So rows = imported + failed)
+    except csv.Error as e:
+        if chunk:
+            _import_chunk(db, chunk, seen_skus, report)
+
+        report["rows"] += 1
+        report["failed"] += 1
+        _add_error(report, line + 1, None, f"Invalid CSV: {e}")
+
+    seconds = time.perf_counter() - started
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["rows"] / seconds, 1) if seconds else None
+
+    # One summary log of the whole import
+    audit.record(db, 'USER', 'BULK_IMPORT',
+                 f"Imported {report['imported']} of {report['rows']} products from CSV ({report['failed']} errors)")
+
+    message = f"Imported {report['imported']} of {report['rows']} products"
+    if report["failed"]:
+        message += f" ({report['failed']} rows with errors)"
+
+    return report["imported"] > 0 or report["rows"] == 0, message + ".", report
+
+
+# Validates and writes one chunk of (line number, row dict)
+def _import_chunk(db, chunk, seen_skus, report):
+    # 1. Validate every row with the rules of logic.add_product
+    products = []
+    for line, row in chunk:
+        product, error = _validate_row(row)
+
+        if error is None and product[1] in seen_skus:
+            error = f"The SKU '{product[1]}' is repeated in the file."
+
+        if error:
+            report["failed"] += 1
+            _add_error(report, line, (row.get("sku") or "").strip().upper() or None, error)
+            continue
+
+        seen_skus.add(product[1])
+        products.append((line,) + product)
+
+    if not products:
+        return
+
+    # SKUs of the chunk that are already in the database
+    existing = set()
+
+    try:
+        # 2. Take the write lock, so no other request can create the same SKUs until COMMIT
+        db.execute("BEGIN IMMEDIATE")
+        db.lock_table("products")
+
+        # 3. SKUs that already exist (One query per slice of the UNIQUE index, not one per row)
+        skus = [product[2] for product in products]
+        for start in range(0, len(skus), INSERT_CHUNK_SIZE):
+            existing.update(row["sku"] for row in db.query(
+                "SELECT sku FROM products WHERE sku IN (?)", skus[start:start + INSERT_CHUNK_SIZE]))
+
+        new_products = []
+        for product in products:
+            if product[2] in existing:
+                report["failed"] += 1
+                _add_error(report, product[0], product[2],
+                           f"The SKU '{product[2]}' is already in use. Please use a different one.")
+                continue
+            new_products.append(product)
+
+        if not new_products:
+            db.execute("COMMIT")
+            return
+
+        # 4. Insert the products with one prepared statement
+        insert_many(db, "products", ["name", "sku", "price", "reorder_level"],
+                    [(name, sku, price, reorder_level) for _, name, sku, price, _, reorder_level in new_products])
+
+        # New ids by SKU (Set-based again, executemany doesn't return them)
+        ids = {}
+        new_skus = [product[2] for product in new_products]
+        for start in range(0, len(new_skus), INSERT_CHUNK_SIZE):
+            for row in db.query("SELECT id, sku FROM products WHERE sku IN (?)", new_skus[start:start + INSERT_CHUNK_SIZE]):
+                ids[row["sku"]] = row["id"]
+
+        # 5. Balances, initial stock transactions and logs of the chunk
+        balance_rows = []
+        transactions = []
+        logs = []
+        for _, name, sku, price, initial_stock, reorder_level in new_products:
+            product_id = ids[sku]
+            balance_rows.append((product_id, initial_stock))
+
+            if initial_stock > 0:
+                transactions.append((product_id, initial_stock, 'IN'))
+                logs.append(('USER', 'ADD_INITIAL_STOCK',
+                             f"Added new product {name} (SKU: {sku}) with initial stock: {initial_stock}"))
+            else:
+                logs.append(('USER', 'PRODUCT_CREATE', f"Added new product: {name} (SKU: {sku}) with initial stock: 0"))
+
+        insert_many(db, "stock_balances", ["product_id", "quantity"], balance_rows)
+        insert_many(db, "transactions", ["product_id", "quantity", "type"], transactions)
+        analytics.record(db, [(product_id, quantity) for product_id, quantity, _ in transactions])
+        audit.record_many(db, logs)
+
+        # New products that start at or below their reorder level
+        reorder.sync(db, [ids[product[2]] for product in new_products if product[4] <= product[5]])
+
+        # New catalog version, so every process loads the products of the chunk
+        catalog.touch(db, ids.values())
+
+        # The dashboards reload their table and every KPI is recomputed (Saved with the chunk)
+        events.publish(db, "reload", {"reason": "import"})
+
+        db.execute("COMMIT")
+        report["imported"] += len(new_products)
+
+    except Exception as e:
+        # Nothing of this chunk is saved, the next chunks still run
+        rollback(db)
+        print(f"Error in _import_chunk: {e}")
+        log_system_error(db, e, action="BULK_IMPORT_FAIL")
+
+        for product in products:
+            if product[2] not in existing:
+                report["failed"] += 1
+                _add_error(report, product[0], product[2], "An internal error occurred while importing this row.")
+
+# Validates one CSV row (Returns ((name, sku, price, initial_stock, reorder_level), None) or (None, error))
+def _validate_row(row):
+    try:
+        price = float(row.get("price"))
+        initial_stock = int(row.get("initial_stock") or OPTIONAL_COLUMNS["initial_stock"])
+        reorder_level = int(row.get("reorder_level") or OPTIONAL_COLUMNS["reorder_level"])
+
+    except (ValueError, TypeError):
+        return None, "Price, initial stock and reorder must be valid numbers."
+
+    if price < 0 or reorder_level < 0 or initial_stock < 0:
+        return None, "Numeric values cannot be negative."
+
+    name = (row.get("name") or "").strip()
+    sku = (row.get("sku") or "").strip().upper()
+
+    if not name or not sku:
+        return None, "Name and SKU cannot be empty"
+
+    # Prevent script running
+    return (str(markupsafe.escape(name)), sku, price, initial_stock, reorder_level), None
+
+# Adds a row error to the report (Only the first MAX_REPORTED_ERRORS are kept)
+def _add_error(report, line, sku, message):
+    if len(report["errors"]) >= MAX_REPORTED_ERRORS:
+        report["errors_truncated"] = True
+        return
+    report["errors"].append({"line": line, "sku": sku, "message": message})
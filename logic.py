@@ -16,29 +16,51 @@ Note: All functions return a (Boolean, String) tuple for easy feedback in Flask.
 import markupsafe
 
 # Import helpers functions
-from helpers import log_system_error
+from helpers import log_system_error, rollback, insert_many
 
-# Manually add inventory movement (IN/OUT)
-def add_transaction(db, product_id, quantity, type):
-    try:
-        # 1. A- Validate the product id
-        rows = db.execute("""
-            SELECT p.name, p.sku, p.is_active, p.reorder_level, COALESCE(SUM(t.quantity), 0) AS current_stock
-            FROM products p
-            LEFT JOIN transactions t ON p.id = t.product_id
-            WHERE p.id = ?
-            GROUP BY p.id
-        """, product_id)
+# Import the materialized stock balances
+import balances
+
+# Import the set of products to reorder (Kept in the same transaction as the stock)
+import reorder
+
+# Import the audit writer (Batched inserts into the logs table)
+import audit
+
+# Import the live updates of the open dashboards (Saved in the transaction of every write)
+import events
+
+# Import the daily rollups of the movement analytics (Kept in the same transaction as the ledger)
+import analytics
+
+# Import the idempotency keys (Retries of a saved movement get its original result)
+import idempotency
 
-        if len(rows) == 0:
-            return False, "Product does not exist.", None, None
+# Import the in-memory product catalog (Name, SKU, price and status without reading the products table)
+import catalog
 
-        elif len(rows) != 1:
-            return False, "Invalid ID.", None, None
+# Import the single-writer mode (Movements and new products can be applied by one writer process)
+import writer
 
-        product = rows[0]
+# Messages of the failures that aren't the client's fault: the same request can succeed later
+# (app.py answers them with a 5xx, so the dashboard retries them with the same Idempotency-Key)
+INTERNAL_ERROR = "Internal Server Error"
+KEY_IN_PROGRESS = "A request with this key is still being processed. Retry it."
 
-        # 1. B- Validate type and quantity
+# Manually add inventory movement (IN/OUT)
+# Validation, ledger insert, balance update and audit log commit together as one unit
+# With idempotency_key, a retry of the same movement returns the first result (idempotency.py)
+def add_transaction(db, product_id, quantity, type, idempotency_key=None):
+    try:
+        # 0. A retry of a saved movement gets its original result (One read: no lock, no validation)
+        request_fingerprint = None
+        if idempotency_key is not None:
+            request_fingerprint = idempotency.fingerprint(product_id, quantity, type)
+            result = idempotency.replay(db, idempotency_key, request_fingerprint)
+            if result:
+                return result
+
+        # 1. A- Validate type and quantity (Before taking the write lock)
         if type not in ['IN', 'OUT']:
             raise ValueError("Transaction type must be 'IN' or 'OUT'")
 
@@ -51,39 +73,22 @@ def add_transaction(db, product_id, quantity, type):
         if quantity <= 0:
             return False, "Quantity must be a positive number (greater than zero).", None, None,
 
-        # 1. C- Validate product status (Business Rule)
-        if product["is_active"] == 0:
-            return False, "Cannot move stock: Product is deactivated.", None, None
-
-        # 1. D- Validate stock for OUT operations
-        if type == 'OUT' and quantity > product["current_stock"]:
-            return False, f"Insufficient stock. Current: {product['current_stock']}", None, None
-
-        # 2. A- Business rule: Quantity sign based on type
-        quantity = -abs(quantity) if type == 'OUT' else abs(quantity)
-
-        # 2. B- Gets the new stock value and reorder_level
-        new_stock = product["current_stock"] + quantity
-        reorder_level = product['reorder_level']
-
-        if new_stock < 0:
-            return False, "Error: Stock cannot be negative", None, None
+        # 1. B- Validation and writes as one transaction: this worker's own (Write lock until COMMIT),
+        # or a group commit of the writer process (writer.py)
+        result, _ = writer.execute(db, "movement", product_id, quantity, type, idempotency_key, request_fingerprint)
 
-        # 3. A- Insert transaction record into the transactions table (product by id, quantity, and it´s type by quantity sign)
-        db.execute(""" INSERT INTO transactions (product_id, quantity, type)
-                    VALUES (?, ?, ?) """,
-                    product_id, quantity, type)
+        # A request with the same key saved the movement while this one waited for the lock
+        if result is None:
+            return (idempotency.replay(db, idempotency_key, request_fingerprint)
+                    or (False, KEY_IN_PROGRESS, None, None))
 
-        # 3. B- Log the human action into logs table
-        action_description = f"{type} {abs(quantity)} units for {product['name']} (SKU: {product['sku']})"
-        db.execute(""" INSERT INTO logs (type, action, description)
-                    VALUES (?, ?, ?) """,
-                    'USER', 'MANUAL_MOVE', action_description)
-
-        # Return true for validate operation on app.py
-        return True, "Success", new_stock, reorder_level
+        # Return true for validate operation on app.py (The dashboards, KPIs and cached pages follow the saved event)
+        return result
 
     except ValueError as ve:
+        # Nothing of this movement is saved
+        rollback(db)
+
         # Print for developer
         print(f"Error in add_transaction: {ve}")
 
@@ -91,14 +96,268 @@ def add_transaction(db, product_id, quantity, type):
         return False, str(ve), None, None
 
     except Exception as e:
+        # Nothing of this movement is saved
+        rollback(db)
+
         # Print for developer
         print(f"Error in add_transaction: {e}")
 
         # Log the error and try to introduce in logs table
         log_system_error(db, e, action="ADD_TRANSACTION_FAIL")
 
-        # Return error message with None values to avoid errors
-        return False, "Internal Server Error", None, None
+        # Return error message with None values to avoid errors (Database or writer process failure)
+        return False, INTERNAL_ERROR, None, None
+
+# Write step of a movement (Runs inside a transaction opened by writer.execute)
+# Returns (result, effects): the tuple of add_transaction and the values of the saved movement, effects is None if
+# nothing was written. result is None if another request already saved the idempotency key
+def _write_movement(db, product_id, quantity, type, idempotency_key, request_fingerprint):
+    # A request with the same key may have saved the movement while this one waited for the lock
+    if idempotency_key is not None and not idempotency.claim(db, idempotency_key, request_fingerprint):
+        return None, None
+
+    # 1. C- Current stock and catalog version with one read (The balance row is locked on PostgreSQL)
+    rows = db.query("""
+        SELECT b.quantity, (SELECT version FROM catalog_version WHERE id = 1) AS version
+        FROM stock_balances b
+        WHERE b.product_id = ?
+    """ + db.row_lock("b"), product_id)
+    current_stock, version = (rows[0]["quantity"], rows[0]["version"]) if rows else (0, None)
+
+    # Name, SKU, price and status from the catalog of this process (Refreshed if the version moved)
+    product = catalog.get(db, product_id, version)
+
+    if product is None:
+        return (False, "Product does not exist.", None, None), None
+
+    # 1. D- Validate product status (Business Rule)
+    if product["is_active"] == 0:
+        return (False, "Cannot move stock: Product is deactivated.", None, None), None
+
+    # 1. E- Validate stock for OUT operations
+    if type == 'OUT' and quantity > current_stock:
+        return (False, f"Insufficient stock. Current: {current_stock}", None, None), None
+
+    # 2. A- Business rule: Quantity sign based on type
+    quantity = -abs(quantity) if type == 'OUT' else abs(quantity)
+
+    # 2. B- Gets the new stock value and reorder_level
+    product_id = product["id"]
+    new_stock = current_stock + quantity
+    reorder_level = product['reorder_level']
+
+    # 2. C- Guarded balance update (SQLite refuses it if stock would go negative)
+    if not balances.apply_delta(db, product_id, quantity):
+        return (False, "Error: Stock cannot be negative", None, None), None
+
+    # 2. D- Enter or leave the reorder list if the movement crosses the reorder level
+    reorder.on_movement(db, product_id, current_stock, new_stock, reorder_level)
+
+    # 3. A- Insert transaction record into the transactions table (product by id, quantity, and it´s type by quantity sign)
+    db.execute(""" INSERT INTO transactions (product_id, quantity, type)
+                VALUES (?, ?, ?) """,
+                product_id, quantity, type)
+    analytics.record(db, [(product_id, quantity)])
+
+    # 3. B- Log the human action into logs table (Queued for the audit writer in async mode)
+    action_description = f"{type} {abs(quantity)} units for {product['name']} (SKU: {product['sku']})"
+    audit.record(db, 'USER', 'MANUAL_MOVE', action_description)
+
+    # 3. C- Live update for the dashboards and KPIs of every worker (Saved with the movement)
+    events.publish(db, "stock", _stock_event(product_id, current_stock, new_stock, product["price"], reorder_level))
+
+    # 3. D- The result is saved with the key (A retry returns it instead of moving the stock again)
+    if idempotency_key is not None:
+        idempotency.save(db, idempotency_key, (True, "Success", new_stock, reorder_level))
+
+    # Values of the saved movement (The worker knows from them that something was written)
+    return (True, "Success", new_stock, reorder_level), {
+        "id": product_id, "old_stock": current_stock, "new_stock": new_stock,
+        "price": product["price"], "reorder_level": reorder_level,
+    }
+
+# Data of a stock event: the new stock for the browsers, and the old one, price and reorder level for the KPIs
+def _stock_event(product_id, old_stock, new_stock, price, reorder_level):
+    return {"id": product_id, "new_stock": new_stock, "status": events.stock_status(new_stock, reorder_level),
+            "old_stock": old_stock, "price": price, "reorder_level": reorder_level}
+
+# Max lines accepted in a single batch (A receipt or picking list)
+MAX_BATCH_LINES = 5000
+
+# Batch modes: 'atomic' saves every line or none, 'best_effort' saves the valid lines and reports the rest
+BATCH_MODES = ['atomic', 'best_effort']
+
+# Add many inventory movements (IN/OUT) in one transaction
+# Input: list of dictionaries with product_id, quantity and type
+# Returns success, message and a result per line (Same order as the input)
+def add_transactions_batch(db, items, mode='atomic'):
+    # Validate the batch itself
+    if mode not in BATCH_MODES:
+        return False, f"Mode must be one of: {', '.join(BATCH_MODES)}.", []
+
+    if not isinstance(items, list) or len(items) == 0:
+        return False, "The batch must have at least one line.", []
+
+    if len(items) > MAX_BATCH_LINES:
+        return False, f"A batch cannot have more than {MAX_BATCH_LINES} lines.", []
+
+    # Result of every line, they start as failed until they are validated
+    results = []
+    lines = []
+
+    try:
+        # 1. A- Validate type and quantity of every line (Before taking the write lock)
+        for index, item in enumerate(items):
+            result = {"line": index, "success": False, "message": "", "product_id": None}
+            results.append(result)
+
+            if not isinstance(item, dict):
+                result["message"] = "Line must be an object with product_id, quantity and type."
+                continue
+
+            try:
+                product_id = _whole_number(item.get("product_id"))
+                quantity = _whole_number(item.get("quantity"))
+
+            except (ValueError, TypeError):
+                result["message"] = "Product id and quantity must be valid whole numbers."
+                continue
+
+            result["product_id"] = product_id
+            type = str(item.get("type", "")).upper()
+
+            if type not in ['IN', 'OUT']:
+                result["message"] = "Transaction type must be 'IN' or 'OUT'"
+                continue
+
+            if quantity <= 0:
+                result["message"] = "Quantity must be a positive number (greater than zero)."
+                continue
+
+            lines.append((result, product_id, quantity, type))
+
+        # In atomic mode a single bad line cancels the batch
+        if mode == 'atomic' and len(lines) != len(results):
+            return False, "Batch rejected: some lines are invalid.", results
+
+        if not lines:
+            return False, "Batch rejected: no valid lines.", results
+
+        # 1. B- Take the write lock, so the stock read below can't change until COMMIT
+        db.execute("BEGIN IMMEDIATE")
+
+        # 1. C- Read every product of the batch with one set-based query (Row tuples)
+        # Ids in order, so concurrent batches lock their rows in the same order (PostgreSQL)
+        product_ids = sorted({product_id for _, product_id, _, _ in lines})
+        products = {}
+        for start in range(0, len(product_ids), 500):
+            rows = db.query("""
+                SELECT p.id, p.name, p.sku, p.price, p.is_active, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+                FROM products p
+                LEFT JOIN stock_balances b ON p.id = b.product_id
+                WHERE p.id IN (?)
+                ORDER BY p.id
+            """ + db.row_lock("p"), product_ids[start:start + 500])
+            for row in rows:
+                products[row["id"]] = row
+
+        # 2. A- Validate the lines in order, with a running stock per product
+        running_stock = {product_id: product["current_stock"] for product_id, product in products.items()}
+        deltas = {}
+        transactions = []
+        logs = []
+
+        for result, product_id, quantity, type in lines:
+            product = products.get(product_id)
+
+            if product is None:
+                result["message"] = "Product does not exist."
+                continue
+
+            if product["is_active"] == 0:
+                result["message"] = "Cannot move stock: Product is deactivated."
+                continue
+
+            if type == 'OUT' and quantity > running_stock[product_id]:
+                result["message"] = f"Insufficient stock. Current: {running_stock[product_id]}"
+                continue
+
+            # 2. B- Business rule: Quantity sign based on type
+            quantity = -abs(quantity) if type == 'OUT' else abs(quantity)
+            running_stock[product_id] += quantity
+            deltas[product_id] = deltas.get(product_id, 0) + quantity
+
+            # 2. C- Rows to insert for this line
+            transactions.append((product_id, quantity, type))
+            logs.append(('USER', 'BULK_MOVE', f"{type} {abs(quantity)} units for {product['name']} (SKU: {product['sku']})"))
+
+            # Line accepted with the stock it leaves
+            new_stock = running_stock[product_id]
+            result.update({
+                "success": True,
+                "message": "Success",
+                "new_stock": new_stock,
+                "status": "Ok" if new_stock > product["reorder_level"] else "Pedir más"
+            })
+
+        accepted = len(transactions)
+
+        # In atomic mode every line must pass, in best effort mode at least one
+        if (mode == 'atomic' and accepted != len(results)) or accepted == 0:
+            rollback(db)
+
+            return False, "Batch rejected: some lines failed validation.", _reject_lines(results, "Not saved: the batch was rejected.")
+
+        # 3. A- Guarded balance update for every product at once
+        if not balances.apply_deltas(db, deltas):
+            rollback(db)
+            return False, "Error: Stock cannot be negative", _reject_lines(results, "Not saved: the batch was rejected.")
+
+        # 3. B- Reorder list state of every moved product (Set-based)
+        reorder.sync(db, deltas)
+
+        # 3. C- Ledger rows with a multi-row insert, and the audit rows
+        insert_many(db, "transactions", ["product_id", "quantity", "type"], transactions)
+        analytics.record(db, [(product_id, quantity) for product_id, quantity, _ in transactions])
+        audit.record_many(db, logs)
+
+        # 3. D- One live update per product of the batch (Dashboards and KPIs of every worker)
+        events.publish_many(db, [
+            ("stock", _stock_event(product_id, products[product_id]["current_stock"], running_stock[product_id],
+                                   products[product_id]["price"], products[product_id]["reorder_level"]))
+            for product_id in deltas
+        ])
+
+        # 3. E- A single commit for the whole batch
+        db.execute("COMMIT")
+
+        return True, f"{accepted} of {len(results)} lines saved.", results
+
+    except Exception as e:
+        # Nothing of this batch is saved
+        rollback(db)
+
+        # Print for developer and log the error into logs table
+        print(f"Error in add_transactions_batch: {e}")
+        log_system_error(db, e, action="ADD_TRANSACTIONS_BATCH_FAIL")
+
+        return False, INTERNAL_ERROR, _reject_lines(results, "Not saved: internal error.")
+
+# Whole number of a JSON line: an integer, or a string with one like the form fields
+# (1.9 would be truncated to 1 and true read as 1, so floats and booleans are rejected)
+def _whole_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Not a whole number: {value!r}")
+    return int(value)
+
+# Marks the lines that had passed validation as not saved (The batch was rolled back)
+def _reject_lines(results, message):
+    for result in results:
+        if result["success"]:
+            result.update({"success": False, "message": message})
+            result.pop("new_stock", None)
+            result.pop("status", None)
+    return results
 
 # Create a new product
 def add_product(db, name, sku, price, initial_stock = 0, reorder_level = 5):
@@ -127,35 +386,23 @@ def add_product(db, name, sku, price, initial_stock = 0, reorder_level = 5):
         # Prevent script running
         name = markupsafe.escape(name)
 
-        # Database has an index on SKU, so it's not necessary to handle duplicates
-        # The variable it's ID of the new product
-        new_id = db.execute("""
-            INSERT INTO products (name, sku, price, reorder_level)
-            VALUES (?, ?, ?, ?)
-        """, name, sku, price, reorder_level)
-
-        # Log the stock value into transactions and register in logs table
-        if initial_stock > 0:
-            db.execute("""INSERT INTO transactions
-                       (product_id, quantity, type)
-                       VALUES (?, ?, ?)""",
-                       new_id, initial_stock, 'IN')
-            action_description = f"Added new product {name} (SKU: {sku}) with initial stock: {initial_stock}"
-            db.execute(""" INSERT INTO logs (type, action, description)
-                    VALUES (?, ?, ?) """,
-                    'USER', 'ADD_INITIAL_STOCK', action_description)
-
-        # Log the succesful move if doesn't have initial stock
-        elif initial_stock == 0:
-            action_description = f"Added new product: {name} (SKU: {sku}) with initial stock: 0"
-            db.execute(""" INSERT INTO logs (type, action, description)
-                        VALUES (?, ?, ?) """,
-                        'USER', 'PRODUCT_CREATE', action_description)
+        # A SKU already in the catalog is rejected without taking the write lock (The UNIQUE index still guards it)
+        if catalog.find_sku(db, sku) is not None:
+            return False, f"The SKU '{sku}' is already in use. Please use a different one.", None
+
+        # Product, initial stock and log are saved together (One commit, or a group commit of the writer process)
+        result, effects = writer.execute(db, "product", name, sku, price, initial_stock, reorder_level)
+
+        # Add the product to this process's catalog (The other workers load it when they read the new version)
+        catalog.add(effects.pop("catalog_version"), effects)
 
         # Return true to app.py and a success message
-        return True, "Product created successfully", new_id
+        return result
 
     except Exception as e:
+        # Nothing of this product is saved
+        rollback(db)
+
         # Automathic message of SQLite if sku is already in use
         if "UNIQUE constraint failed" in str(e):
             return False, f"The SKU '{sku}' is already in use. Please use a different one.", None
@@ -167,3 +414,51 @@ def add_product(db, name, sku, price, initial_stock = 0, reorder_level = 5):
         # Register into logs table
         log_system_error(db, e, action="ADD_PRODUCT_FAIL")
         return False, "An internal error occurred while creating the product.", None
+
+# Write step of a new product (Runs inside a transaction opened by writer.execute)
+# Returns (result, effects): the tuple of add_product and the new product for the live updates
+def _write_product(db, name, sku, price, initial_stock, reorder_level):
+    # Database has an index on SKU, so it's not necessary to handle duplicates
+    # The variable it's ID of the new product
+    new_id = db.execute("""
+        INSERT INTO products (name, sku, price, reorder_level)
+        VALUES (?, ?, ?, ?)
+    """, name, sku, price, reorder_level)
+
+    # Every product starts with a balance row (Zero or the initial stock)
+    balances.apply_delta(db, new_id, initial_stock)
+
+    # New catalog version, so every process loads the product
+    version = catalog.touch(db, [new_id])
+
+    # Starts in the reorder list if the initial stock is already at the reorder level
+    if initial_stock <= reorder_level:
+        reorder.sync(db, [new_id])
+
+    # Log the stock value into transactions and register in logs table
+    if initial_stock > 0:
+        db.execute("""INSERT INTO transactions
+                   (product_id, quantity, type)
+                   VALUES (?, ?, ?)""",
+                   new_id, initial_stock, 'IN')
+        analytics.record(db, [(new_id, initial_stock)])
+        action_description = f"Added new product {name} (SKU: {sku}) with initial stock: {initial_stock}"
+        audit.record(db, 'USER', 'ADD_INITIAL_STOCK', action_description)
+
+    # Log the succesful move if doesn't have initial stock
+    elif initial_stock == 0:
+        action_description = f"Added new product: {name} (SKU: {sku}) with initial stock: 0"
+        audit.record(db, 'USER', 'PRODUCT_CREATE', action_description)
+
+    # Live update for the dashboards and KPIs of every worker (Saved with the product)
+    product = {"id": new_id, "name": str(name), "sku": sku, "price": price,
+               "current_stock": initial_stock, "reorder_level": reorder_level}
+    events.publish(db, "product", product)
+
+    # Values for the catalog of the worker, after COMMIT
+    return (True, "Product created successfully", new_id), dict(product, catalog_version=version)
+
+
+# Write steps of the movements and new products (Applied in this process, or by the writer process)
+writer.register("movement", _write_movement)
+writer.register("product", _write_product)
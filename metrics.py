@@ -0,0 +1,258 @@
+"""
+Metrics Module - Query and Request Instrumentation
+--------------------------------------------------
+This module measures what every request costs in SQL, so a slow dashboard
+can be traced to the statement that dominates it.
+
+Key Responsibilities:
+- Query Timings: database.py reports the duration, row count and errors of
+  every execute/query/executemany call, labeled by the statement text.
+- Request Timings: app.py reports the duration and status of every request,
+  with the number of queries it ran and the time spent in SQLite.
+- Slow Query Log: Statements over STOCKFLOW_SLOW_QUERY_MS are logged with
+  their duration and row count (Logger 'stockflow.slow_query', stderr by
+  default, so the stdout of scripts stays clean).
+- Profiling: A sample of requests (STOCKFLOW_PROFILE_SAMPLE_RATE) runs under
+  cProfile and its stats are dumped to STOCKFLOW_PROFILE_DIR.
+- Exposition: 'render' prints every counter and histogram in the Prometheus
+  text format for the /metrics endpoint.
+
+Note: Metrics are per process, like the summary cache. With several workers,
+each one reports its own numbers.
+"""
+
+# Import os to read the settings, re to label the statements, random to sample the profiles
+import cProfile
+import functools
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+# Turn the instrumentation off completely (0) if even its small overhead matters
+ENABLED = os.environ.get("STOCKFLOW_METRICS", "1") != "0"
+
+# Statements slower than this are logged (0 turns the log off)
+SLOW_QUERY_MS = float(os.environ.get("STOCKFLOW_SLOW_QUERY_MS", 100))
+
+# Fraction of requests profiled with cProfile (0 = never, 1 = every request) and where the .prof files go
+PROFILE_SAMPLE_RATE = float(os.environ.get("STOCKFLOW_PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.environ.get("STOCKFLOW_PROFILE_DIR", "profiles")
+
+# Histogram buckets (Upper bounds): seconds for durations, plain counts for queries per request
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+# Max length of the text of a statement label (Keeps the /metrics output readable)
+# A longer statement is cut and gets a hash of its whole text, so statements with the same start keep their own series
+LABEL_LENGTH = 120
+
+# Statement texts whose label is kept (The code runs the same texts again and again)
+LABEL_CACHE = 1024
+
+# Slow query log (Without handlers configured, warnings go to stderr)
+_slow_log = logging.getLogger("stockflow.slow_query")
+
+# SQL comments, whitespace runs and the "?, ?, ?" lists expanded for IN clauses
+_COMMENTS = re.compile(r"--[^\n]*")
+_SPACES = re.compile(r"\s+")
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+# Counters and histograms of this process: name -> {labels tuple: value}
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+# Help text and type of every metric (Printed by render)
+_METRICS = {
+    "stockflow_db_queries_total": ("counter", "SQL statements run, by statement."),
+    "stockflow_db_query_errors_total": ("counter", "SQL statements that raised an error, by statement."),
+    "stockflow_db_query_rows_total": ("counter", "Rows returned or changed, by statement."),
+    "stockflow_db_slow_queries_total": ("counter", "SQL statements slower than the slow query threshold."),
+    "stockflow_db_query_duration_seconds": ("histogram", "SQL statement duration, by statement."),
+    "stockflow_http_requests_total": ("counter", "HTTP requests, by method, endpoint and status."),
+    "stockflow_http_request_duration_seconds": ("histogram", "HTTP request duration, by endpoint."),
+    "stockflow_http_request_queries": ("histogram", "SQL statements run per HTTP request, by endpoint."),
+    "stockflow_http_request_db_seconds": ("histogram", "Time spent in SQLite per HTTP request, by endpoint."),
+    "stockflow_profiles_total": ("counter", "Requests profiled with cProfile."),
+}
+
+# State of the request running in the current thread
+_local = threading.local()
+
+# Only one cProfile can run at a time in a process
+_profile_lock = threading.Lock()
+
+
+# Records one SQL statement: duration in seconds, rows returned or changed, and if it failed
+def observe_query(sql, seconds, rows=0, error=False):
+    if not ENABLED:
+        return
+
+    labels = (("statement", statement_label(sql)),)
+
+    with _lock:
+        _increment("stockflow_db_queries_total", labels)
+        _increment("stockflow_db_query_rows_total", labels, rows)
+        _observe("stockflow_db_query_duration_seconds", labels, seconds, DURATION_BUCKETS)
+        if error:
+            _increment("stockflow_db_query_errors_total", labels)
+
+    # Add it to the request that is running in this thread
+    if getattr(_local, "started", None) is not None:
+        _local.queries += 1
+        _local.db_seconds += seconds
+
+    # Slow query log
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        with _lock:
+            _increment("stockflow_db_slow_queries_total", ())
+        _slow_log.warning("[SLOW QUERY] %.1fms rows=%s %s", seconds * 1000, rows, labels[0][1])
+
+# Short, stable label of a statement: one line without comments, and IN lists collapsed to "?..."
+# Over LABEL_LENGTH: the start of the text and "#" with a hash of all of it (Same label in every process)
+# Cached by statement text, so the regexes run once per statement and not on every execution
+@functools.lru_cache(maxsize=LABEL_CACHE)
+def statement_label(sql):
+    label = _PLACEHOLDERS.sub("?...", _SPACES.sub(" ", _COMMENTS.sub("", sql)).strip())
+    if len(label) <= LABEL_LENGTH:
+        return label
+
+    digest = hashlib.blake2b(label.encode("utf-8"), digest_size=6).hexdigest()
+    return f"{label[:LABEL_LENGTH]}... #{digest}"
+
+
+# Starts measuring a request (Flask before_request)
+def start_request():
+    if not ENABLED:
+        return
+
+    _local.started = time.perf_counter()
+    _local.queries = 0
+    _local.db_seconds = 0.0
+    _local.profiler = None
+
+    # Sampled profiling (Skipped if another request is already being profiled)
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE and _profile_lock.acquire(blocking=False):
+        _local.profiler = cProfile.Profile()
+        _local.profiler.enable()
+
+# Finishes measuring a request (Flask after_request)
+# Returns (seconds, queries, db_seconds) for the response headers, or None if nothing was started
+def end_request(method, endpoint, status):
+    started = getattr(_local, "started", None)
+    if started is None:
+        return None
+
+    seconds = time.perf_counter() - started
+    queries, db_seconds = _local.queries, _local.db_seconds
+    _local.started = None
+
+    _finish_profile(endpoint)
+
+    endpoint = endpoint or "unknown"
+    with _lock:
+        _increment("stockflow_http_requests_total", (("method", method), ("endpoint", endpoint), ("status", str(status))))
+        _observe("stockflow_http_request_duration_seconds", (("endpoint", endpoint),), seconds, DURATION_BUCKETS)
+        _observe("stockflow_http_request_queries", (("endpoint", endpoint),), queries, COUNT_BUCKETS)
+        _observe("stockflow_http_request_db_seconds", (("endpoint", endpoint),), db_seconds, DURATION_BUCKETS)
+
+    return seconds, queries, db_seconds
+
+# Stops the profiler of this request (If it was sampled) and dumps its stats to a .prof file
+def _finish_profile(endpoint):
+    profiler = getattr(_local, "profiler", None)
+    if profiler is None:
+        return
+
+    _local.profiler = None
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        # One file per request: open it with 'python -m pstats' or snakeviz
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint or 'unknown'}-{os.getpid()}-{random.randint(0, 99999):05d}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+
+        with _lock:
+            _increment("stockflow_profiles_total", ())
+
+    except Exception as e:
+        print(f"Error in _finish_profile: {e}")
+
+    finally:
+        _profile_lock.release()
+
+
+# Prometheus text format of every metric, plus gauges computed by the caller ({name: (help, value)})
+def render(gauges=None):
+    lines = []
+
+    with _lock:
+        for name, (kind, help) in _METRICS.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            if kind == "counter":
+                for labels, value in sorted(_counters.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+
+            for labels, histogram in sorted(_histograms.get(name, {}).items()):
+                for bound, count in zip(histogram["bounds"], histogram["buckets"]):
+                    bucket_labels = labels + (("le", _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    for name, (help, value) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+# Clears every metric (Maintenance and benchmarks)
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+# Adds to a counter (Called with the lock held)
+def _increment(name, labels, value=1):
+    series = _counters.setdefault(name, {})
+    series[labels] = series.get(labels, 0) + value
+
+# Adds one observation to a histogram (Called with the lock held)
+# The buckets are cumulative, like Prometheus expects them
+def _observe(name, labels, value, bounds):
+    series = _histograms.setdefault(name, {})
+    histogram = series.get(labels)
+    if histogram is None:
+        histogram = series[labels] = {"bounds": bounds, "buckets": [0] * len(bounds), "sum": 0.0, "count": 0}
+
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            histogram["buckets"][index] += 1
+
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+# {key="value",...} with the quotes, backslashes and newlines escaped
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+# Integers without decimals, floats with full precision
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
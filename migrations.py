@@ -0,0 +1,197 @@
+"""
+Migrations Module - Versioned Schema Changes
+--------------------------------------------
+This module replaces running the whole schema file on every process start.
+The schema is a list of numbered SQL files per dialect
+(sql/migrations/sqlite, sql/migrations/postgresql), and the database
+records the ones already applied in the 'schema_version' table.
+
+Key Responsibilities:
+- Boot Check: 'check' costs one indexed read and a directory listing when
+  the schema is up to date (The normal case for every worker).
+- Election: When several workers boot on an old schema, only one applies the
+  migrations: the write lock (SQLite) or an advisory lock (PostgreSQL) is
+  taken, and the version is read again inside it.
+- Migrating: 'migrate' applies the pending files in order, each one with its
+  version row in the same transaction (A failed migration leaves nothing).
+- Online Changes: A file starting with "-- migrate: no-transaction" runs
+  statement by statement outside a transaction, for changes that can't run
+  inside one (CREATE INDEX CONCURRENTLY on PostgreSQL). Its statements must be
+  idempotent (IF NOT EXISTS), because a crash can leave it half applied.
+
+Note: File names are NNNN_description.sql, statements are separated by ";"
+(Never put a ";" inside a comment). An applied file must never be edited,
+'status' reports it if its checksum changed. Adding a column with a constant
+default is instant on both dialects, even on big tables.
+"""
+
+# Import hashlib for the checksums, os and re to list the files, time for the durations
+import hashlib
+import os
+import re
+import time
+
+# Apply the pending migrations when a process starts (0: only check, and print a warning if behind)
+MIGRATE_ON_BOOT = os.environ.get("STOCKFLOW_MIGRATE_ON_BOOT", "1") != "0"
+
+# Folder of the migration files (One subfolder per dialect)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "migrations")
+
+# Key of the PostgreSQL advisory lock held while migrating
+LOCK_KEY = 727301
+
+# Migration file names: version and description
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# Directive of the migrations that run outside a transaction
+NO_TRANSACTION = "-- migrate: no-transaction"
+
+# Table of the applied migrations (Same SQL on both dialects)
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        seconds REAL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+# Migration files of a dialect, in order: list of (version, name, path)
+def available(dialect):
+    folder = os.path.join(MIGRATIONS_DIR, dialect)
+
+    files = []
+    for filename in os.listdir(folder):
+        match = _FILENAME.match(filename)
+        if match:
+            files.append((int(match.group(1)), match.group(2), os.path.join(folder, filename)))
+
+    return sorted(files)
+
+# Last applied version (0 for a new database)
+def current_version(db):
+    try:
+        return db.query("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")[0]["version"]
+
+    # No schema_version table yet
+    except RuntimeError:
+        return 0
+
+# Cheap check of every process at boot: migrates only if the database is behind the files
+# Returns True if the schema is up to date
+def check(db):
+    files = available(db.dialect)
+    latest = files[-1][0] if files else 0
+    current = current_version(db)
+
+    if current >= latest:
+        return True
+
+    if not MIGRATE_ON_BOOT:
+        print(f"Warning: database schema is at version {current} of {latest}. Run 'flask migrate'.")
+        return False
+
+    migrate(db)
+    return True
+
+# Applies the pending migrations up to target (Default: all of them)
+# Returns the applied ones as a list of (version, name, seconds)
+def migrate(db, target=None):
+    db.execute(SCHEMA_VERSION_TABLE)
+    applied = []
+
+    # One runner at a time (The other workers wait here, then find nothing to do)
+    if db.dialect == "postgresql":
+        db.execute("SELECT pg_advisory_lock(?)", LOCK_KEY)
+
+    try:
+        for version, name, path in available(db.dialect):
+            if target is not None and version > target:
+                break
+
+            seconds = _apply(db, version, name, path)
+            if seconds is not None:
+                applied.append((version, name, seconds))
+                print(f"Applied migration {version:04d}_{name} ({seconds:.2f}s)")
+
+    finally:
+        if db.dialect == "postgresql":
+            db.execute("SELECT pg_advisory_unlock(?)", LOCK_KEY)
+
+    return applied
+
+# Every migration file with its state: list of dicts (version, name, applied, applied_at, changed)
+def status(db):
+    applied = {}
+    if current_version(db):
+        applied = {row["version"]: row for row in db.execute("SELECT version, checksum, applied_at FROM schema_version")}
+
+    migrations = []
+    for version, name, path in available(db.dialect):
+        row = applied.get(version)
+        migrations.append({
+            "version": version,
+            "name": name,
+            "applied": row is not None,
+            "applied_at": row["applied_at"] if row else None,
+            "changed": row is not None and row["checksum"] != _checksum(_read(path)),
+        })
+
+    return migrations
+
+
+# Applies one migration file if it's still pending (Returns its duration, None if another process did it)
+def _apply(db, version, name, path):
+    text = _read(path)
+    statements = [statement.strip() for statement in text.split(";") if statement.strip()]
+    started = time.perf_counter()
+
+    try:
+        # Online changes: every statement on its own, then the version row
+        if text.lstrip().startswith(NO_TRANSACTION):
+            if current_version(db) >= version:
+                return None
+
+            for statement in statements:
+                db.execute(statement)
+
+            statements = []
+
+        # Write lock, and the version again inside it (Another worker may have applied it meanwhile)
+        db.execute("BEGIN IMMEDIATE")
+        db.lock_table("schema_version")
+
+        if current_version(db) >= version:
+            db.execute("ROLLBACK")
+            return None
+
+        for statement in statements:
+            db.execute(statement)
+
+        seconds = time.perf_counter() - started
+        db.execute("INSERT INTO schema_version (version, name, checksum, seconds) VALUES (?, ?, ?, ?)",
+                   version, name, _checksum(text), round(seconds, 3))
+        db.execute("COMMIT")
+        return seconds
+
+    except Exception as e:
+        # Nothing of this migration is saved (Except the statements of a no-transaction one)
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+
+        # The logs table may not exist yet, so the error is only printed
+        print(f"Error in migration {version:04d}_{name}: {e}")
+        raise
+
+# Text of a migration file
+def _read(path):
+    with open(path, "r") as f:
+        return f.read()
+
+# Checksum of a migration text (Detects edits to applied files)
+def _checksum(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
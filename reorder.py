@@ -0,0 +1,189 @@
+"""
+Reorder Module - Low Stock Alerts & Purchase Suggestions
+--------------------------------------------------------
+This module keeps the set of active products at or below their reorder
+level in the 'reorder_alerts' table, so listing what needs to be bought
+reads only those products instead of checking the whole catalog.
+
+Key Responsibilities:
+- At-Risk Set: The write paths update it inside their transaction. A single
+  movement only touches it when the product crosses its reorder level.
+- Reorder List: Paginated (Oldest alert first) with cursors, like the other tables.
+- Suggestions: Daily consumption over the last STOCKFLOW_REORDER_WINDOW_DAYS
+  days, days of cover, and the quantity to buy to cover the supplier lead time
+  plus STOCKFLOW_REORDER_COVER_DAYS days.
+
+Note: A product enters the set with stock <= reorder_level, the same rule as
+the "Pedir más" badge and the low stock KPI.
+"""
+
+# Import math to round the suggestions up, os to read the settings
+import math
+import os
+
+# Import the function to log system errors and the pagination cursors
+from helpers import log_system_error, encode_cursor, decode_cursor
+
+# Days of movements used to measure the consumption
+WINDOW_DAYS = int(os.environ.get("STOCKFLOW_REORDER_WINDOW_DAYS", 30))
+
+# Days the supplier takes to deliver, and days of stock to have after the delivery
+LEAD_DAYS = int(os.environ.get("STOCKFLOW_REORDER_LEAD_DAYS", 7))
+COVER_DAYS = int(os.environ.get("STOCKFLOW_REORDER_COVER_DAYS", 14))
+
+# Products per page of the reorder list
+PER_PAGE = 20
+
+
+# Updates the set after one movement (Called inside the movement's transaction)
+# Only writes when the product crosses its reorder level
+def on_movement(db, product_id, old_stock, new_stock, reorder_level):
+    was_at_risk = old_stock <= reorder_level
+    is_at_risk = new_stock <= reorder_level
+
+    if is_at_risk and not was_at_risk:
+        db.execute("INSERT OR IGNORE INTO reorder_alerts (product_id) VALUES (?)", product_id)
+
+    elif was_at_risk and not is_at_risk:
+        db.execute("DELETE FROM reorder_alerts WHERE product_id = ?", product_id)
+
+# Recomputes the state of many products at once (Batches, new products, imports)
+# Products that stay at risk keep their 'since' date
+def sync(db, product_ids):
+    product_ids = list(product_ids)
+
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+
+        # Products that recovered (Or were deactivated)
+        db.execute("""
+            DELETE FROM reorder_alerts
+            WHERE product_id IN (?) AND product_id NOT IN (
+                SELECT p.id FROM products p
+                LEFT JOIN stock_balances b ON p.id = b.product_id
+                WHERE p.id IN (?) AND p.is_active = 1 AND COALESCE(b.quantity, 0) <= p.reorder_level
+            )
+        """, chunk, chunk)
+
+        # Products at risk now
+        db.execute("""
+            INSERT OR IGNORE INTO reorder_alerts (product_id)
+            SELECT p.id FROM products p
+            LEFT JOIN stock_balances b ON p.id = b.product_id
+            WHERE p.id IN (?) AND p.is_active = 1 AND COALESCE(b.quantity, 0) <= p.reorder_level
+        """, chunk)
+
+# Rebuilds the whole set from the balances (Called inside the transaction of balances.rebuild_balances)
+def rebuild(db):
+    db.execute("""
+        DELETE FROM reorder_alerts
+        WHERE product_id NOT IN (
+            SELECT p.id FROM products p
+            LEFT JOIN stock_balances b ON p.id = b.product_id
+            WHERE p.is_active = 1 AND COALESCE(b.quantity, 0) <= p.reorder_level
+        )
+    """)
+    db.execute("""
+        INSERT OR IGNORE INTO reorder_alerts (product_id)
+        SELECT p.id FROM products p
+        LEFT JOIN stock_balances b ON p.id = b.product_id
+        WHERE p.is_active = 1 AND COALESCE(b.quantity, 0) <= p.reorder_level
+    """)
+
+
+# Columns of the reorder list (Reads only the products in the set, by primary key)
+ALERT_COLUMNS = """
+    SELECT a.product_id AS id, a.since, p.name, p.sku, p.price, p.reorder_level,
+           COALESCE(b.quantity, 0) AS current_stock
+    FROM reorder_alerts a
+    JOIN products p ON p.id = a.product_id
+    LEFT JOIN stock_balances b ON b.product_id = a.product_id
+"""
+
+# One page of the products to reorder, oldest alert first, with their suggestions
+# Pages with a cursor: 'after' (Next page) or 'before' (Previous page), both encoded from (since, id)
+def get_reorder_list(db, after=None, before=None, per_page=PER_PAGE):
+    try:
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+        after = after if after and len(after) == 2 else None
+        before = before if before and len(before) == 2 else None
+
+        # Next page: seek in the (since, product_id) index
+        if after:
+            rows = db.execute(ALERT_COLUMNS + """
+                WHERE (a.since, a.product_id) > (?, ?)
+                ORDER BY a.since ASC, a.product_id ASC
+                LIMIT ?
+            """, after[0], after[1], per_page + 1)
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_prev = True
+
+        # Previous page: read backwards and reverse
+        elif before:
+            rows = db.execute(ALERT_COLUMNS + """
+                WHERE (a.since, a.product_id) < (?, ?)
+                ORDER BY a.since DESC, a.product_id DESC
+                LIMIT ?
+            """, before[0], before[1], per_page + 1)
+            has_prev = len(rows) > per_page
+            rows = rows[:per_page][::-1]
+            has_next = True
+
+        else:
+            rows = db.execute(ALERT_COLUMNS + """
+                ORDER BY a.since ASC, a.product_id ASC
+                LIMIT ?
+            """, per_page + 1)
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_prev = False
+
+        add_suggestions(db, rows)
+
+        # Size of the set (Cheap: it only has the products at risk)
+        total = db.execute("SELECT COUNT(*) AS count FROM reorder_alerts")[0]["count"]
+
+        return {
+            "products": rows,
+            "total": total,
+            "next_cursor": encode_cursor(rows[-1]["since"], rows[-1]["id"]) if rows and has_next else None,
+            "prev_cursor": encode_cursor(rows[0]["since"], rows[0]["id"]) if rows and has_prev else None,
+        }
+
+    except Exception as e:
+        print(f"Error in get_reorder_list: {e}")
+        log_system_error(db, e, action="GET_REORDER_LIST_FAIL")
+        return {"products": [], "total": 0, "next_cursor": None, "prev_cursor": None}
+
+# Adds consumption, days of cover and the suggested quantity to every product (dicts with id, current_stock, reorder_level)
+# One windowed query for the whole page (Seek in the (product_id, timestamp) index of every product)
+def add_suggestions(db, products):
+    if not products:
+        return products
+
+    consumed = {row["product_id"]: row["consumed"] for row in db.query("""
+        SELECT product_id, -SUM(quantity) AS consumed
+        FROM transactions
+        WHERE product_id IN (?) AND timestamp >= datetime('now', ?) AND quantity < 0
+        GROUP BY product_id
+    """, [product["id"] for product in products], f"-{WINDOW_DAYS} days")}
+
+    for product in products:
+        stock = product["current_stock"] or 0
+        reorder_level = product["reorder_level"] or 0
+        velocity = (consumed.get(product["id"]) or 0) / WINDOW_DAYS
+
+        product["out_of_stock"] = stock == 0
+        product["consumed"] = consumed.get(product["id"]) or 0
+        product["daily_velocity"] = round(velocity, 2)
+
+        # Days until it runs out at the current pace (None if it isn't moving)
+        product["days_of_cover"] = round(stock / velocity, 1) if velocity else None
+
+        # Enough to get over the reorder level and cover the lead time plus the cover days
+        target = reorder_level + 1 + math.ceil(velocity * (LEAD_DAYS + COVER_DAYS))
+        product["suggested_quantity"] = max(0, target - stock)
+
+    return products
@@ -13,47 +13,113 @@ Key Responsibilities:
 # Import math library for calculate logs quantity to show
 import math
 
-# Import the function to log system errors
-from helpers import log_system_error
+# Import time for the cached counts
+import time
+
+# Import the function to log system errors and the pagination cursors
+from helpers import log_system_error, encode_cursor, decode_cursor
+
+# Import the cache of the dashboard KPIs
+import summary_cache
+
+# Import the in-memory product catalog (Static attributes of the stock table)
+import catalog
+
+# Seconds a total count is reused before running it again (Only used to show "Page X of Y")
+COUNT_CACHE_TTL = 30
+
+# Cached total counts: {key: (count, time it was saved)}
+_count_cache = {}
+
+# Returns a cached count, running the query again only when the TTL expires
+def _cached_count(db, key, query):
+    cached = _count_cache.get(key)
+    if cached and time.monotonic() - cached[1] < COUNT_CACHE_TTL:
+        return cached[0]
+
+    res = db.execute(query)
+    count = (res[0]["count"] or 0) if res else 0
+    _count_cache[key] = (count, time.monotonic())
+    return count
+
+# Columns of the stock table read from the database (Stock comes from the materialized balances)
+# The name and id come from the pagination index, SKU, price and reorder level from the catalog
+STOCK_COLUMNS = """
+    SELECT p.id, p.name, COALESCE(b.quantity, 0) AS current_stock
+    FROM products p
+    LEFT JOIN stock_balances b ON p.id = b.product_id
+"""
 
 # Get all the products, it's current stock, value
-def get_stock_report(db, page = 1, per_page = 10):
+# Pages with a cursor: 'after' (Next page) or 'before' (Previous page), both encoded from (name, id)
+# Without cursor it uses the classic page number (Only cheap for the first pages)
+def get_stock_report(db, page = 1, per_page = 10, after = None, before = None):
     try:
         # Validate input and equals to 1
         if page < 1: page = 1
 
-        # Get count of pagination if product is active}
-        total_res = db.execute("SELECT COUNT(*) as count FROM products WHERE is_active = 1")
-
-        # Get the numeric value
-        total_count = total_res[0]["count"] if total_res else 0
+        # Get count of pagination if product is active (Cached, it's only used for the page numbers)
+        total_count = _cached_count(db, "products", "SELECT COUNT(*) as count FROM products WHERE is_active = 1")
 
         # Show the product in a new page even is it's only one
         total_pages = math.ceil(total_count / per_page)
 
-        # If user inputs a page bigger than the existing
-        if page > total_pages and total_pages > 0:
-            # Return the last one
-            page = total_pages
+        # Decode the cursors (None if they are missing or invalid, a stock cursor is always [name, id])
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+        after = after if after and len(after) == 2 else None
+        before = before if before and len(before) == 2 else None
 
-        # Skip calculation
-        offset = (page - 1) * per_page
+        # Next page: products after the last one of the previous page (Seek in the index, no offset)
+        if after:
+            stock = db.execute(STOCK_COLUMNS + """
+                WHERE p.is_active = 1 AND (p.name, p.id) > (?, ?)
+                ORDER BY p.name ASC, p.id ASC
+                LIMIT ?
+            """, after[0], after[1], per_page + 1)
+            has_next = len(stock) > per_page
+            stock = stock[:per_page]
+            has_prev = True
 
-        # Get the stock, quantity total and limit and offset
+        # Previous page: products before the first one of the next page (Read backwards and reverse)
+        elif before:
+            stock = db.execute(STOCK_COLUMNS + """
+                WHERE p.is_active = 1 AND (p.name, p.id) < (?, ?)
+                ORDER BY p.name DESC, p.id DESC
+                LIMIT ?
+            """, before[0], before[1], per_page + 1)
+            has_prev = len(stock) > per_page
+            stock = stock[:per_page][::-1]
+            has_next = True
 
-        stock = db.execute("""
-            SELECT p.id, p.name, p.sku, p.price, p.reorder_level,
-                   COALESCE(SUM(t.quantity), 0) AS current_stock
-            FROM products p
-            LEFT JOIN transactions t ON p.id = t.product_id
-            WHERE p.is_active = 1
-            GROUP BY p.id, p.name, p.sku, p.price, p.reorder_level
-            ORDER BY p.name ASC
-            LIMIT ? OFFSET ?
-        """, per_page, offset)
+        else:
+            # If user inputs a page bigger than the existing
+            if page > total_pages and total_pages > 0:
+                # Return the last one
+                page = total_pages
+
+            # Skip calculation
+            offset = (page - 1) * per_page
+
+            stock = db.execute(STOCK_COLUMNS + """
+                WHERE p.is_active = 1
+                ORDER BY p.name ASC, p.id ASC
+                LIMIT ? OFFSET ?
+            """, per_page + 1, offset)
+            has_next = len(stock) > per_page
+            stock = stock[:per_page]
+            has_prev = page > 1
+
+        # SKU, price and reorder level of the page from the catalog of this process
+        products = catalog.get_many(db, [item["id"] for item in stock])
 
         # Alerts processes
         for item in stock:
+            product = products.get(item["id"], {})
+            item["sku"] = product.get("sku")
+            item["price"] = product.get("price")
+            item["reorder_level"] = product.get("reorder_level")
+
             current = item["current_stock"] or 0
             reorder = item["reorder_level"] or 0
 
@@ -63,11 +129,17 @@ def get_stock_report(db, page = 1, per_page = 10):
             # Out of stock: stock is exactly 0
             item["out_of_stock"] = current == 0
 
+        # Cursors for the pagination links (First and last product of this page)
+        next_cursor = encode_cursor(stock[-1]["name"], stock[-1]["id"]) if stock and has_next else None
+        prev_cursor = encode_cursor(stock[0]["name"], stock[0]["id"]) if stock and has_prev else None
+
         # Return the values to show them in the index
         return {
             "products": stock,
-            "total_pages": total_pages,
-            "current_page": page
+            "total_pages": max(total_pages, page),
+            "current_page": page,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
         }
 
     except Exception as e:
@@ -75,30 +147,136 @@ def get_stock_report(db, page = 1, per_page = 10):
         print(f"Error in get_stock_report: {e}")
 
         # Return empty data for not breaking the page
-        return {"products": [], "total_pages": 1, "current_page": 1}
+        return {"products": [], "total_pages": 1, "current_page": 1, "next_cursor": None, "prev_cursor": None}
+
+# Max products returned by the search (Typeahead in buy and sell modals)
+SEARCH_LIMIT = 20
+
+# Highest unicode character, used as the upper bound of a prefix range
+PREFIX_END = "\U0010ffff"
+
+# Search active products whose SKU or name starts with the query (Indexed prefix lookups, never a full scan)
+def search_products(db, query="", limit=SEARCH_LIMIT):
+    try:
+        # Validate the limit (Between 1 and the default max)
+        limit = max(1, min(int(limit), SEARCH_LIMIT))
+        query = (query or "").strip()
+
+        # Without query, return the first products by name
+        if not query:
+            return db.execute("""
+                SELECT p.id, p.name, p.sku, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+                FROM products p
+                LEFT JOIN stock_balances b ON p.id = b.product_id
+                WHERE p.is_active = 1
+                ORDER BY p.name COLLATE NOCASE
+                LIMIT ?
+            """, limit)
+
+        # SKUs are saved in uppercase, so the range uses the UNIQUE index on sku
+        sku_prefix = query.upper()
+        by_sku = db.execute("""
+            SELECT p.id, p.name, p.sku, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+            FROM products p
+            LEFT JOIN stock_balances b ON p.id = b.product_id
+            WHERE p.sku >= ? AND p.sku < ? AND p.is_active = 1
+            ORDER BY p.sku
+            LIMIT ?
+        """, sku_prefix, sku_prefix + PREFIX_END, limit)
+
+        # Name prefix (Case insensitive) uses the partial index of active products
+        # PostgreSQL compares LOWER(name), so the prefix goes in lowercase there
+        name_prefix = query.lower() if db.dialect == "postgresql" else query
+        by_name = db.execute("""
+            SELECT p.id, p.name, p.sku, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+            FROM products p
+            LEFT JOIN stock_balances b ON p.id = b.product_id
+            WHERE p.is_active = 1
+              AND p.name COLLATE NOCASE >= ? AND p.name COLLATE NOCASE < ?
+            ORDER BY p.name COLLATE NOCASE
+            LIMIT ?
+        """, name_prefix, name_prefix + PREFIX_END, limit)
+
+        # SKU matches first, then name matches without repeating products
+        seen = set()
+        products = []
+        for item in by_sku + by_name:
+            if item["id"] not in seen:
+                seen.add(item["id"])
+                products.append(item)
+
+        return products[:limit]
+
+    except Exception as e:
+        # Print for developer
+        print(f"Error in search_products: {e}")
+
+        # Return an empty list to not break the modals
+        return []
 
 # Get the complete activity history for the logs table (Gets only a few by page)
-def get_transaction_logs(db, page=1):
+# Newest first, paged with a cursor on the log id: 'after' (Older logs) or 'before' (Newer logs)
+# Logs are only rendered, so they come as Row tuples instead of dicts
+def get_transaction_logs(db, page=1, after=None, before=None):
     try:
         # Logs number to show per page
         PER_PAGE = 10
 
-        # Skip value
-        offset = (page - 1) * PER_PAGE
+        # Validate input and equals to 1
+        if page < 1: page = 1
+
+        # Decode the cursors (None if they are missing or invalid)
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+
+        # Older logs: ids lower than the last one shown (Seek in the primary key, no offset)
+        if after:
+            logs = db.query(""" SELECT id, type, action, description, timestamp
+                            FROM logs
+                            WHERE id < ?
+                            ORDER BY id DESC
+                            LIMIT ?
+                            """, after[0], PER_PAGE + 1)
+            has_next = len(logs) > PER_PAGE
+            logs = logs[:PER_PAGE]
+            has_prev = True
+
+        # Newer logs: read upwards from the first one shown and reverse
+        elif before:
+            logs = db.query(""" SELECT id, type, action, description, timestamp
+                            FROM logs
+                            WHERE id > ?
+                            ORDER BY id ASC
+                            LIMIT ?
+                            """, before[0], PER_PAGE + 1)
+            has_prev = len(logs) > PER_PAGE
+            logs = logs[:PER_PAGE][::-1]
+            has_next = True
 
-        # Get the logs with limit and skip
-        logs = db.execute(""" SELECT id, type, action, description, timestamp
-                        FROM logs
-                        ORDER BY "timestamp" DESC
-                        LIMIT ? OFFSET ?
-                        """, PER_PAGE, offset)
+        else:
+            # Skip value
+            offset = (page - 1) * PER_PAGE
 
-        # Total pages calculation and total rows or actual page
-        total_rows = db.execute("SELECT COUNT(*) as count FROM logs")[0]['count']
-        total_pages = (total_rows + PER_PAGE - 1) // PER_PAGE
+            # Get the logs with limit and skip (Id order is insert order, so it's also time order)
+            logs = db.query(""" SELECT id, type, action, description, timestamp
+                            FROM logs
+                            ORDER BY id DESC
+                            LIMIT ? OFFSET ?
+                            """, PER_PAGE + 1, offset)
+            has_next = len(logs) > PER_PAGE
+            logs = logs[:PER_PAGE]
+            has_prev = page > 1
 
-        # Return logs, total pages and actual page
-        return logs, total_pages, page
+        # Total pages calculation (Approximated with the last id, logs are never deleted)
+        total_rows = _cached_count(db, "logs", "SELECT MAX(id) as count FROM logs")
+        total_pages = max((total_rows + PER_PAGE - 1) // PER_PAGE, page)
+
+        # Cursors for the pagination links
+        next_cursor = encode_cursor(logs[-1]["id"]) if logs and has_next else None
+        prev_cursor = encode_cursor(logs[0]["id"]) if logs and has_prev else None
+
+        # Return logs, total pages, actual page and the cursors
+        return logs, total_pages, page, next_cursor, prev_cursor
 
     except Exception as e:
         # Print for developer
@@ -106,35 +284,12 @@ def get_transaction_logs(db, page=1):
 
         # Log the error and try to introduce in logs table (Returns the first page)
         log_system_error(db, e, action="GET_TRANSACTION_LOGS_FAIL")
-        return [], 1, 1
+        return [], 1, 1, None, None
 
-# Calculates KPI cards data for dashboard
+# Calculates KPI cards data for dashboard (Served from the summary cache, kept up to date by the events)
 def get_inventory_summary(db):
     try:
-        # Complete query of total_items, total_value and low_stock_count
-        query = """
-            SELECT
-                COUNT(*) as total_items,
-                SUM(current_stock * price) as total_value,
-                SUM(CASE WHEN current_stock <= reorder_level THEN 1 ELSE 0 END) as low_stock_count
-            FROM (
-                SELECT p.price, p.reorder_level, COALESCE(SUM(t.quantity), 0) AS current_stock
-                FROM products p
-                LEFT JOIN transactions t ON p.id = t.product_id
-                WHERE p.is_active = 1
-                GROUP BY p.id
-            )
-        """
-
-        # Gets the first element
-        res = db.execute(query)[0]
-
-        # Return the values into a dictionarie
-        return {
-            "total_items": res["total_items"] or 0,
-            "total_value": round(res["total_value"] or 0, 2),
-            "low_stock_count": res["low_stock_count"] or 0
-        }
+        return summary_cache.get(db, compute_inventory_summary)
 
     except Exception as e:
         # Print for developer
@@ -145,3 +300,32 @@ def get_inventory_summary(db):
 
         # Return empty values
         return {"total_items": 0, "total_value": 0.0, "low_stock_count": 0}
+
+# Full aggregate over every active product (Only runs on a cache miss)
+def compute_inventory_summary(db):
+    # Complete query of total_items, total_value and low_stock_count
+    # With the last event in the same statement (Same snapshot), so the cache applies only the events after it
+    query = """
+        SELECT
+            COUNT(*) as total_items,
+            SUM(current_stock * price) as total_value,
+            SUM(CASE WHEN current_stock <= reorder_level THEN 1 ELSE 0 END) as low_stock_count,
+            (SELECT COALESCE(MAX(id), 0) FROM events) as event_id
+        FROM (
+            SELECT p.price, p.reorder_level, COALESCE(b.quantity, 0) AS current_stock
+            FROM products p
+            LEFT JOIN stock_balances b ON p.id = b.product_id
+            WHERE p.is_active = 1
+        ) AS stock
+    """
+
+    # Gets the first element
+    res = db.execute(query)[0]
+
+    # Return the values into a dictionarie
+    return {
+        "total_items": res["total_items"] or 0,
+        "total_value": res["total_value"] or 0,
+        "low_stock_count": res["low_stock_count"] or 0,
+        "event_id": res["event_id"]
+    }
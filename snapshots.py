@@ -0,0 +1,227 @@
+"""
+Snapshots Module - Ledger Checkpoints & Compaction
+--------------------------------------------------
+This module summarizes the append-only 'transactions' ledger into per-product
+checkpoints ('stock_snapshots'): the balance of a product through a given
+transaction id. Any balance is then the latest snapshot plus the movements
+after it, so rebuilds and historical reports don't scan the whole history.
+
+Key Responsibilities:
+- Snapshots: 'take_snapshot' checkpoints every product that moved since the
+  previous run (Only the new movements are read).
+- Point-in-Time Stock: 'stock_as_of' answers "stock at date X" from the
+  closest snapshot before X plus the movements up to X.
+- Archival: 'archive_ledger' moves movements already covered by a snapshot
+  to a separate SQLite file, so the live ledger stays small. No balance or
+  report changes, because the snapshot carries their total.
+
+Note: Run "flask compact-ledger" periodically (cron, systemd timer) to keep
+the snapshots close to the head of the ledger.
+"""
+
+# Import os to read the settings and check the archive file
+import os
+
+# Import the function to log system errors
+from helpers import log_system_error, rollback
+
+# Import the audit writer to record every compaction
+import audit
+
+# Archive file for the movements moved out of the live ledger
+ARCHIVE_PATH = os.environ.get("STOCKFLOW_ARCHIVE_PATH", "inventory-archive.db")
+
+# Movements younger than this stay in the live ledger when archiving
+ARCHIVE_KEEP_DAYS = int(os.environ.get("STOCKFLOW_ARCHIVE_KEEP_DAYS", 90))
+
+# Balance of every product from the ledger: latest snapshot + movements after it
+# Used by balances.py to rebuild and check the materialized stock
+LEDGER_BALANCES = """
+    SELECT p.id AS product_id,
+           COALESCE(s.quantity, 0) + COALESCE((
+               SELECT SUM(t.quantity) FROM transactions t
+               WHERE t.product_id = p.id AND t.id > COALESCE(s.transaction_id, 0)
+           ), 0) AS quantity
+    FROM products p
+    LEFT JOIN stock_snapshots s ON s.product_id = p.id AND s.transaction_id = (
+        SELECT MAX(transaction_id) FROM stock_snapshots WHERE product_id = p.id
+    )
+"""
+
+
+# Writes a snapshot of every product that moved since the last one (Returns (products, transaction_id))
+def take_snapshot(db):
+    try:
+        # Write lock: no movement can land between reading the head of the ledger and the snapshot
+        db.execute("BEGIN IMMEDIATE")
+        db.lock_table("transactions")
+
+        head = db.query("SELECT id, timestamp FROM transactions ORDER BY id DESC LIMIT 1")
+        previous = db.query("SELECT COALESCE(MAX(transaction_id), 0) AS id FROM stock_snapshots")[0]["id"]
+
+        # Nothing new since the last snapshot
+        if not head or head[0]["id"] <= previous:
+            db.execute("COMMIT")
+            return 0, previous
+
+        transaction_id, as_of = head[0]["id"], head[0]["timestamp"]
+
+        # Previous snapshot of each product + its movements in (previous, head]
+        # Only the new movements are read (Range on the primary key)
+        db.execute("""
+            INSERT INTO stock_snapshots (product_id, transaction_id, quantity, as_of)
+            SELECT t.product_id, ?,
+                   COALESCE((SELECT s.quantity FROM stock_snapshots s
+                             WHERE s.product_id = t.product_id
+                             ORDER BY s.transaction_id DESC LIMIT 1), 0) + SUM(t.quantity),
+                   ?
+            FROM transactions t
+            WHERE t.id > ? AND t.id <= ?
+            GROUP BY t.product_id
+        """, transaction_id, as_of, previous, transaction_id)
+
+        # The INSERT ... SELECT returns no row count (cs50 contract), count the new snapshot
+        count = db.query("SELECT COUNT(*) AS count FROM stock_snapshots WHERE transaction_id = ?", transaction_id)[0]["count"]
+
+        audit.record(db, 'SYSTEM', 'LEDGER_SNAPSHOT',
+                     f"Snapshot of {count} products through transaction {transaction_id} ({as_of})")
+        db.execute("COMMIT")
+        return count, transaction_id
+
+    except Exception as e:
+        rollback(db)
+        print(f"Error in take_snapshot: {e}")
+        log_system_error(db, e, action="LEDGER_SNAPSHOT_FAIL")
+        raise
+
+# Moves the movements covered by a snapshot and older than keep_days to the archive file
+# Returns the number of movements archived
+def archive_ledger(db, archive_path=ARCHIVE_PATH, keep_days=ARCHIVE_KEEP_DAYS):
+    # Newest snapshot old enough to archive up to (Every movement before it is in a snapshot)
+    cutoff = db.query("""
+        SELECT MAX(transaction_id) AS id FROM stock_snapshots
+        WHERE as_of <= datetime('now', ?)
+    """, f"-{int(keep_days)} days")[0]["id"]
+
+    archived = db.query("SELECT COALESCE(MAX(to_transaction_id), 0) AS id FROM ledger_archives")[0]["id"]
+    if not cutoff or cutoff <= archived:
+        return 0
+
+    to_timestamp = db.query("SELECT as_of FROM stock_snapshots WHERE transaction_id = ? LIMIT 1", cutoff)[0]["as_of"]
+
+    # ATTACH can't run inside a transaction
+    _attach_archive(db, archive_path)
+    try:
+        # 1. Copy to the archive (OR IGNORE: a run that died after this step can run again)
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("""
+            INSERT OR IGNORE INTO archive.transactions (id, product_id, quantity, type, timestamp)
+            SELECT id, product_id, quantity, type, timestamp
+            FROM main.transactions
+            WHERE id > ? AND id <= ?
+        """, archived, cutoff)
+        db.execute("COMMIT")
+
+        # 2. Remove from the live ledger and record the range (WAL commits each file on its own)
+        db.execute("BEGIN IMMEDIATE")
+        count = db.execute("DELETE FROM main.transactions WHERE id > ? AND id <= ?", archived, cutoff)
+        db.execute("""
+            INSERT INTO ledger_archives (path, from_transaction_id, to_transaction_id, to_timestamp, rows)
+            VALUES (?, ?, ?, ?, ?)
+        """, os.path.abspath(archive_path), archived + 1, cutoff, to_timestamp, count)
+        audit.record(db, 'SYSTEM', 'LEDGER_ARCHIVE',
+                     f"Archived {count} movements (Transactions {archived + 1} to {cutoff}) to {archive_path}")
+        db.execute("COMMIT")
+        return count
+
+    except Exception as e:
+        rollback(db)
+        print(f"Error in archive_ledger: {e}")
+        log_system_error(db, e, action="LEDGER_ARCHIVE_FAIL")
+        raise
+
+    finally:
+        _detach_archive(db)
+
+# Stock of every product at a date ('YYYY-MM-DD HH:MM:SS', UTC like the ledger)
+# Closest snapshot at or before the date + the movements after it up to the date
+def stock_as_of(db, timestamp, product_id=None, active_only=False):
+    sql, args, archive_path = stock_as_of_query(db, timestamp, product_id, active_only)
+    if archive_path is None:
+        return db.execute(sql, *args)
+
+    _attach_archive(db, archive_path)
+    try:
+        return db.execute(sql, *args)
+    finally:
+        _detach_archive(db)
+
+# SQL and arguments of stock_as_of, and the archive file it needs as 'archive' (None if the live ledger is enough)
+# Columns: id, name, sku, price, reorder_level, quantity (Also streamed by exports.py)
+# active_only: only the active products, like the stock report. Raises ValueError if the archive is missing
+def stock_as_of_query(db, timestamp, product_id=None, active_only=False):
+    # Movements needed from the archive: only if the date is before the end of an archived range
+    # The oldest of those ranges has all of them (Ranges end at a snapshot, so the ones before it start
+    # after the closest snapshot, and the newer ones only have movements after the date)
+    archives = db.query("""
+        SELECT path, to_timestamp FROM ledger_archives
+        WHERE to_timestamp > ?
+        ORDER BY to_transaction_id ASC LIMIT 1
+    """, timestamp)
+    archive_path = archives[0]["path"] if archives else None
+
+    # Without the archived movements the quantities would be wrong (PostgreSQL keeps them in a schema)
+    if archive_path and db.dialect != "postgresql" and not os.path.exists(archive_path):
+        raise ValueError(f"The stock before {archives[0]['to_timestamp']} needs the ledger archive "
+                         f"{archive_path}, which is missing.")
+
+    archive_sum = """
+        + COALESCE((SELECT SUM(a.quantity) FROM archive.transactions a
+                    WHERE a.product_id = p.id AND a.id > COALESCE(s.transaction_id, 0) AND a.timestamp <= ?), 0)
+    """ if archive_path else ""
+
+    conditions = (["p.id = ?"] if product_id is not None else []) + (["p.is_active = 1"] if active_only else [])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    sql = f"""
+        SELECT p.id, p.name, p.sku, p.price, p.reorder_level,
+               COALESCE(s.quantity, 0)
+               + COALESCE((SELECT SUM(t.quantity) FROM transactions t
+                           WHERE t.product_id = p.id AND t.id > COALESCE(s.transaction_id, 0) AND t.timestamp <= ?), 0)
+               {archive_sum} AS quantity
+        FROM products p
+        LEFT JOIN stock_snapshots s ON s.product_id = p.id AND s.transaction_id = (
+            SELECT MAX(transaction_id) FROM stock_snapshots WHERE product_id = p.id AND as_of <= ?
+        )
+        {where}
+        ORDER BY p.name ASC, p.id ASC
+    """
+    args = [timestamp] + ([timestamp] if archive_path else []) + [timestamp]
+    if product_id is not None:
+        args.append(product_id)
+
+    return sql, args, archive_path
+
+
+# Attaches the archive file as 'archive' (Creates it and its table the first time)
+# PostgreSQL has it as the 'archive' schema of the same database (sql/migrations/postgresql)
+def _attach_archive(db, archive_path):
+    if db.dialect == "postgresql":
+        return
+
+    db.execute("ATTACH DATABASE ? AS archive", archive_path)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS archive.transactions (
+            id INTEGER PRIMARY KEY,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            timestamp DATETIME
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_product ON transactions(product_id)")
+
+# Detaches the archive file (Nothing to do on PostgreSQL)
+def _detach_archive(db):
+    if db.dialect != "postgresql":
+        db.execute("DETACH DATABASE archive")
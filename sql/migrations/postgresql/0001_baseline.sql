@@ -0,0 +1,119 @@
+-- Migration 1: Baseline schema of the Inventory Management System (PostgreSQL, same tables as the SQLite baseline)
+-- Timestamps are UTC without time zone, like SQLite's CURRENT_TIMESTAMP
+-- Text that is compared by ranges (SKU and name prefixes, name pagination) uses the "C" collation, like SQLite's BINARY
+
+-- Products table: Information about products in inventory
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    sku TEXT COLLATE "C" UNIQUE NOT NULL,
+    name TEXT COLLATE "C" NOT NULL,
+    reorder_level INTEGER DEFAULT 5,
+    price DOUBLE PRECISION NOT NULL,
+    is_active INTEGER DEFAULT 1
+);
+
+-- Transactions table: Records of stock movements
+CREATE TABLE IF NOT EXISTS transactions (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    type TEXT CHECK(type IN ('IN', 'OUT')) NOT NULL,
+    timestamp TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+    -- Integrity checks
+    CONSTRAINT check_quantity_logic CHECK (
+        (type = 'IN' AND quantity > 0) OR
+        (type = 'OUT' AND quantity < 0)
+    )
+);
+
+-- Logs table: All logs of system and user actions
+CREATE TABLE IF NOT EXISTS logs (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    type TEXT CHECK(type IN ('SYSTEM', 'USER')) NOT NULL,
+    action TEXT NOT NULL,
+    description TEXT,
+    timestamp TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+);
+
+-- Extra index for faster execution
+CREATE INDEX IF NOT EXISTS idx_transactions_product ON transactions(product_id);
+
+-- Stock balances table: Materialized current stock per product (kept in sync by logic.py on every movement)
+CREATE TABLE IF NOT EXISTS stock_balances (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id),
+    quantity INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+);
+
+-- Stock snapshots table: Balance of a product through a transaction id (Written by "flask compact-ledger")
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    transaction_id BIGINT NOT NULL,
+    quantity INTEGER NOT NULL,
+    as_of TIMESTAMP(0) NOT NULL,
+    created_at TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+    PRIMARY KEY (product_id, transaction_id)
+);
+
+-- Snapshot runs by transaction id (Last run, rows of one run)
+CREATE INDEX IF NOT EXISTS idx_stock_snapshots_transaction ON stock_snapshots(transaction_id);
+
+-- Ledger archives table: Movements moved to the archive schema (Always covered by a snapshot)
+CREATE TABLE IF NOT EXISTS ledger_archives (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    path TEXT NOT NULL,
+    from_transaction_id BIGINT NOT NULL,
+    to_transaction_id BIGINT NOT NULL,
+    to_timestamp TIMESTAMP(0) NOT NULL,
+    rows INTEGER NOT NULL,
+    archived_at TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+);
+
+-- Archive of the ledger (SQLite uses a separate file attached as 'archive')
+CREATE SCHEMA IF NOT EXISTS archive;
+
+CREATE TABLE IF NOT EXISTS archive.transactions (
+    id BIGINT PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    timestamp TIMESTAMP(0)
+);
+
+CREATE INDEX IF NOT EXISTS idx_archive_product ON archive.transactions(product_id);
+
+-- Backfill balances only for products that don't have one yet (Databases from before the balances, full rebuild is "flask rebuild-balances")
+INSERT INTO stock_balances (product_id, quantity)
+SELECT p.id,
+       COALESCE((SELECT s.quantity FROM stock_snapshots s WHERE s.product_id = p.id ORDER BY s.transaction_id DESC LIMIT 1), 0)
+       + (SELECT COALESCE(SUM(t.quantity), 0) FROM transactions t
+          WHERE t.product_id = p.id
+          AND t.id > COALESCE((SELECT MAX(s.transaction_id) FROM stock_snapshots s WHERE s.product_id = p.id), 0))
+FROM products p
+WHERE NOT EXISTS (SELECT 1 FROM stock_balances b WHERE b.product_id = p.id);
+
+-- Indexes for the product search (Name prefix on active products, case insensitive. SKU prefix uses the UNIQUE index)
+CREATE INDEX IF NOT EXISTS idx_products_active_name_nocase ON products(LOWER(name)) WHERE is_active = 1;
+
+-- Index for the stock table pagination (Active products by name, the id breaks ties)
+CREATE INDEX IF NOT EXISTS idx_products_active_name ON products(name, id) WHERE is_active = 1;
+
+-- Reorder alerts table: Active products at or below their reorder level (Kept by reorder.py on every write)
+CREATE TABLE IF NOT EXISTS reorder_alerts (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id),
+    since TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+);
+
+-- Index for the reorder list pagination (Oldest alert first)
+CREATE INDEX IF NOT EXISTS idx_reorder_alerts_since ON reorder_alerts(since, product_id);
+
+-- Backfill the alerts only when the set is empty (Databases from before the reorder list)
+INSERT INTO reorder_alerts (product_id)
+SELECT p.id FROM products p
+LEFT JOIN stock_balances b ON p.id = b.product_id
+WHERE p.is_active = 1 AND COALESCE(b.quantity, 0) <= p.reorder_level
+AND NOT EXISTS (SELECT 1 FROM reorder_alerts)
+ON CONFLICT DO NOTHING;
+
+-- Index for the consumption of a product in a time window (Reorder suggestions, covers the quantity)
+CREATE INDEX IF NOT EXISTS idx_transactions_product_time ON transactions(product_id, timestamp) INCLUDE (quantity);
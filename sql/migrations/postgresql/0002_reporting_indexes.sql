@@ -0,0 +1,16 @@
+-- migrate: no-transaction
+-- Built without blocking the writes of the running workers (CONCURRENTLY can't run inside a transaction)
+
+-- Index for the ledger sums of a product after its snapshot (Balances rebuild and check, stock as of a date)
+-- Seeks (product_id, id > snapshot) with an index-only scan of the quantity
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_product_quantity ON transactions(product_id, id) INCLUDE (quantity);
+
+-- Replaced by the two (product_id, ...) indexes above and in 0001 (Same prefix, one index less to write)
+DROP INDEX CONCURRENTLY IF EXISTS idx_transactions_product;
+
+-- Index for the inventory summary and the count of active products (Partial and covering: index-only
+-- scans in id order, merged with the balances)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_active_value ON products(id) INCLUDE (price, reorder_level) WHERE is_active = 1;
+
+-- Index for the logs export by date range (The id keeps the order of the export stable)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_logs_timestamp ON logs(timestamp, id);
@@ -0,0 +1,11 @@
+-- Idempotency keys table: Result of every movement sent with an Idempotency-Key header (Kept by idempotency.py)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    result TEXT,
+    created_at TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+    expires_at TIMESTAMP(0) NOT NULL
+);
+
+-- Index for the cleanup of the expired keys (Oldest first)
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
@@ -0,0 +1,17 @@
+-- migrate: no-transaction
+-- The index is built without blocking the writes of the running workers (CONCURRENTLY can't run inside a transaction)
+
+-- Catalog version table: One counter bumped by every write to the products table (Kept by catalog.py)
+-- Every process compares it with the version of its in-memory catalog
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO catalog_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+-- Catalog version of the last write of every product (0: written before the catalog existed, loaded by the full load)
+ALTER TABLE products ADD COLUMN IF NOT EXISTS catalog_version BIGINT NOT NULL DEFAULT 0;
+
+-- Index for the refresh of a catalog (Products written after its version)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_catalog_version ON products(catalog_version);
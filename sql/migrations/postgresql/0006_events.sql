@@ -0,0 +1,7 @@
+-- Events table: Live updates for the dashboards of every app server (Written with each change, read by events.py)
+CREATE TABLE IF NOT EXISTS events (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at TIMESTAMP(0) DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+);
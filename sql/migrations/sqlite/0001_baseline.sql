@@ -0,0 +1,109 @@
+-- Migration 1: Baseline schema of the Inventory Management System
+-- Every statement is idempotent, so it also upgrades databases created by the old schema.sql
+
+-- Products table: Information about products in inventory
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sku TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    reorder_level INTEGER DEFAULT 5,
+    price REAL NOT NULL,
+    is_active INTEGER DEFAULT 1
+);
+
+-- Transactions table: Records of stock movements
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    type TEXT CHECK(type IN ('IN', 'OUT')) NOT NULL,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id),
+    -- Integrity checks
+    CONSTRAINT check_quantity_logic CHECK (
+        (type = 'IN' AND quantity > 0) OR
+        (type = 'OUT' AND quantity < 0)
+    )
+);
+
+-- Logs table: All logs of system and user actions
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT CHECK(type IN ('SYSTEM', 'USER')) NOT NULL,
+    action TEXT NOT NULL,
+    description TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Extra index for faster execution
+CREATE INDEX IF NOT EXISTS idx_transactions_product ON transactions(product_id);
+
+-- Stock balances table: Materialized current stock per product (kept in sync by logic.py on every movement)
+CREATE TABLE IF NOT EXISTS stock_balances (
+    product_id INTEGER PRIMARY KEY,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
+
+-- Stock snapshots table: Balance of a product through a transaction id (Written by "flask compact-ledger")
+-- A balance is the latest snapshot plus the movements after its transaction_id
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    product_id INTEGER NOT NULL,
+    transaction_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    as_of DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, transaction_id),
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
+
+-- Snapshot runs by transaction id (Last run, rows of one run)
+CREATE INDEX IF NOT EXISTS idx_stock_snapshots_transaction ON stock_snapshots(transaction_id);
+
+-- Ledger archives table: Movements moved to an archive file (Always covered by a snapshot)
+CREATE TABLE IF NOT EXISTS ledger_archives (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    from_transaction_id INTEGER NOT NULL,
+    to_transaction_id INTEGER NOT NULL,
+    to_timestamp DATETIME NOT NULL,
+    rows INTEGER NOT NULL,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill balances only for products that don't have one yet (Databases from before the balances, full rebuild is "flask rebuild-balances")
+INSERT INTO stock_balances (product_id, quantity)
+SELECT p.id,
+       COALESCE((SELECT s.quantity FROM stock_snapshots s WHERE s.product_id = p.id ORDER BY s.transaction_id DESC LIMIT 1), 0)
+       + (SELECT COALESCE(SUM(t.quantity), 0) FROM transactions t
+          WHERE t.product_id = p.id
+          AND t.id > COALESCE((SELECT MAX(s.transaction_id) FROM stock_snapshots s WHERE s.product_id = p.id), 0))
+FROM products p
+WHERE NOT EXISTS (SELECT 1 FROM stock_balances b WHERE b.product_id = p.id);
+
+-- Indexes for the product search (Name prefix on active products, case insensitive. SKU prefix uses the UNIQUE index)
+CREATE INDEX IF NOT EXISTS idx_products_active_name_nocase ON products(name COLLATE NOCASE) WHERE is_active = 1;
+
+-- Index for the stock table pagination (Active products by name, the rowid breaks ties)
+CREATE INDEX IF NOT EXISTS idx_products_active_name ON products(name) WHERE is_active = 1;
+
+-- Reorder alerts table: Active products at or below their reorder level (Kept by reorder.py on every write)
+CREATE TABLE IF NOT EXISTS reorder_alerts (
+    product_id INTEGER PRIMARY KEY,
+    since DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
+
+-- Index for the reorder list pagination (Oldest alert first)
+CREATE INDEX IF NOT EXISTS idx_reorder_alerts_since ON reorder_alerts(since, product_id);
+
+-- Backfill the alerts only when the set is empty (Databases from before the reorder list)
+INSERT OR IGNORE INTO reorder_alerts (product_id)
+SELECT p.id FROM products p
+LEFT JOIN stock_balances b ON p.id = b.product_id
+WHERE p.is_active = 1 AND COALESCE(b.quantity, 0) <= p.reorder_level
+AND NOT EXISTS (SELECT 1 FROM reorder_alerts);
+
+-- Index for the consumption of a product in a time window (Reorder suggestions, covers the quantity)
+CREATE INDEX IF NOT EXISTS idx_transactions_product_time ON transactions(product_id, timestamp, quantity);
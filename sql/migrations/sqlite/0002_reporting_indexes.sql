@@ -0,0 +1,13 @@
+-- Index for the ledger sums of a product after its snapshot (Balances rebuild and check, stock as of a date)
+-- Seeks (product_id, id > snapshot) and covers the quantity, so the rows of the table are never read
+CREATE INDEX IF NOT EXISTS idx_transactions_product_quantity ON transactions(product_id, id, quantity);
+
+-- Replaced by the two (product_id, ...) indexes above and in 0001 (Same prefix, one index less to write)
+DROP INDEX IF EXISTS idx_transactions_product;
+
+-- Index for the inventory summary and the count of active products (Partial and covering: the
+-- aggregates read only this index, never the names and SKUs of the table)
+CREATE INDEX IF NOT EXISTS idx_products_active_value ON products(is_active, price, reorder_level) WHERE is_active = 1;
+
+-- Index for the logs export by date range
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp);
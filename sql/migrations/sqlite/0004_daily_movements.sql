@@ -0,0 +1,22 @@
+-- Daily rollups table: Units in and out of every product per UTC day (Kept by analytics.py on every write)
+CREATE TABLE IF NOT EXISTS daily_movements (
+    day DATE NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity_in INTEGER NOT NULL DEFAULT 0,
+    quantity_out INTEGER NOT NULL DEFAULT 0,
+    movements INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day),
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
+
+-- Index for the reports of a date range (Covers the totals, the product rankings group its rows)
+CREATE INDEX IF NOT EXISTS idx_daily_movements_day ON daily_movements(day, product_id, quantity_in, quantity_out, movements);
+
+-- Backfill from the live ledger (Once: the table is new)
+INSERT INTO daily_movements (day, product_id, quantity_in, quantity_out, movements)
+SELECT DATE(t.timestamp), t.product_id,
+       SUM(CASE WHEN t.quantity > 0 THEN t.quantity ELSE 0 END),
+       SUM(CASE WHEN t.quantity < 0 THEN -t.quantity ELSE 0 END),
+       COUNT(*)
+FROM transactions t
+GROUP BY DATE(t.timestamp), t.product_id;
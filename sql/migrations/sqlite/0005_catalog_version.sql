@@ -0,0 +1,19 @@
+-- Catalog version table: One counter bumped by every write to the products table (Kept by catalog.py)
+-- Every process compares it with the version of its in-memory catalog
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+-- Catalog version of the last write of every product (0: written before the catalog existed, loaded by the full load)
+ALTER TABLE products ADD COLUMN catalog_version INTEGER NOT NULL DEFAULT 0;
+
+-- Index for the refresh of a catalog (Products written after its version)
+CREATE INDEX IF NOT EXISTS idx_products_catalog_version ON products(catalog_version);
+
+-- Index for the inventory summary and the count of active products, now led by the id (Same order as the balances)
+-- With is_active first, a database without ANALYZE statistics sorted every active product for a stock table page
+DROP INDEX IF EXISTS idx_products_active_value;
+CREATE INDEX IF NOT EXISTS idx_products_active_value ON products(id, price, reorder_level, is_active) WHERE is_active = 1;
@@ -0,0 +1,8 @@
+-- Events table: Live updates for the dashboards of every worker process (Written with each change, read by events.py)
+-- AUTOINCREMENT: an id is never used again after old events are deleted (Browsers resume from the last id they got)
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
@@ -45,7 +45,10 @@ document.addEventListener("DOMContentLoaded", () => {
                 // If success = true
                 if (result.success) {
                     // Updates the products table and recalculates Dashboard Summary (If product has actual stock)
-                    updateProductTable(result.product);
+                    // The live update (/events) may have added the row already
+                    if (!document.getElementById(`row-${result.product.id}`)) {
+                        updateProductTable(result.product);
+                    }
                     updateDashboardSummary(result.summary);
 
                     // Add the new product to a select list for buying and selling
@@ -86,27 +89,15 @@ document.addEventListener("DOMContentLoaded", () => {
 
             try {
                 // Sends the form data to buy route
-                const response = await fetch("/buy", {
-                    method: "POST",
-                    body: formData
-                });
+                // Retried with the same key if the connection fails (The server never moves the stock twice)
+                const response = await postMovement("/buy", formData);
 
                 // Awaits for promise from app.py (It has a success attribute)
                 const result = await response.json();
 
                 // If success is true
                 if (result.success) {
-                    // Status persistance (To not change page on products table)
-                    // Gets the url params
-                    const urlParams = new URLSearchParams(window.location.search);
-
-                    // Searches the value of page param (Is it's invalid, returns 1)
-                    const currentPage = urlParams.get('page') || 1;
-
-                    // Loads the page asychronically on user's actual page
-                    loadPage('stock-container', '/?page=' + currentPage);
-
-                    // Updates product's stock value
+                    // Updates product's stock value in place (The row keeps its page)
                     updateStockUI(result.product_id, result.new_stock, result.status);
 
                     // Updates Dashboard Summary
@@ -150,27 +141,15 @@ document.addEventListener("DOMContentLoaded", () => {
 
             try {
                 // Sends the form data to sell route
-                const response = await fetch("/sell", {
-                    method: "POST",
-                    body: formData
-                });
+                // Retried with the same key if the connection fails (The server never moves the stock twice)
+                const response = await postMovement("/sell", formData);
 
                 // Waits the JSON (It has a success boolean value to validate sell)
                 const result = await response.json();
 
                 // If success value is True
                 if (result.success) {
-                    // Status persistance (To not change page on products table)
-                    // Gets the url params
-                    const urlParams = new URLSearchParams(window.location.search);
-
-                    // Gets page value, if it's invalid, return 1
-                    const currentPage = urlParams.get('page') || 1;
-
-                    // Load table on current page
-                    loadPage('stock-container', '/?page=' + currentPage);
-
-                    // Updates the product's stock, and validates ig the new value es bigger than reorder or not
+                    // Updates the product's stock in place, and validates ig the new value es bigger than reorder or not
                     updateStockUI(result.product_id, result.new_stock, result.status);
 
                     // Updates the dashboard summary (Updates total value and low stock)
@@ -201,6 +180,18 @@ document.addEventListener("DOMContentLoaded", () => {
             }
         });
     }
+    // LIVE UPDATES
+    // Movements of other operators patch the table and summary in place (Only on the dashboard)
+    const stockContainer = document.getElementById("stock-container");
+    if (stockContainer) {
+        connectStockEvents(stockContainer.dataset.events);
+    }
+
+    // PRODUCT SEARCH FOR BUY AND SELL MODALS
+    // The selects are filled from /products/search while the user types (The page doesn't carry the whole catalog)
+    setupProductSearch("buy-product-search", "buy-product-id", "modalBuyProduct", "Disponible");
+    setupProductSearch("sell-product-search", "sell-product-id", "modalSellProduct", "Avaible");
+
     // VISUAL VALIDATION FOR SELL SELECTION
     // Validates that stock is a valid value and product has enough stock
     // Gets product's id, and stock to sell for stock calculation
@@ -293,16 +284,26 @@ function updateProductTable(product) {
     const badgeClass = isLow ? 'bg-warning text-dark' : 'bg-success';
     const badgeText = isLow ? 'Pedir más' : 'Ok';
 
-    // Creates the row structure
-    newRow.innerHTML = `
-        <td><strong id="name-${product.id}">${product.name}</strong></td>
-        <td><code class="text-muted" id="sku-${product.id}">${product.sku}</code></td>
-        <td class="text-end" id="price-${product.id}">$${parseFloat(product.price).toLocaleString('en-US', {minimumFractionDigits: 2})}</td>
-        <td class="text-center" id="stock-${product.id}">${product.current_stock}</td>
-        <td id="status-${product.id}">
-            <span class="badge ${badgeClass}">${badgeText}</span>
-        </td>
-    `;
+    // Creates the row structure with text nodes (Name and SKU come from any operator: never parsed as HTML)
+    const name = createElementWithText("strong", "", product.name);
+    name.id = `name-${product.id}`;
+    const sku = createElementWithText("code", "text-muted", product.sku);
+    sku.id = `sku-${product.id}`;
+
+    const cells = [
+        createElementWithText("td", "", ""),
+        createElementWithText("td", "", ""),
+        createElementWithText("td", "text-end", `$${parseFloat(product.price).toLocaleString('en-US', {minimumFractionDigits: 2})}`),
+        createElementWithText("td", "text-center", product.current_stock),
+        createElementWithText("td", "", "")
+    ];
+    cells[0].appendChild(name);
+    cells[1].appendChild(sku);
+    cells[2].id = `price-${product.id}`;
+    cells[3].id = `stock-${product.id}`;
+    cells[4].id = `status-${product.id}`;
+    cells[4].appendChild(createElementWithText("span", `badge ${badgeClass}`, badgeText));
+    newRow.append(...cells);
 
     // Append it to the table
     tableBody.prepend(newRow);
@@ -344,6 +345,130 @@ function addProductToSelect(product) {
     });
 }
 
+// Connects a search input with a select, filling the select with the products found by the server
+function setupProductSearch(inputId, selectId, modalId, stockLabel) {
+    // Gets the search input, the select and its modal
+    const input = document.getElementById(inputId);
+    const select = document.getElementById(selectId);
+    const modal = document.getElementById(modalId);
+
+    // Only executes if both elements exist
+    if (!input || !select) return;
+
+    // Timer to wait the user to stop typing, and the last query sent
+    let timer = null;
+    let lastQuery = null;
+
+    // Asks the server for products that start with the query
+    const search = async (query) => {
+        lastQuery = query;
+
+        try {
+            const response = await fetch(`/products/search?q=${encodeURIComponent(query)}`);
+            const result = await response.json();
+
+            // An older response arrived after a newer search, ignore it
+            if (query !== lastQuery) return;
+
+            fillProductSelect(select, result.products, stockLabel);
+        }
+
+        // If something goes wrong with connection
+        catch (error) {
+            console.error("Search error:", error);
+        }
+    };
+
+    // Waits 250ms after the last key before searching
+    input.addEventListener("input", () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => search(input.value.trim()), 250);
+    });
+
+    // Loads fresh results (And stock) every time the modal is opened
+    if (modal) {
+        modal.addEventListener("show.bs.modal", () => search(input.value.trim()));
+    }
+}
+
+// Replaces the options of a select with a list of products
+function fillProductSelect(select, products, stockLabel) {
+    // Keeps only the "Select..." placeholder
+    select.length = 1;
+    select.selectedIndex = 0;
+
+    // Adds an option for every product with its actual stock
+    products.forEach(product => {
+        const option = document.createElement("option");
+        option.value = product.id;
+        option.setAttribute("data-stock", product.current_stock);
+        option.text = `${product.name} (${stockLabel}: ${product.current_stock})`;
+        select.add(option);
+    });
+}
+
+// Gets the changes of every worker and patches the dashboard with them
+// Mode 'poll' (Default) asks /events/poll for the events after the last one, 'sse' keeps an /events stream open
+function connectStockEvents(mode) {
+    const handlers = {
+        // New stock of one product: only the rows and options on screen change
+        stock: (data) => {
+            updateStockUI(data.id, data.new_stock, data.status);
+            updateSelectsStock(data.id, data.new_stock);
+        },
+
+        // New dashboard totals
+        summary: (data) => updateDashboardSummary(data),
+
+        // New product of another operator: shown on the first page if it isn't there yet
+        product: (product) => {
+            const onFirstPage = !/[?&](after|before)=/.test(window.location.search);
+
+            if (onFirstPage && !document.getElementById(`row-${product.id}`)) {
+                updateProductTable(product);
+            }
+        },
+
+        // Too many changes at once (Import, rebuild, missed events): reload the current page of the table
+        reload: () => loadPage('stock-container', '/' + window.location.search)
+    };
+
+    // The browser reconnects by itself, sending the last event id it received
+    if (mode === "sse" && window.EventSource) {
+        const source = new EventSource("/events");
+        Object.entries(handlers).forEach(([type, handler]) => {
+            source.addEventListener(type, (e) => handler(JSON.parse(e.data)));
+        });
+        return;
+    }
+
+    // Polling: the first answer gives the newest event id, the next ones the events after it
+    let lastId = null;
+    let delay = 2000;
+
+    const poll = async () => {
+        // Hidden tabs don't ask (They catch up, or reload, when they are shown again)
+        if (!document.hidden) {
+            try {
+                const response = await fetch("/events/poll" + (lastId === null ? "" : `?after=${lastId}`));
+
+                if (response.ok) {
+                    const result = await response.json();
+                    result.events.forEach((event) => handlers[event.type] && handlers[event.type](event.data));
+                    lastId = result.last_id;
+                    delay = result.poll_ms;
+                }
+            } catch (error) {
+                // Server unreachable: try again on the next round
+            }
+        }
+
+        setTimeout(poll, delay);
+    };
+
+    poll();
+}
+
 // Function to add a log to logs table
 function addActivityLog(type, description) {
     // Searches the log's list
@@ -363,14 +488,12 @@ function addActivityLog(type, description) {
     const newLog = document.createElement("li");
 
     // Sets the class and value (type and description comes from /logs route)
+    // Text nodes only: the description has product names and SKUs
     newLog.className = "list-group-item border-0 border-bottom animate__animated animate__fadeInDown";
-    newLog.innerHTML = `
-        <div class="d-flex w-100 justify-content-between">
-            <small class="fw-bold text-primary">${type}</small>
-            <small class="text-muted">${timestamp}</small>
-        </div>
-        <p class="mb-1 small">${description}</p>
-    `;
+    const header = createElementWithText("div", "d-flex w-100 justify-content-between", "");
+    header.append(createElementWithText("small", "fw-bold text-primary", type),
+                  createElementWithText("small", "text-muted", timestamp));
+    newLog.append(header, createElementWithText("p", "mb-1 small", description));
 
     // Adds the log to the list's start (To search more recent logs)
     logContainer.prepend(newLog);
@@ -399,10 +522,18 @@ function updateStockUI(id, newStock, status) {
     if (statusCell) {
         // Sets status value
         const badgeClass = status === 'Ok' ? 'bg-success' : 'bg-warning text-dark';
-        statusCell.innerHTML = `<span class="badge ${badgeClass}">${status}</span>`;
+        statusCell.replaceChildren(createElementWithText("span", `badge ${badgeClass}`, status));
     }
 }
 
+// Creates an element with a class and a text (Set as text, never parsed as HTML)
+function createElementWithText(tag, className, text) {
+    const element = document.createElement(tag);
+    if (className) element.className = className;
+    element.textContent = text;
+    return element;
+}
+
 // Function to update dashboard summary
 function updateDashboardSummary(summary) {
     // Case if summary return is empty
@@ -414,6 +545,35 @@ function updateDashboardSummary(summary) {
     document.getElementById("low-stock-count").innerText = summary.low_stock_count;
 }
 
+// Sends a buy or sell with an Idempotency-Key, and sends it again with the same key if the connection fails
+// or the server errors (A retry of a saved movement gets its first result, see idempotency.py)
+async function postMovement(url, formData, attempts = 3) {
+    const key = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(url, {
+                method: "POST",
+                body: formData,
+                headers: {"Idempotency-Key": key}
+            });
+
+            // Validation errors (400) are final, only server errors (500, 503) are retried
+            if (response.status < 500 || attempt === attempts) {
+                return response;
+            }
+        }
+        catch (error) {
+            if (attempt === attempts) {
+                throw error;
+            }
+        }
+
+        // Waits a bit longer before every retry (0.5s, 1s, ...)
+        await new Promise(resolve => setTimeout(resolve, 250 * 2 ** attempt));
+    }
+}
+
 // Function to show success or danger alerts
 function showAlert(message, type) {
     // Gets the top container for alerts
@@ -422,12 +582,12 @@ function showAlert(message, type) {
     // Creates the div "alert"
     const alert = document.createElement("div");
 
-    // Returns the message and a button to close the alert
+    // Returns the message (As text: it can quote a name or SKU) and a button to close the alert
     alert.className = `alert alert-${type} alert-dismissible fade show`;
-    alert.innerHTML = `
-        ${message}
-        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
-    `;
+    const closeButton = createElementWithText("button", "btn-close", "");
+    closeButton.type = "button";
+    closeButton.setAttribute("data-bs-dismiss", "alert");
+    alert.append(document.createTextNode(message), closeButton);
 
     // Appends alert by max 5 seconds
     container.appendChild(alert);
@@ -462,10 +622,10 @@ function updateSelectsStock(productId, newStock) {
     });
 }
 
-// Function to load a page from logs table
-function loadLogsPage(page) {
+// Function to load a page from logs table (Query has the page number and the cursor, e.g. "page=2&after=...")
+function loadLogsPage(query) {
     // Fetch the logs page value, and sends Ajax's value to Flask
-    fetch(`/logs?page=${page}&ajax=1`)
+    fetch(`/logs?${query}&ajax=1`)
 
         // Waits response (The logs in the page)
         .then(response => response.text())
@@ -474,7 +634,7 @@ function loadLogsPage(page) {
             document.getElementById('logs-container').innerHTML = html;
 
             // Updates page url to the page value
-            window.history.pushState({}, '', `/logs?page=${page}`);
+            window.history.pushState({}, '', `/logs?${query}`);
         });
 }
 
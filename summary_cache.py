@@ -0,0 +1,118 @@
+"""
+Summary Cache Module - Dashboard KPIs
+-------------------------------------
+This module keeps the last computed inventory summary (total items, total
+value and low stock count) in memory, so the dashboard and every buy/sell
+response don't run a full-inventory aggregate.
+
+Key Responsibilities:
+- Deltas: Every committed movement and new product is an event in the shared
+  'events' table (events.py). Before answering, 'get' applies the events
+  after the last one it saw, so the writes of every worker process count.
+- Fallbacks: A full recompute after a TTL, after too many deltas, after a
+  'reload' event (Import, rebuild) or events it missed, or after an invalidation.
+- Consistency: A recompute is only saved if no delta or invalidation happened
+  while it ran (Generation counter), so a delta is never overwritten by an older total.
+- Statistics: Hit, miss, delta and recompute counters for monitoring.
+
+Note: Changes made without an event (Like a product deactivated by hand) are
+seen after the TTL (STOCKFLOW_SUMMARY_TTL seconds).
+"""
+
+# Import os to read the settings, threading for the lock and time for the TTL
+import os
+import threading
+import time
+
+# Import the shared events (Source of the deltas)
+import events
+
+# Seconds before a full recompute, even if no event arrived
+SUMMARY_TTL = float(os.environ.get("STOCKFLOW_SUMMARY_TTL", 60))
+
+# Max incremental updates before a full recompute (Limits float rounding drift on total value)
+MAX_DELTAS = int(os.environ.get("STOCKFLOW_SUMMARY_MAX_DELTAS", 10000))
+
+# Cached summary and its state (Shared by the threads of this process)
+# event_id is the last event included, generation changes with every delta and invalidation
+_lock = threading.Lock()
+_state = {"summary": None, "loaded_at": 0.0, "deltas": 0, "event_id": 0, "generation": 0}
+
+# Counters for monitoring
+_stats = {"hits": 0, "misses": 0, "deltas": 0, "recomputes": 0, "invalidations": 0}
+
+# Returns the cached summary with the new events applied, or recomputes it with compute(db)
+# compute returns the KPIs and the id of the last event they include ('event_id', read in the same statement)
+def get(db, compute):
+    with _lock:
+        summary = _state["summary"]
+        fresh = time.monotonic() - _state["loaded_at"] < SUMMARY_TTL and _state["deltas"] < MAX_DELTAS
+
+        if summary is not None and fresh:
+            changes = events.read(db, _state["event_id"])
+
+            # Deltas only for movements and new products, and for a few of them (Else a recompute is cheaper)
+            if (changes is not None and len(changes) < events.READ_LIMIT
+                    and all(type in ["stock", "product"] for _, type, _ in changes)):
+                for event_id, type, data in changes:
+                    _apply(type, data)
+                    _state["event_id"] = event_id
+
+                _stats["hits"] += 1
+                return _rounded(summary)
+
+        _stats["misses"] += 1
+        generation = _state["generation"]
+
+    # Full recompute outside the lock (Other threads keep reading the old value meanwhile)
+    summary = compute(db)
+
+    with _lock:
+        _stats["recomputes"] += 1
+
+        # A delta was applied while it ran: the result may not include it, so it's returned but not kept
+        if _state["generation"] == generation:
+            _state.update({"summary": dict(summary), "loaded_at": time.monotonic(), "deltas": 0,
+                           "event_id": summary["event_id"], "generation": generation + 1})
+
+    return _rounded(summary)
+
+# Drops the cached summary (For writes that can't be expressed as a delta)
+def invalidate():
+    with _lock:
+        _state.update({"summary": None, "loaded_at": 0.0, "deltas": 0, "generation": _state["generation"] + 1})
+        _stats["invalidations"] += 1
+
+# Returns a copy of the counters
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+# Adjusts the KPIs by one event: a movement of an active product or a new product (Called with the lock held)
+def _apply(type, data):
+    summary = _state["summary"]
+    price = data["price"] or 0
+    reorder_level = data["reorder_level"]
+
+    if type == "stock":
+        old_stock, new_stock = data["old_stock"], data["new_stock"]
+        summary["total_value"] += (new_stock - old_stock) * price
+        summary["low_stock_count"] += int(new_stock <= reorder_level) - int(old_stock <= reorder_level)
+    else:
+        stock = data["current_stock"]
+        summary["total_items"] += 1
+        summary["total_value"] += stock * price
+        summary["low_stock_count"] += int(stock <= reorder_level)
+
+    _state["deltas"] += 1
+    _state["generation"] += 1
+    _stats["deltas"] += 1
+
+# Copy of the summary with the total value rounded like the dashboard shows it
+def _rounded(summary):
+    return {
+        "total_items": summary["total_items"],
+        "total_value": round(summary["total_value"], 2),
+        "low_stock_count": summary["low_stock_count"]
+    }
@@ -0,0 +1,244 @@
+"""
+Writer Module - Single-Writer Process for SQLite
+------------------------------------------------
+This module lets several app worker processes share one SQLite file without
+fighting over its write lock. With STOCKFLOW_WRITER_SOCKET set, the workers
+send their buys, sells and new products to one writer process
+(flask run-writer) over a local Unix socket, and it applies them in order.
+
+Key Responsibilities:
+- Commands: logic.py registers its write steps (Validation and writes of a
+  movement or a new product, without BEGIN / COMMIT). 'execute' runs one in
+  the worker's own transaction, or sends it to the writer process.
+- Group Commit: The writer applies every command waiting in its queue in one
+  transaction (Up to STOCKFLOW_WRITER_GROUP_MAX), each one in a SAVEPOINT so a
+  rejected command doesn't cancel the others, and answers them after COMMIT.
+- Fallback: If the writer process isn't running, the worker writes directly
+  (Nothing was sent). A connection lost after sending, or a failed group, is
+  an internal error: /buy and /sell answer 500 and the dashboard retries the
+  movement with its Idempotency-Key (idempotency.py).
+
+Security: The messages are pickles, so only processes with the shared secret
+(STOCKFLOW_WRITER_AUTHKEY, no default) can connect, and the socket is created
+with the mode 0660 (Owner and group only).
+
+Note: Only for SQLite (PostgreSQL handles concurrent writers itself). The
+caches and live updates stay in the workers: the worker that sent a command
+updates them with the result. Bulk batches and imports keep writing
+directly (They are already one transaction per request).
+"""
+
+# Import os to read the settings, queue and threading for the command queue
+import os
+import queue
+import threading
+
+# Import the local socket connections (Length-prefixed messages and an authentication handshake)
+from multiprocessing.connection import Client, Listener
+
+# Import the function to log system errors
+from helpers import log_system_error, rollback
+
+# Import the product catalog (Dropped if a group that refreshed it rolls back)
+import catalog
+
+# Unix socket of the writer process (Empty: every worker writes directly)
+SOCKET = os.environ.get("STOCKFLOW_WRITER_SOCKET", "")
+
+# Shared secret of the workers and the writer (Checked when a worker connects)
+# No default: a known key would let any local user send pickles that run code in the writer
+AUTHKEY = os.environ.get("STOCKFLOW_WRITER_AUTHKEY", "").encode()
+
+# Min length of the secret (The writer refuses to start with a shorter one)
+MIN_AUTHKEY = 16
+
+# Max commands per transaction of the writer
+GROUP_MAX = int(os.environ.get("STOCKFLOW_WRITER_GROUP_MAX", 256))
+
+# Write commands by name: function(db, *args) -> (result, effects), registered by logic.py
+# effects is None when nothing was written (The command's changes are rolled back)
+_commands = {}
+
+# Connection of every worker thread to the writer process
+_local = threading.local()
+
+# Counters of the writer process (Printed by flask run-writer)
+_stats = {"groups": 0, "commands": 0, "largest_group": 0}
+
+
+# Registers a write command (Same name in the workers and the writer process)
+def register(name, function):
+    _commands[name] = function
+
+# Runs a write command: in the writer process if there is one, else in this worker's own transaction
+# Returns (result, effects). Errors of the command are raised here, like a direct write
+def execute(db, name, *args):
+    if SOCKET and AUTHKEY and db.dialect == "sqlite":
+        reply = _send(name, args)
+        if reply is not None:
+            return _unpack(reply)
+
+    db.execute("BEGIN IMMEDIATE")
+
+    try:
+        result, effects = _commands[name](db, *args)
+
+    except Exception:
+        rollback(db)
+        raise
+
+    db.execute("COMMIT" if effects is not None else "ROLLBACK")
+    return result, effects
+
+# Counters of the writer process (Commands per transaction = commands / groups)
+def stats():
+    return dict(_stats)
+
+
+# Main loop of the writer process: accepts the workers and applies their commands (Never returns)
+def serve(db, socket_path=None):
+    socket_path = socket_path or SOCKET
+    if not socket_path:
+        raise RuntimeError("Set STOCKFLOW_WRITER_SOCKET to the path of the writer socket.")
+    if len(AUTHKEY) < MIN_AUTHKEY:
+        raise RuntimeError(f"Set STOCKFLOW_WRITER_AUTHKEY to a secret of at least {MIN_AUTHKEY} characters "
+                           "(The same value in the workers).")
+
+    # A socket file left by a writer that died
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # The socket file is created with the mode 0660 (Changing it after bind would leave a window open to everyone)
+    umask = os.umask(0o117)
+    try:
+        listener = Listener(socket_path, family="AF_UNIX", authkey=AUTHKEY)
+    finally:
+        os.umask(umask)
+
+    pending = queue.Queue()
+    threading.Thread(target=_apply_loop, args=(db, pending), name="stockflow-writer", daemon=True).start()
+
+    while True:
+        try:
+            connection = listener.accept()
+
+        # A client with the wrong key, or one that left during the handshake
+        except Exception as e:
+            print(f"Error in writer accept: {e}")
+            continue
+
+        threading.Thread(target=_serve_worker, args=(connection, pending), daemon=True).start()
+
+
+# Sends a command to the writer and waits for its reply (None if the writer isn't running: nothing was sent)
+def _send(name, args):
+    connection = getattr(_local, "connection", None)
+
+    if connection is None:
+        try:
+            connection = Client(SOCKET, family="AF_UNIX", authkey=AUTHKEY)
+
+        except (OSError, EOFError):
+            return None
+
+        _local.connection = connection
+
+    try:
+        connection.send((name, args))
+        return connection.recv()
+
+    # The command may or may not be saved: the route answers 500 and the client retries it (With its Idempotency-Key)
+    except (OSError, EOFError) as e:
+        _local.connection = None
+        connection.close()
+        raise RuntimeError(f"Connection to the writer process lost: {e}") from None
+
+# Result of a reply, or its error raised again in the worker
+def _unpack(reply):
+    status, first, second = reply
+
+    if status == "ok":
+        return first, second
+
+    # Constraint violations and invalid values keep their type (The callers handle ValueError)
+    if first == "ValueError":
+        raise ValueError(second)
+    raise RuntimeError(second)
+
+# Reads the commands of one worker connection (A worker thread sends one command at a time)
+def _serve_worker(connection, pending):
+    try:
+        while True:
+            name, args = connection.recv()
+
+            done = threading.Event()
+            reply = []
+            pending.put((name, args, reply, done))
+
+            done.wait()
+            connection.send(reply[0])
+
+    # The worker closed its connection
+    except (OSError, EOFError):
+        pass
+
+    finally:
+        connection.close()
+
+# Takes every command already waiting (While a group commits, the next one fills up)
+def _apply_loop(db, pending):
+    while True:
+        group = [pending.get()]
+
+        while len(group) < GROUP_MAX:
+            try:
+                group.append(pending.get_nowait())
+            except queue.Empty:
+                break
+
+        _apply_group(db, group)
+
+# Applies a group of commands in one transaction and answers them after COMMIT
+def _apply_group(db, group):
+    replies = []
+
+    try:
+        db.execute("BEGIN IMMEDIATE")
+
+        for name, args, _, _ in group:
+            # Every command in a savepoint: a rejected or failed one leaves nothing, the others go on
+            db.execute("SAVEPOINT command")
+
+            try:
+                result, effects = _commands[name](db, *args)
+                replies.append(("ok", result, effects))
+
+            except Exception as e:
+                effects = None
+                replies.append(("error", type(e).__name__, str(e)))
+
+            if effects is None:
+                db.execute("ROLLBACK TO command")
+            db.execute("RELEASE command")
+
+        db.execute("COMMIT")
+
+        _stats["groups"] += 1
+        _stats["commands"] += len(group)
+        _stats["largest_group"] = max(_stats["largest_group"], len(group))
+
+    # Nothing of the group is saved: every command gets the error
+    except Exception as e:
+        rollback(db)
+
+        # A command after a new product may have refreshed the catalog to the group's version, never committed
+        catalog.reset()
+        print(f"Error in writer group: {e}")
+        log_system_error(db, e, action="WRITER_GROUP_FAIL")
+        replies = [("error", "RuntimeError", "Internal Server Error")] * len(group)
+
+    finally:
+        # Answer every waiting worker, even if the group failed
+        for (_, _, reply, done), answer in zip(group, replies):
+            reply.append(answer)
+            done.set()